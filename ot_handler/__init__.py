@@ -1,3 +1,29 @@
 __version__ = "0.2.0"
 
-from .liquid_handler import LiquidHandler as LiquidHandler
+import logging
+from typing import TYPE_CHECKING
+
+from .log import configure_logging as configure_logging
+from .log import stop_logging as stop_logging
+
+if TYPE_CHECKING:
+    from .liquid_handler import LiquidHandler as LiquidHandler
+
+__all__ = ["LiquidHandler", "configure_logging", "stop_logging"]
+
+# The application decides where the messages go, see configure_logging
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    # The Opentrons libraries are imported with the LiquidHandler, so that the planning modules
+    # can be used without them
+    if name == "LiquidHandler":
+        from .liquid_handler import LiquidHandler
+
+        return LiquidHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,359 @@
+"""
+Allocation of liquid handling operations to the available pipette configurations.
+
+The operations of an OperationTable are grouped by column with vectorized passes and
+indexed by well names, so that the column-wise search for multichannel compatible
+operations scales near-linearly with the worklist size. Operations that have already
+been allocated are tracked in a bitmap.
+
+Operations between matching rows that do not fill a column can be allocated to partial columns
+of the p300 multichannel pipette. On the OT-2 a partial column uses the front nozzles, from H1
+backwards, so the nozzles without tips reach over the rows behind the operations. Partial
+columns are therefore only allocated where those rows are on the same labware, i.e. for the
+front-most rows, unless the deck slot behind the labware is free.
+"""
+
+import numpy as np
+
+MULTICHANNEL_ROWS = 8
+PARTIAL_COLUMN_SIZES = (4, 2)
+TROUGH_MIN_WIDTH = 70
+FRONT_SLOTS = ["1", "2", "3"]
+FRONT_SLOT_UNREACHABLE_ROWS = [6, 7]  # Rows G and H
+LABWARE_FORCING_P20 = [
+    "opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical",
+    "opentrons_10_tuberack_nest_4x50ml_6x15ml_conical",
+    "opentrons_15_tuberack_falcon_15ml_conical",
+    "opentrons_15_tuberack_nest_15ml_conical",
+]
+
+
+def _is_trough(well):
+    width = getattr(well, "width", None)
+    return bool(width) and width > TROUGH_MIN_WIDTH
+
+
+def allocate_operations(
+    table,
+    source_labware,
+    destination_labware,
+    min_volume,
+    multichannel_members=None,
+    partial_operations=None,
+    unobstructed_labware=(),
+):
+    """
+    Allocate liquid handling operations between the p300 multichannel, p300 single channel and
+    p20 single channel configurations.
+
+    The operations are expected to be validated by the caller: all source wells belong to
+    source_labware and all destination wells belong to destination_labware (or are the
+    destination_labware itself, such as a trash bin).
+
+    Parameters:
+        table (OperationTable): The operations to allocate.
+        source_labware: The labware holding all the source wells.
+        destination_labware: The labware holding all the destination wells, or a trash bin.
+        min_volume (float): Minimum volume of the p300 pipette.
+        multichannel_members (dict, optional): If provided, filled with the indexes of the eight
+            operations covered by each multichannel operation, keyed by the index of the
+            multichannel operation. The operations covered by partial columns are added too.
+        partial_operations (dict, optional): If provided, operations between matching rows that
+            do not fill a column are allocated to partial columns, and the partial column
+            operations are added to the list of their size, keyed by PARTIAL_COLUMN_SIZES. The
+            well of a partial column operation is that of its front-most row.
+        unobstructed_labware (tuple, optional): Labware whose deck slot behind is free, so that
+            partial columns reach all its rows.
+
+    Returns:
+        tuple: Lists of p300 multichannel, p300 single channel and p20 operations, each in
+        the format [index, source_well, destination_well, volume].
+    """
+    source_wells = table.source_wells
+    destination_wells = table.destination_wells
+    volumes = table.volumes.tolist()
+    allocated = bytearray(len(table))
+    if multichannel_members is None:
+        multichannel_members = {}
+
+    def operation(i):
+        return (i, source_wells[i], destination_wells[i], volumes[i])
+
+    # Group the large volume operations by their source and destination columns, in order of
+    # first appearance
+    large_volume_indexes = np.flatnonzero(table.volumes > min_volume)
+    keys = (
+        table.source_columns[large_volume_indexes]
+        * (int(table.destination_columns.max(initial=0)) + 1)
+        + table.destination_columns[large_volume_indexes]
+    )
+    _, first_indexes, inverse, counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True
+    )
+    members = np.split(
+        large_volume_indexes[np.argsort(inverse, kind="stable")], np.cumsum(counts)[:-1]
+    )
+
+    # Search for column-wise operations with equal volumes
+    multichannel_operations = []
+    for group in np.argsort(first_indexes, kind="stable"):
+        if counts[group] < MULTICHANNEL_ROWS:
+            continue
+        column_ops = [operation(i) for i in members[group].tolist()]
+        volume_operations = {}
+        for op in column_ops:
+            volume_operations.setdefault(op[3], []).append(op)
+        for volume in set(op[3] for op in column_ops):
+            matching_volumes = volume_operations[volume]
+            if len(matching_volumes) >= MULTICHANNEL_ROWS:
+                _allocate_column_group(
+                    matching_volumes,
+                    table.source_names,
+                    table.destination_names,
+                    destination_labware,
+                    allocated,
+                    multichannel_operations,
+                    multichannel_members,
+                )
+
+    if partial_operations is not None:
+        for size in PARTIAL_COLUMN_SIZES:
+            partial_operations.setdefault(size, [])
+        obstructed = not (
+            source_labware in unobstructed_labware
+            and destination_labware in unobstructed_labware
+        )
+        if _has_multichannel_rows(source_labware) and _has_multichannel_rows(destination_labware):
+            for group in np.argsort(first_indexes, kind="stable"):
+                group_ops = [operation(i) for i in members[group].tolist() if not allocated[i]]
+                volume_operations = {}
+                for op in group_ops:
+                    volume_operations.setdefault(op[3], []).append(op)
+                for matching_volumes in volume_operations.values():
+                    if len(matching_volumes) >= min(PARTIAL_COLUMN_SIZES):
+                        _allocate_partial_columns(
+                            matching_volumes,
+                            table.source_rows,
+                            table.destination_rows,
+                            obstructed,
+                            allocated,
+                            partial_operations,
+                            multichannel_members,
+                        )
+
+    # The remaining large volumes are pipetted in single channel mode. The single channel mode
+    # of the p300 cannot reach the bottom rows of the front slots, nor the tube racks.
+    is_allocated = np.frombuffer(bytes(allocated), dtype=np.uint8).astype(bool)
+    remaining = large_volume_indexes[~is_allocated[large_volume_indexes]]
+    forcing_p20 = np.zeros(len(remaining), dtype=bool)
+    if source_labware.parent in FRONT_SLOTS:
+        forcing_p20 |= np.isin(table.source_rows[remaining], FRONT_SLOT_UNREACHABLE_ROWS)
+    if getattr(destination_labware, "parent", None) in FRONT_SLOTS:
+        forcing_p20 |= np.isin(table.destination_rows[remaining], FRONT_SLOT_UNREACHABLE_ROWS)
+    if (
+        source_labware.load_name in LABWARE_FORCING_P20
+        or getattr(destination_labware, "load_name", None) in LABWARE_FORCING_P20
+    ):
+        forcing_p20[:] = True
+    p300_single_ops = [operation(i) for i in remaining[~forcing_p20].tolist()]
+    p20_ops = [operation(i) for i in remaining[forcing_p20].tolist()]
+
+    is_allocated[remaining] = True
+    for i in np.flatnonzero(~is_allocated).tolist():
+        p20_ops.append(list(operation(i)))  # i is the original index
+
+    return multichannel_operations, p300_single_ops, p20_ops
+
+
+def _has_multichannel_rows(labware):
+    columns = getattr(labware, "columns", None)
+    return columns is not None and len(columns()[0]) == MULTICHANNEL_ROWS
+
+
+def _allocate_partial_columns(
+    ops,
+    source_rows,
+    destination_rows,
+    obstructed,
+    allocated,
+    partial_operations,
+    multichannel_members,
+):
+    """
+    Allocate partial column operations from a group of operations sharing the source column,
+    destination column and volume, largest partial columns first.
+    """
+    rows = {}
+    for op in ops:
+        row = int(source_rows[op[0]])
+        if row == destination_rows[op[0]]:
+            rows.setdefault(row, []).append(op)
+    for size in PARTIAL_COLUMN_SIZES:
+        # The nozzles behind the partial column stay over the labware only for the front rows
+        if obstructed:
+            first_rows = [MULTICHANNEL_ROWS - size]
+        else:
+            first_rows = range(MULTICHANNEL_ROWS - size + 1)
+        for first_row in first_rows:
+            covered = range(first_row, first_row + size)
+            while all(rows.get(row) for row in covered):
+                ops_collection = [rows[row].pop() for row in covered]
+                _add_multichannel_operation(
+                    ops_collection[-1],
+                    ops_collection,
+                    allocated,
+                    partial_operations[size],
+                    multichannel_members,
+                )
+
+
+def _add_multichannel_operation(
+    operation, members, allocated, multichannel_operations, multichannel_members
+):
+    multichannel_operations.append(operation)
+    multichannel_members[operation[0]] = [op[0] for op in members]
+    for op in members:
+        allocated[op[0]] = 1
+
+
+def _allocate_column_group(
+    ops,
+    source_names,
+    destination_names,
+    destination_labware,
+    allocated,
+    multichannel_operations,
+    multichannel_members,
+):
+    """
+    Allocate multichannel operations from a group of operations sharing the source column,
+    destination column and volume.
+    """
+    # Scenario 1: row indexes match and populate the whole column
+    rows = {}
+    for op in ops:
+        source_row = source_names[op[0]][0]
+        if source_row == destination_names[op[0]][0]:
+            rows.setdefault(source_row, []).append(op)
+    while len(rows) == MULTICHANNEL_ROWS:
+        # The last operation of each row forms the column
+        ops_collection = {row: row_ops.pop() for row, row_ops in rows.items()}
+        _add_multichannel_operation(
+            ops_collection["A"],
+            ops_collection.values(),
+            allocated,
+            multichannel_operations,
+            multichannel_members,
+        )
+        rows = {row: row_ops for row, row_ops in rows.items() if row_ops}
+
+    # Scenario 2: source or destination well can fit all multichannel pipettes
+    ops = [op for op in ops if not allocated[op[0]]]
+    by_source = {}
+    by_destination = {}
+    for op in ops:
+        by_source.setdefault(source_names[op[0]], []).append(op)
+        by_destination.setdefault(destination_names[op[0]], []).append(op)
+
+    source_troughs = [
+        name
+        for name, name_ops in by_source.items()
+        if len(name_ops) >= MULTICHANNEL_ROWS and _is_trough(name_ops[0][1])
+    ]
+    if not hasattr(destination_labware, "wells"):
+        # Everything is dispensed to the same location, such as a trash bin
+        destination_troughs = list(by_destination)
+    else:
+        destination_troughs = [
+            name
+            for name, name_ops in by_destination.items()
+            if len(name_ops) >= MULTICHANNEL_ROWS and _is_trough(name_ops[0][2])
+        ]
+
+    # Transfers from a source trough to destination columns or troughs are checked first,
+    # then transfers from source columns to a destination trough. A destination well is never
+    # a source trough, so trough-to-trough transfers are only found in the first direction.
+    check_set = [
+        (source_troughs, by_source, destination_names, destination_troughs),
+        (destination_troughs, by_destination, source_names, []),
+    ]
+    found = True
+    while found:
+        found = False
+        for primary, index, row_names, secondary in check_set:
+            for name in primary:
+                trough_ops = [op for op in index[name] if not allocated[op[0]]]
+                if len(trough_ops) >= MULTICHANNEL_ROWS:
+                    found |= _allocate_trough_group(
+                        trough_ops,
+                        row_names,
+                        destination_names,
+                        secondary,
+                        allocated,
+                        multichannel_operations,
+                        multichannel_members,
+                    )
+
+
+def _allocate_trough_group(
+    ops,
+    row_names,
+    destination_names,
+    secondary,
+    allocated,
+    multichannel_operations,
+    multichannel_members,
+):
+    """
+    Allocate multichannel operations from a group of operations sharing a trough well.
+
+    Returns:
+        bool: True if any operations were allocated.
+    """
+    rows = {}
+    for op in ops:
+        rows.setdefault(row_names[op[0]][0], []).append(op)
+    by_destination = {}
+    for op in ops:
+        by_destination.setdefault(destination_names[op[0]], []).append(op)
+
+    allocated_any = False
+    found = True
+    while found:
+        found = False
+        # Discard the allocated operations from the end of each row
+        for row_ops in rows.values():
+            while row_ops and allocated[row_ops[-1][0]]:
+                row_ops.pop()
+        rows = {row: row_ops for row, row_ops in rows.items() if row_ops}
+
+        # Scenario 1: the other end of the operations is a column
+        if len(rows) == MULTICHANNEL_ROWS:
+            ops_collection = {row: row_ops.pop() for row, row_ops in rows.items()}
+            _add_multichannel_operation(
+                ops_collection["A"],
+                ops_collection.values(),
+                allocated,
+                multichannel_operations,
+                multichannel_members,
+            )
+            found = True
+        else:
+            # Scenario 2: the other end of the operations is a trough
+            for name in secondary:
+                trough_to_trough = [
+                    op for op in by_destination.get(name, []) if not allocated[op[0]]
+                ]
+                while len(trough_to_trough) >= MULTICHANNEL_ROWS:
+                    # Operations are identical; add the first one
+                    _add_multichannel_operation(
+                        trough_to_trough[0],
+                        trough_to_trough[:MULTICHANNEL_ROWS],
+                        allocated,
+                        multichannel_operations,
+                        multichannel_members,
+                    )
+                    del trough_to_trough[:MULTICHANNEL_ROWS]
+                    found = True
+        allocated_any |= found
+    return allocated_any
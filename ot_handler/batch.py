@@ -0,0 +1,211 @@
+"""
+Batching of liquid handling calls.
+
+Within `with lh.batch():`, transfer calls, and the distribute, pool, consolidate and stamp
+calls that delegate to transfer, are collected instead of run. When the batch ends, the
+collected calls are merged into as few transfers as possible, which share their tips, volleys
+and nozzle layout changes:
+
+- Calls are merged only if their transfer parameters and pipette keyword arguments are equal.
+- Calls taking a fresh tip "once" are merged only if they aspirate from the same source wells,
+  so that a tip never carries the liquid of one call into the sources of another.
+- A call is moved into an earlier transfer only if it does not depend on the calls of the
+  later transfers it passes, that is if it does not read a well they write, or write a well
+  they read. Additions to the same destination well do not depend on each other. A call may
+  depend on the calls of the transfer it joins, as transfer runs the operations in dependency
+  stages.
+"""
+
+import logging
+from dataclasses import dataclass, field
+
+from .plan import location_key
+
+logger = logging.getLogger(__name__)
+
+# new_tip strategies under which a tip only ever touches the liquid of one source
+_SOURCE_SAFE_TIPS = ("always", "on aspiration", "never")
+
+
+def _well_keys(wells):
+    keys = set()
+    for well in wells:
+        key = location_key(well)
+        keys.add(tuple(key) if isinstance(key, list) else key)
+    return keys
+
+
+@dataclass
+class BatchedCall:
+    """
+    A transfer call collected by a TransferBatch.
+
+    Attributes:
+        volumes (list): The volumes of the call.
+        source_wells (list): The source wells of the call.
+        destination_wells (list): The destination wells of the call.
+        parameters (dict): The transfer parameters of the call.
+        pipette_kwargs (dict): Additional keyword arguments for the pipette operations.
+    """
+
+    volumes: list
+    source_wells: list
+    destination_wells: list
+    parameters: dict
+    pipette_kwargs: dict
+    reads: set = field(init=False, repr=False)
+    writes: set = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.reads = _well_keys(self.source_wells)
+        self.writes = _well_keys(self.destination_wells)
+
+    def depends_on(self, other):
+        """
+        Whether the call must run after the other call, if the other call was issued first.
+        """
+        return bool(self.reads & other.writes or self.writes & other.reads)
+
+    def can_share_transfer(self, other):
+        if self.parameters != other.parameters or self.pipette_kwargs != other.pipette_kwargs:
+            return False
+        return self.parameters["new_tip"] in _SOURCE_SAFE_TIPS or self.reads == other.reads
+
+
+@dataclass
+class MergedTransfer:
+    """
+    Collected calls run as one transfer.
+
+    Attributes:
+        calls (list): Indexes of the calls in the order they were collected.
+        volumes (list): The volumes of the calls, concatenated.
+        source_wells (list): The source wells of the calls, concatenated.
+        destination_wells (list): The destination wells of the calls, concatenated.
+        parameters (dict): The transfer parameters.
+        pipette_kwargs (dict): Additional keyword arguments for the pipette operations.
+    """
+
+    calls: list
+    volumes: list
+    source_wells: list
+    destination_wells: list
+    parameters: dict
+    pipette_kwargs: dict
+
+    def call_index(self, index, batch):
+        """
+        Return the index of the call and the index within the call of an operation of the
+        transfer.
+        """
+        offset = index
+        for call in self.calls:
+            length = len(batch.calls[call].volumes)
+            if offset < length:
+                return call, offset
+            offset -= length
+        raise IndexError(f"Operation {index} is not in the merged transfer")
+
+
+class TransferBatch:
+    """
+    Transfer calls collected by LiquidHandler.batch.
+
+    Attributes:
+        calls (list): The collected BatchedCall of each call.
+        failed_operations (list): The failed operations of each call once the batch has run, as
+            returned by transfer, with the indexes referring to the lists of the call.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failed_operations = []
+        self._pending = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def add(self, volumes, source_wells, destination_wells, parameters, pipette_kwargs):
+        """
+        Collect a transfer call with normalized arguments. Returns the index of the call.
+        """
+        self.calls.append(
+            BatchedCall(
+                list(volumes),
+                list(source_wells),
+                list(destination_wells),
+                dict(parameters),
+                dict(pipette_kwargs),
+            )
+        )
+        self.failed_operations.append([])
+        self._pending.append(len(self.calls) - 1)
+        return len(self.calls) - 1
+
+    def merge(self):
+        """
+        Merge the calls collected since the last run into transfers, in the order they run.
+
+        Each call joins the latest transfer it can share, if it does not depend on the calls of
+        the later transfers. Otherwise it starts a new transfer.
+        """
+        merged = []
+        for index in self._pending:
+            call = self.calls[index]
+            target = None
+            for position in range(len(merged) - 1, -1, -1):
+                calls = [self.calls[i] for i in merged[position]]
+                if call.can_share_transfer(calls[0]):
+                    target = position
+                    break
+                if any(call.depends_on(other) for other in calls):
+                    break
+            if target is None:
+                merged.append([index])
+            else:
+                merged[target].append(index)
+
+        transfers = []
+        for indexes in merged:
+            calls = [self.calls[i] for i in indexes]
+            transfers.append(
+                MergedTransfer(
+                    calls=indexes,
+                    volumes=[volume for call in calls for volume in call.volumes],
+                    source_wells=[well for call in calls for well in call.source_wells],
+                    destination_wells=[well for call in calls for well in call.destination_wells],
+                    parameters=calls[0].parameters,
+                    pipette_kwargs=calls[0].pipette_kwargs,
+                )
+            )
+        return transfers
+
+    def run(self, run_transfer, transfers=None):
+        """
+        Run the calls collected since the last run as merged transfers.
+
+        Parameters:
+            run_transfer (callable): Runs a MergedTransfer and returns its failed operations, as
+                returned by transfer.
+            transfers (list, optional): The merged transfers returned by merge, if already
+                merged.
+
+        Returns:
+            list: The merged transfers that were run.
+        """
+        if transfers is None:
+            transfers = self.merge()
+        self._pending = []
+        if transfers:
+            logger.info(
+                "Running %s batched calls as %s transfers",
+                sum(len(merged.calls) for merged in transfers),
+                len(transfers),
+            )
+        for merged in transfers:
+            for source, destination, volume, index, reason in run_transfer(merged):
+                call, call_index = merged.call_index(index, self)
+                self.failed_operations[call].append(
+                    [source, destination, volume, call_index, reason]
+                )
+        return transfers
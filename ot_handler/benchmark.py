@@ -0,0 +1,322 @@
+"""
+Benchmarks of planning and simulated execution.
+
+Each workload builds a LiquidHandler in simulation mode, plans a representative liquid
+handling call and executes the plan on the simulated robot. The planning and execution CPU
+time, the number of pipette commands, the tips used and the estimated robot time are reported,
+so that regressions of the allocation and grouping show up as numbers. The import workloads
+time importing the planning modules and the LiquidHandler in a fresh interpreter:
+
+    python -m ot_handler.benchmark
+    python -m ot_handler.benchmark --workload stamp_96 --workload cherry_pick_384 --json out.json
+
+The 10k operation workloads are only planned, as simulating them takes minutes.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+TIP_RACK = "opentrons_96_tiprack_300ul"
+P20_TIP_RACK = "opentrons_96_tiprack_20ul"
+PLATE = "nest_96_wellplate_100ul_pcr_full_skirt"
+DEEP_PLATE = "nest_96_wellplate_2ml_deep"
+PLATE_384 = "corning_384_wellplate_112ul_flat"
+RESERVOIR = "nest_12_reservoir_15ml"
+SEED = 42
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    Measurements of a workload.
+
+    Attributes:
+        workload (str): Name of the workload.
+        operations (int): Number of liquid handling operations of the workload, None for the
+            import workloads.
+        planning_cpu_time (float): CPU time of planning in seconds, the best of the repeats.
+        execution_cpu_time (float): CPU time of the simulated execution in seconds, None if the
+            workload is not executed.
+        commands (int): Number of pipette commands, None for the allocation workload.
+        tips (int): Number of tips picked up, counting each channel of the p300_multi.
+        estimated_robot_time (float): Estimated run time on the robot in seconds.
+        import_time (float): Wall time of importing the modules of an import workload in a
+            fresh interpreter in seconds, the best of the repeats.
+    """
+
+    workload: str
+    operations: int
+    planning_cpu_time: float
+    execution_cpu_time: float = None
+    commands: int = None
+    tips: int = None
+    estimated_robot_time: float = None
+    import_time: float = None
+
+
+def _handler(trace=False):
+    from .liquid_handler import LiquidHandler
+
+    lh = LiquidHandler(simulation=True, load_default=False, trace=trace)
+    # The labware is in the front slots, so that the p300_multi in single tip mode, which
+    # reaches over the slot in front of the well, does not collide with the tip racks
+    lh.load_tips(TIP_RACK, 7)
+    lh.load_tips(TIP_RACK, 8)
+    lh.load_tips(TIP_RACK, 10, single_channel=True)
+    lh.load_tips(P20_TIP_RACK, 11, single_channel=True)
+    return lh
+
+
+def stamp_96(lh):
+    source = lh.load_labware(PLATE, 5, "source")
+    destination = lh.load_labware(PLATE, 6, "destination")
+    return "stamp", (50, source, destination), {}
+
+
+def cherry_pick_384(lh):
+    generator = random.Random(SEED)
+    source = lh.load_labware(PLATE_384, 5, "source")
+    destination = lh.load_labware(PLATE_384, 6, "destination")
+    source_wells = generator.sample(source.wells(), 384)
+    volumes = [generator.choice([2, 5, 10, 20, 40, 80]) for _ in range(384)]
+    return "transfer", (volumes, source_wells, destination.wells()), {}
+
+
+def trough_distribution(lh):
+    reservoir = lh.load_labware(RESERVOIR, 5, "reservoir")
+    plate = lh.load_labware(PLATE, 6, "plate")
+    return "distribute", (30, reservoir["A1"], plate.wells()), {}
+
+
+def multi_labware_pool(lh):
+    plates = [lh.load_labware(PLATE, slot, f"plate {slot}") for slot in (4, 5, 6)]
+    reservoir = lh.load_labware(RESERVOIR, 9, "reservoir")
+    source_wells = [well for plate in plates for well in plate.wells()[:48]]
+    return "pool", (5, source_wells, reservoir["A1"]), {}
+
+
+def mix_plate(lh):
+    plate = lh.load_labware(PLATE, 5, "plate")
+    return "mix", (plate.wells()[:48] + plate.wells()[60:70], 3, 50), {}
+
+
+def _synthetic_worklist(lh, count=10000):
+    generator = random.Random(SEED)
+    source = lh.load_labware(PLATE_384, 5, "source")
+    destination = lh.load_labware(DEEP_PLATE, 6, "destination")
+    source_wells = [generator.choice(source.wells()) for _ in range(count)]
+    destination_wells = [generator.choice(destination.wells()) for _ in range(count)]
+    volumes = [round(generator.uniform(1, 400), 1) for _ in range(count)]
+    return volumes, source_wells, destination_wells
+
+
+def synthetic_10k(lh):
+    volumes, source_wells, destination_wells = _synthetic_worklist(lh)
+    return "transfer", (volumes, source_wells, destination_wells), {}
+
+
+def allocation_10k(lh):
+    volumes, source_wells, destination_wells = _synthetic_worklist(lh)
+    volumes = [min(volume, lh.max_volume) for volume in volumes]
+    return "_allocate_liquid_handling_steps", (source_wells, destination_wells, volumes), {}
+
+
+def import_planning():
+    return ["ot_handler.plan", "ot_handler.allocation", "ot_handler.duration"]
+
+
+def import_liquid_handler():
+    return ["ot_handler.liquid_handler"]
+
+
+# Name, workload and mode: "execute" plans and executes in simulation, "plan" only plans,
+# "record" records the commands of a call that is not planned while executing it in simulation,
+# and "import" imports the modules returned by the workload in a fresh interpreter
+WORKLOADS = [
+    ("import_planning", import_planning, "import"),
+    ("import_liquid_handler", import_liquid_handler, "import"),
+    ("stamp_96", stamp_96, "execute"),
+    ("cherry_pick_384", cherry_pick_384, "execute"),
+    ("trough_distribution", trough_distribution, "execute"),
+    ("multi_labware_pool", multi_labware_pool, "execute"),
+    ("mix_plate", mix_plate, "record"),
+    ("synthetic_10k", synthetic_10k, "plan"),
+    ("allocation_10k", allocation_10k, "plan"),
+]
+
+
+def _operation_count(args):
+    for value in args:
+        if isinstance(value, list):
+            return len(value)
+    return 1
+
+
+def _count_tips(steps):
+    return sum(step.channels for step in steps if step.action == "pick_up_tip")
+
+
+def _estimate(lh, steps):
+    from .duration import estimate_steps
+
+    return estimate_steps(
+        steps, lh._location_point, lh._duration_model(), lh._tip_points()
+    ).total
+
+
+def _import_time(modules):
+    # A fresh interpreter, so that the modules imported before are not reused
+    code = (
+        "import importlib, time\n"
+        "started = time.perf_counter()\n"
+        f"for module in {modules!r}:\n"
+        "    importlib.import_module(module)\n"
+        "print(time.perf_counter() - started)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output)
+
+
+def run_workload(name, workload, mode="execute", repeat=1):
+    """
+    Run a workload and return its BenchmarkResult.
+
+    Parameters:
+        name (str): Name of the workload.
+        workload (callable): Loads the labware of the workload on a LiquidHandler and returns
+            the name, arguments and keyword arguments of the call, or returns the modules to
+            import for the "import" mode.
+        mode (str, optional): "execute", "plan", "record" or "import", see WORKLOADS.
+        repeat (int, optional): Number of times the planning is repeated. The best time is
+            reported.
+    """
+    from .plan import PlanStep
+
+    if mode == "import":
+        result = BenchmarkResult(name, None, planning_cpu_time=None)
+        result.import_time = min(_import_time(workload()) for _ in range(repeat))
+        return result
+
+    lh = _handler(trace=mode == "record")
+    operation, args, kwargs = workload(lh)
+    result = BenchmarkResult(name, _operation_count(args), planning_cpu_time=None)
+
+    if mode == "record":
+        started = time.process_time()
+        getattr(lh, operation)(*args, **kwargs)
+        result.execution_cpu_time = time.process_time() - started
+        steps = [
+            PlanStep(
+                event.action,
+                event.pipette,
+                event.pipette == "p20" or event.nozzle_mode == "single",
+                lh._resolve_location(event.well) if event.well else None,
+                event.volume,
+                repetitions=event.repetitions,
+                channels=event.channels,
+            )
+            for event in lh.trace
+        ]
+        result.commands = len(steps)
+        result.tips = _count_tips(steps)
+        result.estimated_robot_time = _estimate(lh, steps)
+        return result
+
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        if operation.startswith("_"):
+            plans = None
+            getattr(lh, operation)(*args, **kwargs)
+        else:
+            plans = lh._plan_operation(operation, *args, **kwargs)
+        timings.append(time.process_time() - started)
+    result.planning_cpu_time = min(timings)
+    if plans is None:
+        return result
+
+    # Split volumes are counted as one operation
+    result.operations = sum(len(set(plan.original_indexes)) for plan in plans)
+    steps = [step for plan in plans for step in plan.steps]
+    result.commands = len(steps)
+    result.tips = _count_tips(steps)
+    result.estimated_robot_time = _estimate(lh, steps)
+    if mode == "execute":
+        started = time.process_time()
+        for plan in plans:
+            lh.execute(plan)
+        result.execution_cpu_time = time.process_time() - started
+    return result
+
+
+def format_results(results):
+    """
+    Return the results as a text table.
+    """
+    columns = [
+        ("workload", "{}"),
+        ("operations", "{}"),
+        ("planning_cpu_time", "{:.3f}"),
+        ("execution_cpu_time", "{:.3f}"),
+        ("commands", "{}"),
+        ("tips", "{}"),
+        ("estimated_robot_time", "{:.0f}"),
+        ("import_time", "{:.3f}"),
+    ]
+    rows = [[name for name, _ in columns]]
+    for result in results:
+        rows.append(
+            [
+                "-" if getattr(result, name) is None else template.format(getattr(result, name))
+                for name, template in columns
+            ]
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows
+    )
+
+
+def main(argv=None):
+    names = [name for name, _, _ in WORKLOADS]
+    parser = argparse.ArgumentParser(description="Benchmark planning and simulated execution.")
+    parser.add_argument(
+        "--workload", action="append", choices=names, help="Workload to run, by default all."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Repeats of the planning and the imports."
+    )
+    parser.add_argument(
+        "--no-execute", action="store_true", help="Only plan, do not execute in simulation."
+    )
+    parser.add_argument("--json", help="Write the results to this JSON file.")
+    arguments = parser.parse_args(argv)
+
+    results = []
+    for name, workload, mode in WORKLOADS:
+        if arguments.workload and name not in arguments.workload:
+            continue
+        if arguments.no_execute and mode == "execute":
+            mode = "plan"
+        results.append(run_workload(name, workload, mode, arguments.repeat))
+    print(format_results(results))
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=4)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Clocks used by the LiquidHandler for all waits.
+
+On the robot, waiting has to take real time, e.g. for the liquid to settle during the
+retention time or for the shaker to run. In simulation, nothing needs to settle, so the
+virtual clock advances its time instantly instead, keeping track of the wall time the
+protocol would have spent waiting.
+"""
+
+import threading
+import time
+
+
+class SystemClock:
+    """
+    Clock that waits in real time.
+
+    Attributes:
+        elapsed (float): Total time waited in seconds.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, duration):
+        if duration <= 0:
+            return
+        time.sleep(duration)
+        with self._lock:
+            self.elapsed += duration
+
+
+class VirtualClock(SystemClock):
+    """
+    Clock that advances virtual time instead of waiting.
+
+    Attributes:
+        elapsed (float): Total virtual time waited in seconds.
+    """
+
+    def __init__(self, start=0.0):
+        super().__init__()
+        self.start = start
+
+    def now(self):
+        return self.start + self.elapsed
+
+    def sleep(self, duration):
+        if duration <= 0:
+            return
+        with self._lock:
+            self.elapsed += duration
@@ -0,0 +1,364 @@
+"""
+Resident LiquidHandler server with a local RPC API.
+
+Building a LiquidHandler imports the Opentrons libraries, loads the instruments and the deck
+and homes the robot. The server keeps one LiquidHandler and runs the commands of any number of
+jobs on it, received over a Unix socket:
+
+    python -m ot_handler.daemon --socket /tmp/ot_handler.sock
+
+Requests and responses are JSON objects, one per line. A request names the method and its
+arguments, e.g. {"id": 1, "method": "transfer", "args": [50, {"well": ["2", "A1"]},
+{"well": ["9", "B1"]}], "kwargs": {}}. Wells are referenced as {"well": [slot, well name]} or
+{"well": "trash"}, and labware as {"labware": slot}. The response holds the result or the error:
+{"id": 1, "result": []} or {"id": 1, "error": {"type": "ValueError", "message": "..."}}.
+
+The client does not import the Opentrons libraries. LocalClient runs the same requests on a
+LiquidHandler in the same process, e.g. in tests with simulation=True.
+"""
+
+import argparse
+import json
+import logging
+import numbers
+import os
+import socket
+import socketserver
+import stat
+import threading
+from functools import partial
+
+from .duration import DurationEstimate
+from .plan import location_key
+from .tips import TipBudget
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/ot_handler.sock"
+COMMANDS = [
+    "transfer",
+    "distribute",
+    "pool",
+    "consolidate",
+    "stamp",
+    "mix",
+    "estimate_duration",
+    "tip_budget",
+    "set_temperature",
+    "release_temperature",
+    "shake",
+    "start_shaking",
+    "stop_shaking",
+    "open_shaker_latch",
+    "close_shaker_latch",
+    "engage_magnets",
+    "disengage_magnets",
+    "home",
+    "drop_tips",
+    "sleep",
+    "load_labware",
+    "load_tips",
+    "load_module",
+    "unload_labware_from_slot",
+]
+
+
+class RemoteError(Exception):
+    """
+    Error raised by a command on the server.
+
+    Attributes:
+        type (str): The name of the exception class raised on the server.
+    """
+
+    def __init__(self, type, message):
+        super().__init__(f"{type}: {message}")
+        self.type = type
+
+
+def encode(value):
+    """
+    Convert a result to JSON serializable values, referencing wells and labware by deck slot.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): encode(item) for key, item in value.items()}
+    if isinstance(value, DurationEstimate):
+        return {"total": value.total, "by_action": value.by_action()}
+    if isinstance(value, TipBudget):
+        return {
+            "required": value.required,
+            "available": value.available,
+            "capacity": value.capacity,
+            "shortfall": value.shortfall,
+        }
+    if hasattr(value, "well_name"):
+        return {"well": location_key(value)}
+    if type(value).__name__ == "TrashBin":
+        return {"well": "trash"}
+    if hasattr(value, "load_name") and hasattr(value, "wells"):
+        return {"labware": location_key(value.wells()[0])[0]}
+    return repr(value)
+
+
+class Dispatcher:
+    """
+    Runs requests on a LiquidHandler. Requests are run one at a time.
+
+    Parameters:
+        handler (LiquidHandler): The liquid handler running the commands.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._lock = threading.Lock()
+
+    def decode(self, value):
+        """
+        Resolve the well and labware references of the arguments of a request.
+        """
+        if isinstance(value, list):
+            return [self.decode(item) for item in value]
+        if isinstance(value, dict):
+            if list(value) == ["well"]:
+                return self.handler._resolve_location(value["well"])
+            if list(value) == ["labware"]:
+                return self.handler.get_labware(value["labware"])
+            return {key: self.decode(item) for key, item in value.items()}
+        return value
+
+    def handle(self, request):
+        """
+        Run a request and return the response.
+        """
+        response = {"id": request.get("id")}
+        method = request.get("method")
+        try:
+            if method == "ping":
+                response["result"] = "pong"
+                return response
+            if method not in COMMANDS:
+                raise ValueError(f"Unknown command: {method}")
+            args = self.decode(request.get("args", []))
+            kwargs = self.decode(request.get("kwargs", {}))
+            with self._lock:
+                result = getattr(self.handler, method)(*args, **kwargs)
+            response["result"] = encode(result)
+        except Exception as e:
+            logger.exception("Command %s failed", method)
+            response["error"] = {"type": type(e).__name__, "message": str(e)}
+        return response
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"id": None, "error": {"type": "ValueError", "message": str(e)}}
+            else:
+                response = self.server.dispatcher.handle(request)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove the socket file left at the path by a server that has stopped.
+    """
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            logger.info("Removing the stale socket %s", socket_path)
+            os.remove(socket_path)
+            return
+    raise ValueError(f"Another server is listening on {socket_path}")
+
+
+class LiquidHandlerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server running the requests of its clients on one LiquidHandler.
+
+    Parameters:
+        socket_path (str): Path of the Unix socket. A stale socket file is replaced.
+        handler (LiquidHandler): The liquid handler running the commands.
+
+    Raises:
+        ValueError: If the path exists and is not a socket, or another server listens on it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, handler):
+        self.socket_path = socket_path
+        self.dispatcher = Dispatcher(handler)
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class LiquidHandlerClient:
+    """
+    Client of a LiquidHandlerServer. The commands of the LiquidHandler are available as
+    methods, e.g. client.transfer(50, client.well(2, "A1"), client.well(9, "B1")).
+
+    Parameters:
+        socket_path (str, optional): Path of the Unix socket of the server.
+        timeout (float, optional): Timeout of the connection in seconds. Defaults to None (no
+            timeout), as commands can take a long time.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+        self._request_id = 0
+
+    @staticmethod
+    def well(deck_position, well_name):
+        return {"well": [str(deck_position), well_name]}
+
+    @staticmethod
+    def wells(deck_position, well_names):
+        return [LiquidHandlerClient.well(deck_position, name) for name in well_names]
+
+    @staticmethod
+    def labware(deck_position):
+        return {"labware": str(deck_position)}
+
+    trash = {"well": "trash"}
+
+    def call(self, method, *args, **kwargs):
+        """
+        Run a command on the server and return its result.
+
+        Raises:
+            RemoteError: If the command raised an error on the server.
+        """
+        self._request_id += 1
+        response = self._send(
+            {"id": self._request_id, "method": method, "args": args, "kwargs": kwargs}
+        )
+        if "error" in response:
+            raise RemoteError(response["error"]["type"], response["error"]["message"])
+        return response["result"]
+
+    def ping(self):
+        return self.call("ping")
+
+    def __getattr__(self, name):
+        if name in COMMANDS:
+            return partial(self.call, name)
+        raise AttributeError(name)
+
+    def _send(self, request):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self.timeout)
+            self._socket.connect(self.socket_path)
+            self._file = self._socket.makefile("rb")
+        self._socket.sendall(json.dumps(request).encode() + b"\n")
+        line = self._file.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("The liquid handler server closed the connection.")
+        return json.loads(line)
+
+    def close(self):
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalClient(LiquidHandlerClient):
+    """
+    Client running the requests on a LiquidHandler in the same process, without a server.
+
+    Parameters:
+        handler (LiquidHandler): The liquid handler running the commands.
+    """
+
+    def __init__(self, handler):
+        super().__init__(socket_path=None)
+        self.dispatcher = Dispatcher(handler)
+
+    def _send(self, request):
+        # The requests are serialized like over the socket
+        response = self.dispatcher.handle(json.loads(json.dumps(request)))
+        return json.loads(json.dumps(response))
+
+    def close(self):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a LiquidHandler over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Path of the Unix socket.")
+    parser.add_argument("--simulation", action="store_true", help="Simulate the robot.")
+    parser.add_argument("--deck-layout", help="Path of a deck layout JSON file.")
+    parser.add_argument(
+        "--no-default", action="store_true", help="Do not load the default deck layout."
+    )
+    parser.add_argument("--warm-start", action="store_true", help="Skip homing when possible.")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve the metrics in the Prometheus text format on this local port.",
+    )
+    arguments = parser.parse_args(argv)
+
+    from .liquid_handler import LiquidHandler
+    from .log import configure_logging
+    from .metrics import MetricsServer
+
+    configure_logging()
+
+    handler = LiquidHandler(
+        simulation=arguments.simulation,
+        load_default=not arguments.no_default,
+        deck_layout=arguments.deck_layout,
+        warm_start=arguments.warm_start,
+        metrics=arguments.metrics_port is not None,
+    )
+    if arguments.metrics_port is not None:
+        MetricsServer(handler.metrics, port=arguments.metrics_port).start()
+    with LiquidHandlerServer(arguments.socket, handler) as server:
+        logger.info("Serving the liquid handler on %s", arguments.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopping the liquid handler server")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Estimation of the run time of planned liquid handling.
+
+The steps of a TransferPlan are timed with a simple kinematic model of the OT-2: moves rise to
+a travel height, cross the deck at the gantry speed and descend again, the plunger moves at
+the flow rates of the pipette, and tip handling, touching the tip and changing the nozzle
+layout take a fixed time. Delays, such as the retention time, and module waits count for
+their duration.
+"""
+
+import math
+from dataclasses import dataclass, field
+
+DEFAULT_FLOW_RATES = {
+    "p300_multi": {"aspirate": 94.0, "dispense": 94.0, "blow_out": 94.0},
+    "p20": {"aspirate": 7.56, "dispense": 7.56, "blow_out": 7.56},
+}
+
+
+@dataclass
+class DurationModel:
+    """
+    Timing parameters of the robot, in millimeters, microliters and seconds.
+
+    Attributes:
+        gantry_speed (float): Speed of the moves across the deck (mm/s).
+        z_speed (float): Speed of the vertical moves (mm/s).
+        travel_height (float): Height the pipette rises to between two locations (mm).
+        move_overhead (float): Acceleration and settling time of a move (s).
+        unknown_move_time (float): Time of a move to or from a location without coordinates (s).
+        flow_rates (dict): Aspirate, dispense and blow-out flow rates (µL/s) by pipette name.
+        blow_out_volume (float): Volume the plunger pushes during a blow-out (µL).
+        pick_up_tip_time, drop_tip_time, return_tip_time, touch_tip_time,
+        configure_nozzles_time (float): Fixed duration of the respective commands (s).
+    """
+
+    gantry_speed: float = 400.0
+    z_speed: float = 125.0
+    travel_height: float = 30.0
+    move_overhead: float = 0.3
+    unknown_move_time: float = 2.0
+    flow_rates: dict = field(default_factory=lambda: dict(DEFAULT_FLOW_RATES))
+    blow_out_volume: float = 20.0
+    pick_up_tip_time: float = 3.0
+    drop_tip_time: float = 2.5
+    return_tip_time: float = 3.0
+    touch_tip_time: float = 2.0
+    configure_nozzles_time: float = 0.5
+
+    def move_time(self, start, end):
+        """
+        Return the time to move between two XY coordinates, None standing for unknown ones.
+        """
+        if start is not None and start == end:
+            return 0.0
+        if start is None or end is None:
+            return self.unknown_move_time
+        vertical_time = 2 * self.travel_height / self.z_speed
+        return self.move_overhead + vertical_time + math.dist(start, end) / self.gantry_speed
+
+    def plunger_time(self, pipette, action, volume):
+        """
+        Return the time to move the given volume with the plunger of a pipette.
+        """
+        rates = self.flow_rates.get(pipette, DEFAULT_FLOW_RATES["p300_multi"])
+        return (volume or 0) / rates[action]
+
+
+@dataclass
+class DurationEstimate:
+    """
+    Estimated run time of a plan.
+
+    Attributes:
+        steps (list): Pairs of a PlanStep and its estimated duration in seconds.
+    """
+
+    steps: list = field(default_factory=list)
+
+    @property
+    def total(self):
+        return sum(duration for _, duration in self.steps)
+
+    def by_action(self):
+        """
+        Return the total duration of each action, such as "aspirate" or "delay".
+        """
+        durations = {}
+        for step, duration in self.steps:
+            durations[step.action] = durations.get(step.action, 0.0) + duration
+        return durations
+
+    def merge(self, estimate):
+        self.steps.extend(estimate.steps)
+
+    def __repr__(self):
+        return f"DurationEstimate(steps={len(self.steps)}, total={self.total:.1f} s)"
+
+
+def estimate_steps(steps, point_of, model=None, tip_points=None):
+    """
+    Estimate the duration of each step of a plan.
+
+    Parameters:
+        steps (list): PlanStep objects in the order they are executed.
+        point_of (callable): Returns the XY coordinates of a location, or None if unknown.
+        model (DurationModel, optional): Timing parameters. Defaults to DurationModel().
+        tip_points (dict, optional): XY coordinates of the tip racks by pipette name, used for
+            the moves of tip pick-ups.
+
+    Returns:
+        DurationEstimate: The duration of each step.
+    """
+    model = model or DurationModel()
+    tip_points = tip_points or {}
+    estimate = DurationEstimate()
+    position = None
+    for step in steps:
+        duration = 0.0
+        if step.action in ("aspirate", "dispense", "mix", "blow_out", "move_to"):
+            target = point_of(step.location)
+            duration += model.move_time(position, target)
+            position = target
+
+        if step.action in ("aspirate", "dispense"):
+            duration += model.plunger_time(step.pipette, step.action, step.volume)
+        elif step.action == "air_gap":
+            duration += model.plunger_time(step.pipette, "aspirate", step.volume)
+        elif step.action == "mix":
+            cycle = model.plunger_time(step.pipette, "aspirate", step.volume)
+            cycle += model.plunger_time(step.pipette, "dispense", step.volume)
+            duration += cycle * (step.repetitions or 1)
+        elif step.action == "blow_out":
+            duration += model.plunger_time(step.pipette, "blow_out", model.blow_out_volume)
+        elif step.action == "pick_up_tip":
+            target = tip_points.get(step.pipette)
+            duration += model.move_time(position, target) + model.pick_up_tip_time
+            position = target
+        elif step.action in ("drop_tip", "return_tip"):
+            # The tip is dropped over the trash or its tip rack, both away from the wells
+            duration += model.unknown_move_time
+            duration += getattr(model, f"{step.action}_time")
+            position = None
+        elif step.action == "touch_tip":
+            duration += model.touch_tip_time
+        elif step.action == "configure_nozzles":
+            duration += model.configure_nozzles_time
+        elif step.duration:
+            # Delays and module waits
+            duration += step.duration
+        estimate.steps.append((step, duration))
+    return estimate
@@ -0,0 +1,113 @@
+"""
+Registry of custom labware definitions.
+
+The labware folder is indexed once, on first use, and the definitions are parsed once and
+kept in memory. The parsed definitions can also be kept in a pickle file next to the
+definitions, so that they are not parsed again in the next session. Definitions are
+re-read whenever the modification time of their file changes.
+"""
+
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+LABWARE_CACHE_FILE = ".labware_definitions.pickle"
+
+
+class LabwareRegistry:
+    """
+    Parsed labware definitions of a folder, by load name (the file name without the .json
+    extension).
+
+    Parameters:
+        folder (str): Folder of the labware definition files.
+        cache_file (Union[str, bool], optional): Pickle file of the parsed definitions. True uses
+            a file named .labware_definitions.pickle in the folder. Defaults to None (no file).
+    """
+
+    def __init__(self, folder, cache_file=None):
+        self.folder = folder
+        if cache_file is True:
+            cache_file = os.path.join(folder, LABWARE_CACHE_FILE)
+        self.cache_file = cache_file or None
+        self._files = None
+        self._definitions = {}
+
+    def _index(self):
+        if self._files is not None:
+            return self._files
+        self._files = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        self._files[entry.name[: -len(".json")]] = entry.path
+        except FileNotFoundError:
+            pass
+        if self.cache_file:
+            self._definitions = self._read_cache_file()
+        logger.debug("Indexed %s labware definitions in %s", len(self._files), self.folder)
+        return self._files
+
+    def refresh(self):
+        """
+        Index the folder again, e.g. after adding labware definitions.
+        """
+        self._files = None
+
+    def names(self):
+        """
+        Return the load names of the labware definitions.
+        """
+        return sorted(self._index())
+
+    def __contains__(self, load_name):
+        return load_name in self._index()
+
+    def get(self, load_name):
+        """
+        Return the parsed definition of the labware, or None if the folder has no definition of
+        that name.
+        """
+        path = self._index().get(load_name)
+        if path is None:
+            return None
+        try:
+            modified = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        cached = self._definitions.get(load_name)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        with open(path) as f:
+            definition = json.load(f)
+        self._definitions[load_name] = (modified, definition)
+        if self.cache_file:
+            self._write_cache_file()
+        return definition
+
+    def _read_cache_file(self):
+        try:
+            with open(self.cache_file, "rb") as f:
+                definitions = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Ignoring unreadable labware cache %s: %s", self.cache_file, e)
+            return {}
+        return definitions if isinstance(definitions, dict) else {}
+
+    def _write_cache_file(self):
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        try:
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(file_descriptor, "wb") as f:
+                pickle.dump(self._definitions, f)
+            os.replace(temporary_path, self.cache_file)
+        except OSError as e:
+            logger.warning("Could not write the labware cache %s: %s", self.cache_file, e)
@@ -0,0 +1,68 @@
+"""
+Location of the default deck layout file.
+
+The default layout is looked up in an explicit list of directories or files, without scanning
+directory trees: first the search path given to the LiquidHandler, then the entries of the
+OT_HANDLER_LAYOUT_PATH environment variable (separated by os.pathsep), then the package
+directory and finally the current working directory. The resolved location is cached for
+each search path.
+"""
+
+import os
+
+DEFAULT_LAYOUT_FILE = "default_layout.ot2"
+LAYOUT_PATH_VARIABLE = "OT_HANDLER_LAYOUT_PATH"
+PACKAGE_DIRECTORY = os.path.dirname(__file__)
+
+_resolved_layouts = {}
+
+
+def layout_search_path(search_path=None):
+    """
+    Return the directories and files searched for the default layout, in order of precedence.
+
+    Parameters:
+        search_path (Union[str, list of str], optional): Directory or layout file, or list of
+            them, searched first.
+    """
+    if isinstance(search_path, (str, os.PathLike)):
+        search_path = [search_path]
+    entries = [os.fspath(entry) for entry in search_path or []]
+    environment_path = os.environ.get(LAYOUT_PATH_VARIABLE)
+    if environment_path:
+        entries += [entry for entry in environment_path.split(os.pathsep) if entry]
+    entries += [PACKAGE_DIRECTORY, os.getcwd()]
+    return entries
+
+
+def _layout_candidate(entry):
+    if entry.endswith(".ot2"):
+        return entry
+    return os.path.join(entry, DEFAULT_LAYOUT_FILE)
+
+
+def resolve_default_layout(search_path=None):
+    """
+    Return the path of the default layout file.
+
+    Parameters:
+        search_path (Union[str, list of str], optional): Directory or layout file, or list of
+            them, searched before the environment variable, the package directory and the
+            working directory.
+
+    Returns:
+        str: The first existing layout file of the search path. If none exists, the location
+        where a new layout file is created, i.e. the candidate of the first entry.
+    """
+    entries = tuple(layout_search_path(search_path))
+    path = _resolved_layouts.get(entries)
+    if path is not None and os.path.isfile(path):
+        return path
+
+    for entry in entries:
+        candidate = _layout_candidate(entry)
+        if os.path.isfile(candidate):
+            _resolved_layouts[entries] = candidate
+            return candidate
+    # Not cached, so that a layout file created later is found
+    return _layout_candidate(entries[0])
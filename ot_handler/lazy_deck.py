@@ -0,0 +1,75 @@
+"""
+Lazy loading of the labware of a deck layout.
+
+In lazy deck mode, the labware and tip racks of a deck layout are registered as proxies
+instead of being loaded into the protocol. A proxy loads its labware the first time the
+labware is used, e.g. when a well is accessed, while the definition metadata, such as the
+height of the labware, is available without loading it.
+"""
+
+
+class LazyLabware:
+    """
+    Proxy of a labware of the deck layout, loaded on first use.
+
+    Attributes and items that are not attributes of the proxy are looked up on the loaded
+    labware, so the proxy can be used in place of the labware, e.g. proxy["A1"].
+
+    Parameters:
+        slot (str): The deck slot of the labware.
+        load_name (str): The load name of the labware.
+        kind (str): "labware", "multichannel_tips" or "single_channel_tips".
+        loader (callable): Loads the labware into the protocol and returns it.
+        definition_loader (callable): Returns the labware definition of a load name.
+    """
+
+    def __init__(self, slot, load_name, kind, loader, definition_loader):
+        self.slot = slot
+        self.load_name = load_name
+        self.kind = kind
+        self._loader = loader
+        self._definition_loader = definition_loader
+        self._definition = None
+        self._labware = None
+
+    @property
+    def loaded(self):
+        return self._labware is not None
+
+    def load(self):
+        """
+        Return the labware, loading it into the protocol on first use.
+        """
+        if self._labware is None:
+            self._labware = self._loader()
+        return self._labware
+
+    @property
+    def definition(self):
+        if self._definition is None:
+            self._definition = self._definition_loader(self.load_name)
+        return self._definition
+
+    @property
+    def height(self):
+        """
+        Height of the labware in millimeters, from its definition.
+        """
+        return self.definition["dimensions"]["zDimension"]
+
+    @property
+    def is_tiprack(self):
+        return self.kind != "labware"
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"LazyLabware({self.load_name} in slot {self.slot}, {state})"
@@ -4,22 +4,110 @@ import opentrons.execute
 from opentrons.protocol_api.labware import Well, Labware
 from opentrons.protocol_api.labware import OutOfTipsError
 from opentrons.protocol_api.disposal_locations import TrashBin
-from opentrons.protocol_engine.errors import ProtocolCommandFailedError
+from opentrons.protocols.labware import get_labware_definition
 from threading import Thread
+from contextlib import ExitStack, contextmanager, nullcontext
 import os
-import time
+import functools
+import inspect
 import math
 import logging
 import json
+import numpy as np
+
+from .allocation import allocate_operations
+from .batch import TransferBatch
+from .clock import SystemClock, VirtualClock
+from .duration import DurationEstimate, DurationModel, estimate_steps
+from .labware_registry import LabwareRegistry
+from .layout import resolve_default_layout
+from .lazy_deck import LazyLabware
+from .operation_table import OperationTable
+from .packing import VOLLEY_PACKING_STRATEGIES, pack_volumes
+from .path import TravelReport, order_operation_sets, well_point
+from .plan import (
+    CONFIGURATION_CHANNELS,
+    PipettePlan,
+    PlanStep,
+    StepRecorder,
+    TransferPlan,
+    Volley,
+    location_key,
+)
+from .plan_cache import PlanCache
+from .metrics import LiquidHandlerMetrics
+from .robot_state import RobotState
+from .tips import (
+    InsufficientTipsError,
+    TipBudget,
+    TipOccupancy,
+    TipTrackingPipette,
+    count_required_tips,
+    count_tips,
+)
+from .trace import ExecutionTrace, TracedPipette
 
-log_filepath = "ot_handler.log"
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    filename=log_filepath,
-    filemode="w",  # use 'w' for overwrite mode, 'a' for append mode
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.DEBUG,
-)
+# Operations that are run as transfers, and can be planned and estimated
+TRANSFER_OPERATIONS = ["transfer", "distribute", "pool", "consolidate", "stamp"]
+
+
+class _FailedOperations:
+    """
+    Registry of the failed operations of a transfer, keyed by the index of the operation.
+
+    Each operation is recorded once, with the reason of its first failure.
+
+    Parameters:
+        original_indexes: Index of each operation in the lists originally passed to transfer.
+    """
+
+    def __init__(self, original_indexes):
+        self.original_indexes = original_indexes
+        self._operations = {}
+
+    def add(self, index, reason, source, destination, volume):
+        """
+        Record a failed operation. Returns False if the operation has already failed.
+        """
+        if index in self._operations:
+            return False
+        self._operations[index] = (source, destination, volume, reason)
+        return True
+
+    def as_list(self):
+        """
+        Return the failed operations as [source, destination, volume, index, reason] sorted by
+        the original index.
+        """
+        return [
+            [source, destination, volume, int(self.original_indexes[index]), reason]
+            for index, (source, destination, volume, reason) in sorted(self._operations.items())
+        ]
+
+
+def _timed_transfer(transfer):
+    # Observes the latency of transfer calls in the metrics of the liquid handler
+    @functools.wraps(transfer)
+    def timed_transfer(self, *args, **kwargs):
+        if self.metrics is None:
+            return transfer(self, *args, **kwargs)
+        with self.metrics.time_transfer():
+            return transfer(self, *args, **kwargs)
+
+    return timed_transfer
+
+
+def _runs_batch_first(method):
+    # Runs the calls collected by an open batch before the method drives the robot, so that the
+    # protocol keeps its order
+    @functools.wraps(method)
+    def method_after_batch(self, *args, **kwargs):
+        self._flush_batch()
+        return method(self, *args, **kwargs)
+
+    return method_after_batch
 
 
 class LiquidHandler:
@@ -31,6 +119,18 @@ class LiquidHandler:
         max_volume=None,
         deck_layout=None,
         labware_folder=None,
+        plan_cache=None,
+        clock=None,
+        layout_search_path=None,
+        labware_cache_file=None,
+        lazy_deck: bool = False,
+        warm_start: bool = False,
+        state_file: str = None,
+        trace=False,
+        metrics=False,
+        tip_check: str = None,
+        persist_tips: bool = False,
+        keep_nozzle_layout: bool = False,
     ):
         """
         Initialize a LiquidHandler instance.
@@ -45,20 +145,55 @@ class LiquidHandler:
             max_volume: Custom maximum volume setting for pipette transfers in ul. If not provided, defaults to the pipette's inherent max volume.
             deck_layout (Union[str, dict]): Path to a JSON file or dictionary containing deck layout configuration. If provided, overrides load_default.
             labware_folder (str): Path to a folder containing labware definitions. If provided, overrides the default labware folder.
+            plan_cache (Union[str, PlanCache]): Directory or PlanCache for caching transfer plans on disk. Planning is skipped for transfers that have been planned before with the same deck layout. Defaults to None (no caching).
+            clock (SystemClock): Clock used for all waits, such as the retention time and shaking. Defaults to a VirtualClock in simulation mode, which advances virtual time instead of waiting, and to a SystemClock otherwise. The time waited is available as clock.elapsed.
+            layout_search_path (Union[str, list of str]): Directory or file, or list of directories or files, searched for 'default_layout.ot2' before the entries of the OT_HANDLER_LAYOUT_PATH environment variable, the package directory and the working directory. Directories are not searched recursively.
+            labware_cache_file (Union[str, bool]): Pickle file for caching the parsed custom labware definitions between sessions. True stores the cache in the labware folder. Defaults to None (definitions are cached in memory only).
+            lazy_deck (bool): If True, the labware and tip racks of the deck layout are registered as LazyLabware proxies and loaded into the protocol the first time they are used, instead of on construction. Modules are loaded on construction. Defaults to False.
+            warm_start (bool): If True, the robot state is persisted in a state file, and homing and closing the labware latch are skipped on construction when the previous session ended cleanly on the same boot of the robot. On cleanup, tips are dropped but the robot is not homed and the latch stays closed. Defaults to False.
+            state_file (str): Path of the robot state file used with warm_start. Defaults to 'ot_handler_state.json' in the working directory.
+            trace (Union[bool, ExecutionTrace]): If True, each pipette command and retention wait of transfer, execute and mix is recorded as a TraceEvent in lh.trace, with its pipette, nozzle mode, volume, well, operation indexes and start and end time of lh.clock. The trace can be written as JSON Lines or Parquet with lh.trace.write. Defaults to False (no trace).
+            metrics (Union[bool, LiquidHandlerMetrics]): If True, the tips consumed, aspirations, dispenses and volume dispensed per pipette, the failed operations per reason, the retention time and the latency of transfer calls are counted in lh.metrics, which can be served in the Prometheus text format with MetricsServer. Defaults to False (no metrics).
+            tip_check (str): Check before each transfer, executed plan and mix that the tip racks hold the tips it needs, per pipette and nozzle layout. "raise" raises an InsufficientTipsError before any liquid is handled. "refill" pauses the protocol for refilling the tip racks that are short and marks them full, and raises if even full racks are not enough. Defaults to None (no check); lh.tip_budget counts the tips of an operation on demand.
+            persist_tips (bool): If True, the tips used from each tip rack are stored per deck slot in the state file after every tip pick-up and return, and a tip rack loaded later into the same slot with the same load name continues with the tips left, also in the next sessions. Defaults to False (tip racks are assumed full when loaded).
+            keep_nozzle_layout (bool): If True, transfer, execute and mix leave the p300_multi in the nozzle layout of their last operations, so that consecutive calls in the same layout do not reconfigure the nozzles, until drop_tips sets it back to all nozzles. Defaults to False (the p300_multi is set back to all nozzles at the end of each call).
         """
         # Check for conflicting parameters
         if load_default and deck_layout is not None:
-            logging.warning(
+            logger.warning(
                 "Both load_default=True and deck_layout provided. The deck_layout will override the default layout."
             )
 
         # initialize protocol API
-        logging.info(f"Initializing protocol API with version {api_version}")
+        logger.info("Initializing protocol API with version %s", api_version)
         if simulation:
             self.protocol_api = opentrons.simulate.get_protocol_api(api_version)
         else:
             self.protocol_api = opentrons.execute.get_protocol_api(api_version)
         self.simulation_mode = simulation
+        self.layout_search_path = layout_search_path
+        self.lazy_deck = lazy_deck
+        self.deck_proxies = {}
+        if clock is None:
+            clock = VirtualClock() if simulation else SystemClock()
+        self.clock = clock
+        self.trace = ExecutionTrace(clock.now) if trace is True else (trace or None)
+        self.metrics = LiquidHandlerMetrics() if metrics is True else (metrics or None)
+        if tip_check not in (None, "raise", "refill"):
+            raise ValueError(f"tip_check must be None, 'raise' or 'refill', got {tip_check!r}")
+        self.tip_check = tip_check
+        # Loaded before the deck layout, which restores the tip racks
+        self.tip_occupancy = (
+            TipOccupancy(RobotState(state_file), out_of_tips_error=OutOfTipsError)
+            if persist_tips
+            else None
+        )
+        # Trace of the pipette commands, also recorded for the metrics when there is no trace
+        self._command_trace = self.trace
+        if self.metrics is not None:
+            if self._command_trace is None:
+                self._command_trace = ExecutionTrace(clock.now, keep_events=False)
+            self._command_trace.listeners.append(self.metrics.observe)
 
         # default values
         self.p300_tips = []
@@ -68,6 +203,11 @@ class LiquidHandler:
         self.temperature_timer = None
         self.shaking_timer = None
         self.single_tip_mode = False
+        self.p300_channels = 8
+        self.keep_nozzle_layout = keep_nozzle_layout
+        self.travel_report = None
+        self._batch = None
+        self.plan_cache = PlanCache(plan_cache) if isinstance(plan_cache, str) else plan_cache
         self.p300_multi = None
         self.p20 = None
         self.temperature_module = None
@@ -76,6 +216,7 @@ class LiquidHandler:
         self.labware_folder = (
             labware_folder if labware_folder else os.path.join(os.path.dirname(__file__), "labware")
         )
+        self.labware_registry = LabwareRegistry(self.labware_folder, labware_cache_file)
         self.p300_multi = self.protocol_api.load_instrument(
             "p300_multi_gen2", "right", tip_racks=self.p300_tips
         )
@@ -99,27 +240,46 @@ class LiquidHandler:
             self.load_default_labware()
 
         # load fixed hardware
-        logging.info("Loading instruments")
+        logger.info("Loading instruments")
         self.trash = self.protocol_api.fixed_trash
 
         if len(self.p300_multi.tip_racks) == 0:
-            logging.warning(
+            logger.warning(
                 "No tip racks confiugured for the pipette. Use lh.p300_multi.configure_nozzle_layout() to load the tips."
             )
 
         if len(self.p20.tip_racks) == 0:
-            logging.warning(
+            logger.warning(
                 "No tip racks confiugured for the pipette. Use lh.p20.configure_nozzle_layout() to load the tips."
             )
 
-        logging.info("Closing labware latch")
-        self.close_shaker_latch()
+        self.robot_state = RobotState(state_file, simulation=simulation) if warm_start else None
+        if self.robot_state is not None and self.robot_state.position_trusted():
+            logger.info(
+                "Warm start: reusing the robot state of the previous session without homing"
+            )
+            if not self.robot_state.load().get("latch_closed"):
+                self.close_shaker_latch()
+        else:
+            logger.info("Closing labware latch")
+            self.close_shaker_latch()
 
-        self.home()
+            self.home()
+        if self.robot_state is not None:
+            # Until the session ends cleanly, the next session cannot trust the position
+            self.robot_state.save(
+                position_trusted=False, latch_closed=True, simulation=self.simulation_mode
+            )
 
     def __del__(self):
-        if not self.simulation_mode:
-            logging.info(
+        if getattr(self, "robot_state", None) is not None:
+            logger.info("Dropping the tips and keeping the robot state for the next session.")
+            self.drop_tips(True)
+            self.robot_state.save(
+                position_trusted=True, latch_closed=True, simulation=self.simulation_mode
+            )
+        elif not self.simulation_mode:
+            logger.info(
                 "Homing the robot and opening the labware latch as a part of the cleanup procedure."
             )
             self.home()
@@ -129,7 +289,7 @@ class LiquidHandler:
         """
         Count the number of columns to cover all samples. Used for multichannel pipetting.
         """
-        logging.debug(f"Counting columns for {plate_object} with {sample_count} samples")
+        logger.debug("Counting columns for %s with %s samples", plate_object, sample_count)
         total_rows = len(plate_object.columns()[0])
         return math.ceil(sample_count / total_rows) * total_rows
 
@@ -137,38 +297,90 @@ class LiquidHandler:
         """
         Set the single tip mode of the p300_multi.
         """
-        if state and not self.single_tip_mode:
-            if self.p300_multi.has_tip:
-                self.p300_multi.drop_tip()
+        return self._set_nozzle_layout(1 if state else 8) == 1
+
+    def _set_nozzle_layout(self, channels: int):
+        """
+        Set the nozzle layout of the p300_multi by the number of channels picking up tips: 8 for all nozzles,
+        1 for single tip mode with the back nozzle A1, or 4 or 2 for a partial column of the front nozzles
+        from H1. Attached tips are dropped before the layout changes.
+        """
+        if channels == self.p300_channels:
+            return channels
+        if self.p300_multi.has_tip:
+            self.p300_multi.drop_tip()
+        if channels == 8:
+            self.p300_multi.configure_nozzle_layout(
+                style=opentrons.protocol_api.ALL, tip_racks=self.p300_tips
+            )
+        elif channels == 1:
             self.p300_multi.configure_nozzle_layout(
                 style=opentrons.protocol_api.SINGLE, start="A1", tip_racks=self.single_p300_tips
             )
-            self.single_tip_mode = True
-        elif not state and self.single_tip_mode:
-            if self.p300_multi.has_tip:
-                self.p300_multi.drop_tip()
+        else:
             self.p300_multi.configure_nozzle_layout(
-                style=opentrons.protocol_api.ALL, tip_racks=self.p300_tips
+                style=opentrons.protocol_api.PARTIAL_COLUMN,
+                start="H1",
+                end=f"{'ABCDEFGH'[8 - channels]}1",
+                tip_racks=self.p300_tips,
             )
-            self.single_tip_mode = False
-        return self.single_tip_mode
+        self.p300_channels = channels
+        self.single_tip_mode = channels == 1
+        return channels
+
+    def _traced_pipettes(self):
+        """
+        Return the p300_multi and p20, recording their commands in the trace if tracing is enabled.
+        """
+        p300_multi, p20 = self.p300_multi, self.p20
+        if self.tip_occupancy is not None:
+            p300_multi = TipTrackingPipette(p300_multi, self.tip_occupancy, self._tip_kind)
+            p20 = TipTrackingPipette(p20, self.tip_occupancy, lambda: "p20")
+        if self._command_trace is None:
+            return p300_multi, p20
+        return (
+            TracedPipette(p300_multi, "p300_multi", self._command_trace, self._nozzle_mode),
+            TracedPipette(p20, "p20", self._command_trace, lambda: "all"),
+        )
+
+    def _tip_kind(self):
+        return "p300_single" if self.single_tip_mode else "p300_multi"
+
+    def _nozzle_mode(self):
+        if self.p300_channels == 8:
+            return "all"
+        return "single" if self.single_tip_mode else "partial"
+
+    def _traced_wait(self, duration):
+        if duration <= 0:
+            return
+        with self._command_trace.step("delay"):
+            self.clock.sleep(duration)
+
+    @staticmethod
+    def _mapped_trace_indexes(trace, *index_maps):
+        """
+        Map the operation indexes of the trace through the given index maps, outermost first.
+        """
+        if trace is None:
+            return nullcontext()
+        stack = ExitStack()
+        for indexes in index_maps:
+            stack.enter_context(trace.mapped_indexes(indexes))
+        return stack
 
     def _save_labware_to_default(
         self, labware, model_string, deck_position, is_single_channel=False
     ):
         deck_position = str(deck_position)
         try:
-            default_file = os.path.join(os.path.dirname(__file__), "default_layout.ot2")
-            if not os.path.isfile(default_file):
-                for root, dirs, files in os.walk(os.getcwd()):
-                    if default_file in files:
-                        default_file = os.path.join(root, default_file)
-                        break
+            default_file = resolve_default_layout(self.layout_search_path)
             with open(default_file) as f:
                 default_layout = json.load(f)
         except FileNotFoundError:
-            logging.warning(
-                f"The default layout file 'default_layout.ot2' does not exist. Creating an empty file at: {default_file}"
+            logger.warning(
+                "The default layout file 'default_layout.ot2' does not exist. Creating an empty file at: %s",
+                default_file,
             )
             default_layout = {
                 "labware": {},
@@ -198,9 +410,17 @@ class LiquidHandler:
         msg = f"{model_string} is now loaded on position {deck_position} by default."
         if old != model_string:
             msg += " This overrides the previous value of {old}."
-        logging.info(msg)
+        logger.info(msg)
 
-    def _allocate_liquid_handling_steps(self, source_wells, destination_wells, volumes):
+    def _allocate_liquid_handling_steps(
+        self,
+        source_wells,
+        destination_wells,
+        volumes,
+        operation_table=None,
+        multichannel_members=None,
+        partial_operations=None,
+    ):
         """
         Allocates the provided liquid handling operations into three categories optimally:
         - p300 multichannel compatible operations
@@ -214,24 +434,20 @@ class LiquidHandler:
         - Alignment of the operation (column-wise vs. well-wise vs. vertical well like a trough)
         - Accessibility of the p300 pipette in single tip mode
 
+        Parameters:
+            source_wells (list): Source well of each operation.
+            destination_wells (list): Destination well of each operation.
+            volumes (list): Volume of each operation.
+            operation_table (OperationTable, optional): The same operations as a table, if already built.
+            multichannel_members (dict, optional): If provided, filled with the indexes of the eight operations covered by each multichannel operation, keyed by the index of the multichannel operation.
+            partial_operations (dict, optional): If provided, operations between matching rows that do not fill a column are allocated to partial columns of the p300_multi, and filled with the partial column operations keyed by the number of tips.
+
         Raises:
             ValueError: If the number of source wells, destination wells, and volumes do not match.
             ValueError: If a well is used as both a source and destination.
             ValueError: If operations involve different labware.
         """
 
-        def get_column_index(well):
-            if isinstance(well, Well):
-                return well.well_name[1:]
-            if isinstance(well, TrashBin):
-                return "1"
-
-        def get_row_index(well):
-            if isinstance(well, Well):
-                return well.well_name[0]
-            if isinstance(well, TrashBin):
-                return "A"
-
         # Check that parameters are compatible with this function
         if not (isinstance(source_wells, list) and source_wells and isinstance(source_wells[0], Well)):
             raise ValueError("The source_wells must be a list of Well objects")
@@ -249,226 +465,58 @@ class LiquidHandler:
                 "The number of wells in source and destination must be equal to the number of volumes provided."
             )
 
-        source_labware = source_wells[0].parent
-        for well in source_wells:
-            if well.parent != source_labware:
-                raise ValueError("The operations to allocate must be between up to two labware.")
+        if operation_table is None:
+            operation_table = OperationTable(source_wells, destination_wells, volumes)
+        if (
+            len(operation_table.source_labware) > 1
+            or len(operation_table.destination_labware) > 1
+        ):
+            raise ValueError("The operations to allocate must be between up to two labware.")
+        source_labware = operation_table.source_labware[0]
+        destination_labware = operation_table.destination_labware[0]
 
         if isinstance(destination_wells[0], Well):  # Could also be TrashBin
-            destination_labware = destination_wells[0].parent
-            for well in destination_wells:
-                if well.parent != destination_labware:
-                    raise ValueError(
-                        "The operations to allocate must be between up to two labware."
-                    )
-
-            source_well_names = {well.well_name for well in source_wells}
-            destination_well_names = {well.well_name for well in destination_wells}
-            if source_labware == destination_labware and source_well_names.intersection(
-                destination_well_names
-            ):
+            if source_labware == destination_labware and set(
+                operation_table.source_names
+            ).intersection(operation_table.destination_names):
                 raise ValueError(
-                    "A well cannot be both a source and destination, because this function cannot be used for order-dependent liquid handling operations."
+                    "A well cannot be both a source and destination of the allocated operations. Order-dependent operations are planned in dependency stages by transfer, but an operation cannot have the same source and destination well."
                 )
-        else:
-            destination_labware = destination_wells[0]
-
-        # Construct helper dictionaries to assist in well allocation
-        pipette = self.p300_multi
-        column_operations = {}
-        large_volume_operations = []
-        for i, source, dest, vol in zip(
-            range(len(volumes)), source_wells, destination_wells, volumes
-        ):
-            if vol > pipette.min_volume:
-                op = (i, source, dest, vol)
-                large_volume_operations.append(op)
-                key = (get_column_index(source), get_column_index(dest))
-                column_operations.setdefault(key, []).append(op)
-
-        # Search for column-wise operations with equal volumes
-        multichannel_operations = []
-        multichannel_operations_indexes = []
-        for key, column_ops in column_operations.items():
-            if len(column_ops) >= 8:
-                volumes_set = set(op[3] for op in column_ops)
-                for vol in volumes_set:
-                    matching_volumes = [
-                        op
-                        for op in column_ops
-                        if op[3] == vol and op[0] not in multichannel_operations_indexes
-                    ]
-                    # Eight column-wise operations with the same volume exist
-                    if len(matching_volumes) >= 8:
-                        found = True
-                        while found:
-                            found = False
-                            # Scenario 1: row indexes match and populate the whole column
-                            matching_rows = [
-                                op
-                                for op in matching_volumes
-                                if get_row_index(op[1]) == get_row_index(op[2])
-                            ]
-                            row_indices_source = {get_row_index(op[1]) for op in matching_rows}
-                            row_indices_dest = {get_row_index(op[2]) for op in matching_rows}
-                            if len(row_indices_source) == 8 and len(row_indices_dest) == 8:
-                                # We have 8 addressed unique matching rows. Now capture those operations
-                                ops_collection = {get_row_index(op[1]): op for op in matching_rows}
-
-                                if len(ops_collection) == 8:
-                                    multichannel_operations.append(ops_collection["A"])
-                                    multichannel_operations_indexes.extend(
-                                        [op[0] for op in ops_collection.values()]
-                                    )
-                                    matching_volumes = [
-                                        op
-                                        for op in matching_volumes
-                                        if op[0] not in multichannel_operations_indexes
-                                    ]
-                                    found = True
-                            else:
-                                # Scenario 2: source or destination well can fit all multichannel pipettes
-                                # Find a well that is present at least 8 times
-                                source_well_names = [op[1].well_name for op in matching_volumes]
-                                destination_well_names = [
-                                    op[2].well_name if isinstance(op[2], Well) else "A1"
-                                    for op in matching_volumes
-                                ]
-                                source_well_count = {}
-                                destination_well_count = {}
-                                for well_name in source_well_names:
-                                    source_well_count[well_name] = (
-                                        source_well_count.get(well_name, 0) + 1
-                                    )
-                                for well_name in destination_well_names:
-                                    destination_well_count[well_name] = (
-                                        destination_well_count.get(well_name, 0) + 1
-                                    )
-
-                                source_troughs = []
-                                for name, count in source_well_count.items():
-                                    well = source_labware.wells(name)[0]
-                                    if count >= 8 and hasattr(well, "width") and well.width and well.width > 70:
-                                        source_troughs.append(well)
-
-                                destination_troughs = []
-                                if isinstance(destination_labware, TrashBin):
-                                    destination_troughs.append(destination_labware)
-                                else:
-                                    for name, count in destination_well_count.items():
-                                        well = destination_labware.wells(name)[0]
-                                        if (
-                                            count >= 8
-                                            and hasattr(well, "width")
-                                            and well.width > 70
-                                        ):
-                                            destination_troughs.append(well)
-                                # Check transfers between troughs and columns
-                                check_set = [
-                                    (source_troughs, destination_troughs, 2, 1),
-                                    (destination_troughs, source_troughs, 1, 2),
-                                ]
-                                for primary, secondary, idxa, idxb in check_set:
-                                    for well in primary:
-                                        # Primary is a trough
-                                        ops = [
-                                            op
-                                            for op in matching_volumes
-                                            if op[idxb] == well
-                                            and op[0] not in multichannel_operations_indexes
-                                        ]
-                                        if len(ops) >= 8:
-                                            found2 = True
-                                            while found2:
-                                                found2 = False
-                                                # Scenario 1: secondary is a column
-                                                ops_collection = {
-                                                    get_row_index(op[idxa]): op for op in ops
-                                                }
-                                                if len(ops_collection) == 8:
-                                                    multichannel_operations.append(
-                                                        ops_collection["A"]
-                                                    )
-                                                    multichannel_operations_indexes.extend(
-                                                        [op[0] for op in ops_collection.values()]
-                                                    )
-                                                    ops = [
-                                                        op
-                                                        for op in ops
-                                                        if op[0]
-                                                        not in multichannel_operations_indexes
-                                                    ]
-                                                    found = True
-                                                    found2 = True
-                                                else:
-                                                    # Scenario 2: secondary is a trough
-                                                    for dest_well in secondary:
-                                                        trough_to_trough = [
-                                                            op for op in ops if op[2] == dest_well
-                                                        ]
-                                                        while len(trough_to_trough) >= 8:
-                                                            # Operations are identical; add the first one
-                                                            multichannel_operations.append(
-                                                                trough_to_trough[0]
-                                                            )
-                                                            multichannel_operations_indexes.extend(
-                                                                [
-                                                                    op[0]
-                                                                    for op in trough_to_trough[:8]
-                                                                ]
-                                                            )
-                                                            del trough_to_trough[:8]
-                                                            found = True
-                                                            found2 = True
-                                                            ops = [
-                                                                op
-                                                                for op in ops
-                                                                if op[0]
-                                                                not in multichannel_operations_indexes
-                                                            ]
-
-        allocated_operations = multichannel_operations_indexes
-        p300_single_ops = []
-        p20_ops = []
-        labware_forcing_p20 = [
-            "opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical",
-            "opentrons_10_tuberack_nest_4x50ml_6x15ml_conical",
-            "opentrons_15_tuberack_falcon_15ml_conical",
-            "opentrons_15_tuberack_nest_15ml_conical",
-        ]
-        for op in large_volume_operations:
-            if op[0] in allocated_operations:
-                continue
-            if (
-                source_labware.parent in ["1", "2", "3"] and get_row_index(op[1]) in ["G", "H"]
-            ) or (
-                destination_labware.parent in ["1", "2", "3"] and get_row_index(op[2]) in ["G", "H"]
-            ):
-                p20_ops.append(op)
-                allocated_operations.append(op[0])
-            elif (
-                source_labware.load_name in labware_forcing_p20
-                or destination_labware in labware_forcing_p20
-            ):
-                p20_ops.append(op)
-                allocated_operations.append(op[0])
-            else:
-                p300_single_ops.append(op)
-                allocated_operations.append(op[0])
 
-        for i in range(len(volumes)):
-            if i not in allocated_operations:
-                p20_ops.append(
-                    [i, source_wells[i], destination_wells[i], volumes[i]]
-                )  # i is the original index
+        return allocate_operations(
+            operation_table,
+            source_labware,
+            destination_labware,
+            self.p300_multi.min_volume,
+            multichannel_members,
+            partial_operations,
+            tuple(
+                labware
+                for labware in (source_labware, destination_labware)
+                if self._slot_behind_is_free(labware)
+            ),
+        )
 
-        return multichannel_operations, p300_single_ops, p20_ops
+    def _slot_behind_is_free(self, labware):
+        """
+        Return whether the deck slot behind the labware is empty, so that the nozzles of the p300_multi
+        reaching behind the labware do not collide.
+        """
+        slot = getattr(labware, "parent", None)
+        if not isinstance(slot, str) or not slot.isdigit():
+            return False
+        behind = str(int(slot) + 3)
+        if behind not in self.protocol_api.deck:
+            # The back row of the deck
+            return True
+        return self.protocol_api.deck[behind] is None and behind not in self.deck_proxies
 
     def _find_parent(self, well: Well):
         while not isinstance(well, str):
             well = well.parent
         return well
 
+    @_runs_batch_first
     def home(self):
         """
         Home the robot to its initial position.
@@ -481,9 +529,10 @@ class LiquidHandler:
         to prevent contamination or errors in subsequent operations.
         """
         self.drop_tips(True)
-        logging.debug("Homing...")
+        logger.debug("Homing...")
         self.protocol_api.home()
 
+    @_runs_batch_first
     def toggle_light(self, state: bool = True):
         """
         Toggles the light of the OT-2 robot based on the provided state.
@@ -492,23 +541,16 @@ class LiquidHandler:
             state (bool): If True, turn on the light; if False, turn off the light.
         TODO: Does not work
         """
-        logging.debug(f"Setting OT-2 light to {'on' if state else 'off'}")
+        logger.debug("Setting OT-2 light to %s", "on" if state else "off")
         self.protocol_api.set_rail_lights(state)
 
+    @_runs_batch_first
     def sleep(self, duration):
-        "Sleep if not in simulation mode"
-        if self.simulation_mode:
-            pass
-        else:
-            time.sleep(duration)
+        "Sleep, or advance the virtual time in simulation mode"
+        self.clock.sleep(duration)
 
     def remove_default_position(self, deck_position):
-        default_file = os.path.join(os.path.dirname(__file__), "default_layout.ot2")
-        if not os.path.isfile(default_file):
-            for root, dirs, files in os.walk(os.getcwd()):
-                if default_file in files:
-                    default_file = os.path.join(root, default_file)
-                    break
+        default_file = resolve_default_layout(self.layout_search_path)
         with open(default_file) as f:
             default_layout = json.load(f)
 
@@ -537,46 +579,95 @@ class LiquidHandler:
 
         # Load multichannel tips
         for deck_position, model_string in layout_config.get("multichannel_tips", {}).items():
-            self.load_tips(model_string, deck_position, single_channel=False)
+            self._load_layout_entry("multichannel_tips", model_string, deck_position)
 
         # Load single channel tips
         for deck_position, model_string in layout_config.get("single_channel_tips", {}).items():
-            self.load_tips(model_string, deck_position, single_channel=True)
+            self._load_layout_entry("single_channel_tips", model_string, deck_position)
 
         # Load other labware
         for deck_position, model_string in layout_config.get("labware", {}).items():
-            self.load_labware(model_string, deck_position)
+            self._load_layout_entry("labware", model_string, deck_position)
 
     def load_default_labware(self):
         """
         Load the default labware configuration from the default_layout.ot2 file.
         This method reads a JSON dictionary and loads each labware onto the deck.
         """
-        logging.info("Loading default labware from default_layout.ot2...")
+        logger.info("Loading default labware from default_layout.ot2...")
         try:
-            default_file = os.path.join(os.path.dirname(__file__), "default_layout.ot2")
-            if not os.path.isfile(default_file):
-                for root, dirs, files in os.walk(os.getcwd()):
-                    if default_file in files:
-                        default_file = os.path.join(root, default_file)
-                        break
+            default_file = resolve_default_layout(self.layout_search_path)
             with open(default_file) as f:
                 default_layout = json.load(f)
 
             for deck_position, model_string in default_layout["multichannel_tips"].items():
-                self.load_tips(model_string, deck_position, single_channel=False)
+                self._load_layout_entry("multichannel_tips", model_string, deck_position)
 
             for deck_position, model_string in default_layout["single_channel_tips"].items():
-                self.load_tips(model_string, deck_position, single_channel=True)
+                self._load_layout_entry("single_channel_tips", model_string, deck_position)
 
             for location, model_name in default_layout["modules"].items():
                 self.load_module(model_name, location)
 
             for deck_position, model_string in default_layout["labware"].items():
-                self.load_labware(model_string, deck_position)
+                self._load_layout_entry("labware", model_string, deck_position)
 
         except FileNotFoundError:
-            logging.error("No default layout file found. No default labware loaded")
+            logger.error("No default layout file found. No default labware loaded")
+
+    def _load_layout_entry(self, kind, model_string, deck_position):
+        """
+        Load a tip rack or labware of a deck layout, or register it as a LazyLabware proxy in lazy deck mode.
+        """
+        if kind == "labware":
+
+            def loader():
+                return self.load_labware(model_string, deck_position)
+
+        else:
+
+            def loader():
+                return self.load_tips(
+                    model_string, deck_position, single_channel=kind == "single_channel_tips"
+                )
+
+        if not self.lazy_deck:
+            return loader()
+        deck_position = str(deck_position)
+        self.deck_proxies[deck_position] = LazyLabware(
+            deck_position, model_string, kind, loader, self._labware_definition
+        )
+        logger.debug("Registered %s at position %s for lazy loading", model_string, deck_position)
+        return self.deck_proxies[deck_position]
+
+    def _labware_definition(self, model_string):
+        definition = self.labware_registry.get(model_string)
+        if definition is None:
+            definition = get_labware_definition(model_string)
+        return definition
+
+    def get_labware(self, deck_position):
+        """
+        Return the labware in a deck position, loading it first if it is registered for lazy loading.
+
+        Parameters:
+            deck_position (int): The deck position of the labware.
+
+        Returns:
+            The labware, the labware on the module in the deck position, or None if the position is empty.
+        """
+        deck_position = str(deck_position)
+        if deck_position in self.deck_proxies:
+            return self.deck_proxies[deck_position].load()
+        item = self.protocol_api.deck[deck_position]
+        # Labware loaded on a module
+        return getattr(item, "labware", item)
+
+    def _load_pending_tips(self):
+        # Tip racks have to be loaded before the pipettes pick up tips
+        for proxy in list(self.deck_proxies.values()):
+            if proxy.is_tiprack:
+                proxy.load()
 
     def load_labware(
         self, model_string: str, deck_position: int, name: str = "", add_to_default=False
@@ -597,12 +688,14 @@ class LiquidHandler:
         Example:
         >>> lh.load_labware("opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical", 8, "Falcon tube rack")
         """
-        logging.debug(f"Loading labware: {model_string} on position {deck_position}...")
+        logger.debug("Loading labware: %s on position %s...", model_string, deck_position)
 
         if not name:
             name = model_string
 
         deck_position = str(deck_position)
+        # Loading the labware explicitly, or by a LazyLabware proxy, replaces the proxy
+        self.deck_proxies.pop(deck_position, None)
 
         # Check that the deck position is empty
         on_module = False
@@ -615,33 +708,28 @@ class LiquidHandler:
                     f"Deck position {deck_position} is already occupied. Please choose an empty position."
                 )
 
+        # Custom labware definitions are loaded directly, without trying the Opentrons definitions first
+        labware_def = self.labware_registry.get(model_string)
         if on_module:
-            logging.debug("Loading labware on the module")
-            try:
-                labware = self.protocol_api.deck[deck_position].load_labware(model_string)
-            except Exception as e:
-                # The model string could match a custom labware file on the system
-                with open(f"{self.labware_folder}/{model_string}.json") as labware_file:
-                    labware_def = json.load(labware_file)
-                labware = self.protocol_api.deck[deck_position].load_labware_from_definition(
-                    labware_def, None
-                )
+            logger.debug("Loading labware on the module")
+            module = self.protocol_api.deck[deck_position]
+            if labware_def is not None:
+                labware = module.load_labware_from_definition(labware_def, None)
+            else:
+                labware = module.load_labware(model_string)
         else:
-            logging.debug("Loading labware on an empty slot")
-            try:
-                labware = self.protocol_api.load_labware(model_string, deck_position, label=name)
-            except ProtocolCommandFailedError:
-                # The model string could match a custom labware file on the system
-                with open(f"{self.labware_folder}/{model_string}.json") as labware_file:
-                    labware_def = json.load(labware_file)
+            logger.debug("Loading labware on an empty slot")
+            if labware_def is not None:
                 labware = self.protocol_api.load_labware_from_definition(labware_def, deck_position)
+            else:
+                labware = self.protocol_api.load_labware(model_string, deck_position, label=name)
 
         # Log the loading of the labware
         if on_module:
             msg = f"Loaded labware {model_string} at position {self.protocol_api.deck[deck_position]} with name '{name}'"
         else:
             msg = f"Loaded labware {model_string} at position {deck_position} with name '{name}'"
-        logging.info(msg)
+        logger.info(msg)
 
         if add_to_default and not labware.is_tiprack:
             self._save_labware_to_default(labware, model_string, deck_position)
@@ -682,17 +770,20 @@ class LiquidHandler:
                     self.p20_tips.append(labware)
                     raise NotImplementedError("Multichannel p20 pipette is not yet supported.")
             if "200ul" in model_string and self.max_volume > 200:
-                logging.info(
-                    f"Limiting the maximum transfer volume from {self.max_volume} to 200ul due to tip size limit."
+                logger.info(
+                    "Limiting the maximum transfer volume from %s to 200ul due to tip size limit.",
+                    self.max_volume,
                 )
                 self.max_volume = 200
             if add_to_default:
                 self._save_labware_to_default(
                     labware, model_string, deck_position, is_single_channel=single_channel
                 )
+            if self.tip_occupancy is not None:
+                self.tip_occupancy.restore(labware)
 
         else:
-            logging.error(
+            logger.error(
                 "A model string was passed to load_tips, which doesn't correspond to a tip rack. Labware is unloaded."
             )
             self.unload_labware(labware)
@@ -707,6 +798,9 @@ class LiquidHandler:
             raise ValueError("Labware is not a valid labware object.")
 
     def unload_labware_from_slot(self, slot):
+        if self.deck_proxies.pop(str(slot), None) is not None:
+            # The labware was registered for lazy loading, but not loaded
+            return
         del self.protocol_api.deck[slot]
 
     def load_module(self, module_name: str, location: int, add_to_default=False):
@@ -725,6 +819,7 @@ class LiquidHandler:
 
         return module
 
+    @_runs_batch_first
     def set_temperature(self, temperature: float, wait: bool = False):
         """
         Set the temperature of the temperature module.
@@ -751,6 +846,7 @@ class LiquidHandler:
             )
             self.temperature_timer.start()
 
+    @_runs_batch_first
     def release_temperature(self):
         """
         Release the temperature module by deactivating it and joining any active temperature setting thread.
@@ -763,6 +859,7 @@ class LiquidHandler:
         self.temperature_module.deactivate()
         self.temperature_timer = None
 
+    @_runs_batch_first
     def open_shaker_latch(self):
         """
         Open the shaker module's labware latch.
@@ -773,6 +870,7 @@ class LiquidHandler:
             except Exception:
                 pass
 
+    @_runs_batch_first
     def close_shaker_latch(self):
         """
         Close the shaker module's labware latch.
@@ -783,6 +881,7 @@ class LiquidHandler:
             except Exception:
                 pass
 
+    @_runs_batch_first
     def shake(self, speed: float, duration: float, wait: bool = False):
         """
         Shake the shaker module.
@@ -796,18 +895,24 @@ class LiquidHandler:
         - Check that the labware latch is closed. Same for other functions
         - Stop shaking and finish of this command should open the latch
         """
+        self._shake(speed, duration, wait)
+
+    def _shake(self, speed: float, duration: float, wait: bool):
+        # Drives the shaker module directly, as the timer thread of shake must not run the calls
+        # collected by a batch of the main thread
         if not self.shaker_module:
             raise Exception("No shaker module has been loaded on the deck.")
-        self.start_shaking(speed)
+        self.shaker_module.set_and_wait_for_shake_speed(speed)
         if duration > 0:
             if wait:
-                time.sleep(duration)
-                self.stop_shaking()
+                self.clock.sleep(duration)
+                self.shaker_module.deactivate_shaker()
             else:
                 # Start a thread to stop the shaker after the duration
-                self.shaking_timer = Thread(target=self.shake, args=(speed, duration, True))
+                self.shaking_timer = Thread(target=self._shake, args=(speed, duration, True))
                 self.shaking_timer.start()
 
+    @_runs_batch_first
     def start_shaking(self, speed: float):
         """
         Start shaking the shaker module.
@@ -816,6 +921,7 @@ class LiquidHandler:
             raise Exception("No shaker module has been loaded on the deck.")
         self.shaker_module.set_and_wait_for_shake_speed(speed)
 
+    @_runs_batch_first
     def stop_shaking(self):
         """
         Stop shaking the shaker module.
@@ -824,6 +930,7 @@ class LiquidHandler:
             raise Exception("No shaker module has been loaded on the deck.")
         self.shaker_module.deactivate_shaker()
 
+    @_runs_batch_first
     def drop_tips(self, trash_tips=True):
         """
         Drop or return tips for the p20 and p300_multi pipettes.
@@ -838,6 +945,9 @@ class LiquidHandler:
 
         This method ensures that the pipettes do not retain tips after operations, which is crucial
         for maintaining cleanliness and preventing cross-contamination in subsequent operations.
+
+        With keep_nozzle_layout, the liquid handling methods leave the p300_multi in the nozzle layout of their
+        last operations, so that consecutive calls share it. This method sets it back to all nozzles.
         """
         if self.p20.has_tip:
             if trash_tips:
@@ -849,7 +959,11 @@ class LiquidHandler:
                 self.p300_multi.drop_tip()
             else:
                 self.p300_multi.return_tip()
+        if self.tip_occupancy is not None and not trash_tips:
+            self.tip_occupancy.save()
+        self._set_nozzle_layout(8)
 
+    @_timed_transfer
     def transfer(
         self,
         volumes,
@@ -864,6 +978,9 @@ class LiquidHandler:
         mix_after: bool = False,
         retention_time: float = 0.0,
         tip_reuse_limit: int = None,
+        volley_packing: str = "greedy",
+        optimize_path: bool = False,
+        partial_columns: bool = False,
         **kwargs,
     ):
         """
@@ -886,6 +1003,9 @@ class LiquidHandler:
         - mix_after (tuple, optional): First element is repetitions and second element is volume of mixing at the destination well after dispense. False when no mixing needed. Will block multi-dispense mode.
         - retention_time (float, optional): time to wait in seconds after every aspiration & dispense prior to moving on. Defaults to 0.0 s. Helps viscous liquids to populate the tip fully.
         - tip_reuse_limit (int, optional): Maximum number of aspiration-dispense cycles before forcing a tip change, even when new_tip is "never" or "once". If None (default), no limit is enforced.
+        - volley_packing (str, optional): Strategy for packing multi-dispense and multi-aspiration operations into a single tip. "greedy" (default) fills the tip in order of increasing volume, "optimal" minimizes the number of aspiration and dispense cycles per well.
+        - optimize_path (bool, optional): Whether to order the operations by the well coordinates to shorten the travel of the gantry, instead of ordering them by well name. The estimated travel in both orders is stored in `travel_report`.
+        - partial_columns (bool, optional): Whether to pipette operations between matching rows that do not fill a column with a partial column of 4 or 2 tips of the p300_multi, instead of one by one in single tip mode. The front nozzles from H1 are used, so the operations must be in the front rows of the column, unless the deck slot behind the labware is free.
         - **kwargs: Additional keyword arguments for pipette operations.
 
 
@@ -895,11 +1015,493 @@ class LiquidHandler:
           Please note that even if an operation fails, it might have already aspirated liquid and been partially executed.
 
         Note:
+        - Operations that depend on each other, such as the steps of a serial dilution, are run in dependency stages:
+          an operation reading a well runs after the earlier operations writing it, and an operation writing a
+          well after the earlier operations reading it. The independent operations of a stage are grouped for
+          the multichannel pipette.
+        - Within lh.batch(), the transfer is collected and run when the batch ends, and an empty list is returned;
+          the failed operations of the call are in the failed_operations of the batch.
         - The method gracefully handles OutOfTipsError by continuing with operations that don't involve the pipette
           that ran out of tips, and returning the operations that failed due to lack of tips.
+        - The transfer is planned and executed like with plan_transfer and execute.
+        """
+        logger.debug("Transfer called with new tip: %s", new_tip)
+        self._load_pending_tips()
+
+        volumes, source_wells, destination_wells = self._normalize_transfer_arguments(
+            volumes, source_wells, destination_wells, blow_out_to, volley_packing
+        )
+        transfer_params = {
+            "new_tip": new_tip,
+            "touch_tip": touch_tip,
+            "blow_out_to": blow_out_to,
+            "trash_tips": trash_tips,
+            "add_air_gap": add_air_gap,
+            "overhead_liquid": overhead_liquid,
+            "mix_after": mix_after,
+            "retention_time": retention_time,
+            "tip_reuse_limit": tip_reuse_limit,
+            "volley_packing": volley_packing,
+            "optimize_path": optimize_path,
+            "partial_columns": partial_columns,
+        }
+        if self._batch is not None:
+            index = self._batch.add(
+                volumes, source_wells, destination_wells, transfer_params, kwargs
+            )
+            logger.info(
+                "Deferred the transfer of %s operations to the end of the batch as call %s",
+                len(volumes),
+                index,
+            )
+            return []
+
+        plan = self._plan_transfer(
+            volumes, source_wells, destination_wells, transfer_params, kwargs
+        )
+        return self.execute(plan)
+
+    def plan_transfer(
+        self,
+        volumes,
+        source_wells,
+        destination_wells,
+        new_tip: str = "once",
+        touch_tip: bool = False,
+        blow_out_to: str = "trash",
+        trash_tips: bool = True,
+        add_air_gap: bool = True,
+        overhead_liquid: bool = True,
+        mix_after: bool = False,
+        retention_time: float = 0.0,
+        tip_reuse_limit: int = None,
+        volley_packing: str = "greedy",
+        optimize_path: bool = False,
+        partial_columns: bool = False,
+        **kwargs,
+    ):
+        """
+        Plan a transfer without executing it.
+
+        The volumes are split to the pipette capacity, and the operations are allocated to the pipette
+        configurations, grouped into multi-dispense and multi-aspiration volleys and ordered, like in transfer.
+        The plan can be inspected, serialized with TransferPlan.to_dict, and run with execute any number of
+        times, without repeating the planning.
+
+        Parameters:
+        - volumes, source_wells, destination_wells and the optional arguments are the same as in transfer.
+
+        Returns:
+        - TransferPlan: The planned transfer. Its steps list every pipette command, assuming the state of the
+          pipettes at planning time and that all commands succeed.
+        """
+        self._load_pending_tips()
+        volumes, source_wells, destination_wells = self._normalize_transfer_arguments(
+            volumes, source_wells, destination_wells, blow_out_to, volley_packing
+        )
+        parameters = {
+            "new_tip": new_tip,
+            "touch_tip": touch_tip,
+            "blow_out_to": blow_out_to,
+            "trash_tips": trash_tips,
+            "add_air_gap": add_air_gap,
+            "overhead_liquid": overhead_liquid,
+            "mix_after": mix_after,
+            "retention_time": retention_time,
+            "tip_reuse_limit": tip_reuse_limit,
+            "volley_packing": volley_packing,
+            "optimize_path": optimize_path,
+            "partial_columns": partial_columns,
+        }
+        plan = self._plan_transfer(volumes, source_wells, destination_wells, parameters, kwargs)
+
+        # Record the pipette commands by running the plan on stand-in pipettes
+        recorder = StepRecorder(self.p300_multi, self.p20, channels=self.p300_channels)
+        self._run_plan(
+            plan, recorder.p300_multi, recorder.p20, recorder.set_nozzle_layout, recorder.wait
+        )
+        return plan.with_steps(recorder.steps)
+
+    def _plan_transfer(self, volumes, source_wells, destination_wells, transfer_params, kwargs):
+        """
+        Return the plan of a transfer with normalized arguments, from the plan cache if possible.
+        """
+        cache_key = self._plan_cache_key(
+            volumes, source_wells, destination_wells, transfer_params, kwargs
+        )
+        plan = self._load_cached_plan(cache_key)
+        if plan is not None:
+            return plan
+
+        # Order-dependent operations are planned in stages, and the operations of each stage per
+        # source and destination labware, as the groups of one plan
+        operations = self._split_transfer_operations(
+            volumes,
+            source_wells,
+            destination_wells,
+            transfer_params["add_air_gap"],
+            transfer_params["overhead_liquid"],
+        )
+        plan = self._plan_operations(operations, transfer_params, kwargs)
+        self._store_cached_plan(cache_key, plan)
+        return plan
+
+    @_runs_batch_first
+    def execute(self, plan: TransferPlan):
+        """
+        Execute a transfer plan created by plan_transfer.
+
+        Tips are picked up, changed and dropped according to the actual state of the pipettes, so a plan can
+        be executed several times.
+
+        Parameters:
+        - plan (TransferPlan): The plan to execute.
+
+        Returns:
+        - list: A list of failed operations, each represented as [source, destination, volume, index, reason],
+          where index refers to the lists passed to plan_transfer. See transfer.
+
+        Raises:
+        - InsufficientTipsError: If tip_check is "raise" and the tip racks do not hold the tips of the plan.
+        """
+        self._load_pending_tips()
+        self._check_tips(lambda: self._record_plans([plan]))
+        return self._execute_plan(plan)
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect the transfer, distribute, pool, consolidate and stamp calls within the context, and run them
+        together when the context ends.
+
+        The collected calls are merged into as few transfers as possible, so that calls with the same
+        parameters share their tips, multi-dispense volleys and nozzle layout changes. A call is only moved
+        before an earlier call if it neither reads a well the earlier call writes, nor writes a well it reads,
+        and calls taking a fresh tip "once" are only merged if they aspirate from the same source wells. See
+        ot_handler.batch. The methods driving the robot otherwise, such as mix, execute, sleep, shake,
+        set_temperature, engage_magnets, drop_tips and home, first run the calls collected so far, so that the
+        protocol keeps its order. If the context exits with an exception, the collected calls that have not run are discarded.
+
+        Yields:
+        - TransferBatch: The collected calls. Once the batch has run, its failed_operations hold the failed
+          operations of each call, with the indexes referring to the lists of the call.
+
+        Raises:
+        - ValueError: If a batch is already open.
+        """
+        if self._batch is not None:
+            raise ValueError("A batch is already open")
+        batch = TransferBatch()
+        self._batch = batch
+        try:
+            yield batch
+        finally:
+            self._batch = None
+        self._run_batch(batch)
+
+    def _flush_batch(self):
+        """
+        Run the calls collected by the open batch so far, if any.
+        """
+        batch = getattr(self, "_batch", None)
+        if batch is None:
+            return
+        self._batch = None
+        try:
+            self._run_batch(batch)
+        finally:
+            self._batch = batch
+
+    def _run_batch(self, batch):
+        transfers = batch.merge()
+        if not transfers:
+            return
+        self._load_pending_tips()
+        # The merged transfers are planned once, and their tips checked together before the first
+        # one runs
+        plans = [
+            self._plan_transfer(
+                merged.volumes,
+                merged.source_wells,
+                merged.destination_wells,
+                merged.parameters,
+                merged.pipette_kwargs,
+            )
+            for merged in transfers
+        ]
+        self._check_tips(lambda: self._record_plans(plans))
+        plans_by_transfer = {id(merged): plan for merged, plan in zip(transfers, plans)}
+
+        def run_transfer(merged):
+            plan = plans_by_transfer[id(merged)]
+            if self.metrics is None:
+                return self._execute_plan(plan)
+            with self.metrics.time_transfer():
+                return self._execute_plan(plan)
+
+        batch.run(run_transfer, transfers)
+
+    def _execute_plan(self, plan: TransferPlan):
+        p300_multi, p20 = self._traced_pipettes()
+        wait = self.clock.sleep if self._command_trace is None else self._traced_wait
+        try:
+            failed_operations = self._run_plan(
+                plan, p300_multi, p20, self._set_nozzle_layout, wait, self._command_trace
+            )
+        finally:
+            if self._command_trace is not None:
+                self._command_trace.set_operations([])
+        if self.metrics is not None:
+            self.metrics.record_failed_operations(failed_operations)
+        self.travel_report = plan.travel_report
+        if plan.optimize_path:
+            logger.info("Estimated gantry travel: %s", self.travel_report)
+        return failed_operations
+
+    def load_plan(self, data: dict):
+        """
+        Load a transfer plan serialized with TransferPlan.to_dict. The wells are resolved on the current deck
+        layout by their deck slot and well name.
+
+        Parameters:
+        - data (dict): The serialized plan.
+
+        Returns:
+        - TransferPlan: The loaded plan.
+        """
+        return TransferPlan.from_dict(data, self._resolve_location)
+
+    def estimate_duration(self, operation, *args, model: DurationModel = None, **kwargs):
+        """
+        Estimate the run time of a liquid handling operation without executing or simulating it.
+
+        The operation is planned like with plan_transfer, and each pipette command is timed with the gantry
+        moves between the wells, the flow rates of the pipettes, tip handling, the retention time and mixing.
+
+        Parameters:
+        - operation (Union[TransferPlan, str]): A plan created by plan_transfer, or the name of the operation:
+          "transfer", "distribute", "pool", "consolidate", "stamp", "shake" or "sleep".
+        - *args, **kwargs: The arguments of the operation, e.g. the volumes and wells of a transfer or the
+          speed and duration of shaking.
+        - model (DurationModel, optional): Timing parameters of the robot. By default, the flow rates are
+          taken from the pipettes.
+
+        Returns:
+        - DurationEstimate: The estimated duration of each step. The total is given by its total property and
+          the time per kind of command by by_action().
+
+        Example:
+        ```
+        estimate = lh.estimate_duration("distribute", 50, reservoir["A1"], plate.wells())
+        print(estimate.total, estimate.by_action())
+        ```
+        """
+        if isinstance(operation, TransferPlan):
+            steps = operation.steps or self._record_plans([operation])
+        elif operation in ["shake", "sleep"]:
+            arguments = inspect.signature(getattr(self, operation)).bind(*args, **kwargs)
+            arguments.apply_defaults()
+            duration = arguments.arguments["duration"]
+            if not arguments.arguments.get("wait", True):
+                # Shaking in the background does not block the protocol
+                duration = 0
+            steps = [PlanStep(operation, None, False, duration=duration)]
+        elif operation in TRANSFER_OPERATIONS:
+            plans = self._plan_operation(operation, *args, **kwargs)
+            steps = [step for plan in plans for step in plan.steps]
+        else:
+            raise ValueError(f"Cannot estimate the duration of the operation: {operation}")
+
+        estimate = estimate_steps(
+            steps, self._location_point, model or self._duration_model(), self._tip_points()
+        )
+        logger.debug("Estimated duration of %s: %s", operation, estimate)
+        return estimate
+
+    def tip_budget(self, operation, *args, **kwargs):
+        """
+        Count the tips a liquid handling operation needs and the tips left in the tip racks, without executing
+        the operation.
+
+        The tips are counted per pipette and nozzle layout: columns of the p300_multi with all nozzles from
+        p300_tips, single tips of the p300_multi from single_p300_tips and tips of the p20 from single_p20_tips.
+        The tip changes are modeled from the current state of the pipettes.
+
+        Parameters:
+        - operation (Union[TransferPlan, str]): A plan created by plan_transfer, or the name of the operation:
+          "transfer", "distribute", "pool", "consolidate", "stamp" or "mix".
+        - *args, **kwargs: The arguments of the operation.
+
+        Returns:
+        - TipBudget: The tips required, available and the capacity of the full tip racks per tip kind. Its
+          sufficient property tells whether the operation can run to the end, and shortfall the tips missing.
+
+        Example:
+        ```
+        budget = lh.tip_budget("distribute", 50, reservoir["A1"], plate.wells())
+        if not budget.sufficient:
+            print(budget.describe())
+        ```
+        """
+        self._load_pending_tips()
+        if isinstance(operation, TransferPlan):
+            steps = self._record_plans([operation])
+        elif operation == "mix":
+            arguments = inspect.signature(self.mix).bind(*args, **kwargs)
+            arguments.apply_defaults()
+            steps = self._record_steps(
+                lambda recorder: self._run_mix(
+                    *arguments.args,
+                    p300_multi=recorder.p300_multi,
+                    p20=recorder.p20,
+                    set_nozzle_layout=recorder.set_nozzle_layout,
+                )
+            )
+        elif operation in TRANSFER_OPERATIONS:
+            steps = self._record_plans(self._plan_operation(operation, *args, **kwargs))
+        else:
+            raise ValueError(f"Cannot count the tips of the operation: {operation}")
+        return self._tip_budget(steps)
+
+    def _tip_budget(self, steps):
+        racks = self._tip_racks()
+        has_tip = self.tip_occupancy.has_tip if self.tip_occupancy is not None else None
+        return TipBudget(
+            required=count_required_tips(steps),
+            available={
+                kind: count_tips(kind_racks, full_columns=kind == "p300_multi", has_tip=has_tip)
+                for kind, kind_racks in racks.items()
+            },
+            capacity={
+                kind: count_tips(kind_racks, full_columns=kind == "p300_multi", assume_full=True)
+                for kind, kind_racks in racks.items()
+            },
+        )
+
+    def _tip_racks(self):
+        return {
+            "p300_multi": self.p300_tips,
+            "p300_single": self.single_p300_tips,
+            "p20": self.single_p20_tips,
+        }
+
+    def _check_tips(self, record_steps):
+        """
+        Check the tips of the steps returned by record_steps according to tip_check, before running them.
+        """
+        if self.tip_check is None:
+            return
+        budget = self._tip_budget(record_steps())
+        if budget.sufficient:
+            return
+        if self.tip_check == "refill" and budget.refillable:
+            racks = self._tip_racks()
+            short_racks = [rack for kind in budget.shortfall for rack in racks[kind]]
+            message = "Refill the tip racks in slots {} before the run: {}".format(
+                ", ".join(str(location_key(rack.wells()[0])[0]) for rack in short_racks),
+                budget.describe(),
+            )
+            logger.warning(message)
+            self.protocol_api.pause(message)
+            for rack in short_racks:
+                rack.reset()
+                if self.tip_occupancy is not None:
+                    self.tip_occupancy.reset(rack)
+            return
+        raise InsufficientTipsError(budget)
+
+    def _record_steps(self, run):
+        """
+        Call run with a StepRecorder in the current state of the pipettes and return the recorded steps.
+        """
+        recorder = StepRecorder(self.p300_multi, self.p20, channels=self.p300_channels)
+        run(recorder)
+        return recorder.steps
+
+    def _record_plans(self, plans):
+        """
+        Return the steps of running the plans one after the other from the current state of the pipettes.
+        """
+
+        def run(recorder):
+            for plan in plans:
+                self._run_plan(
+                    plan,
+                    recorder.p300_multi,
+                    recorder.p20,
+                    recorder.set_nozzle_layout,
+                    recorder.wait,
+                )
+
+        return self._record_steps(run)
+
+    def _plan_operation(self, operation, *args, **kwargs):
+        """
+        Plan a transfer, distribute, pool, consolidate or stamp call without executing it.
+
+        Returns:
+            list of TransferPlan: The plan of each transfer the operation consists of.
+        """
+        if operation not in TRANSFER_OPERATIONS:
+            raise ValueError(f"Cannot plan the operation: {operation}")
+        # The operations build the arguments of the transfer they run, which is planned instead
+        transfer_arguments = {
+            "transfer": lambda *transfer_args, **transfer_kwargs: (transfer_args, transfer_kwargs),
+            "distribute": self._distribute_arguments,
+            "pool": self._pool_arguments,
+            "consolidate": self._pool_arguments,
+            "stamp": self._stamp_arguments,
+        }[operation]
+        transfer_args, transfer_kwargs = transfer_arguments(*args, **kwargs)
+        return [self.plan_transfer(*transfer_args, **transfer_kwargs)]
+
+    def _duration_model(self):
+        model = DurationModel()
+        for name, pipette in [("p300_multi", self.p300_multi), ("p20", self.p20)]:
+            flow_rate = getattr(pipette, "flow_rate", None)
+            rates = {
+                action: getattr(flow_rate, action, None)
+                for action in ["aspirate", "dispense", "blow_out"]
+            }
+            if all(isinstance(rate, (int, float)) and rate > 0 for rate in rates.values()):
+                model.flow_rates[name] = rates
+        return model
+
+    def _tip_points(self):
+        tip_racks = {
+            "p300_multi": self.p300_tips or self.single_p300_tips,
+            "p20": self.single_p20_tips,
+        }
+        return {
+            name: well_point(racks[0].wells()[0]) for name, racks in tip_racks.items() if racks
+        }
+
+    def _location_point(self, location):
+        point = well_point(location)
+        if point is None and isinstance(location, TrashBin):
+            # The trash bin has no wells, use the position of its deck slot
+            slot_point = self.protocol_api.deck.position_for(location.location.id).point
+            point = (slot_point.x, slot_point.y)
+        return point
+
+    def _resolve_location(self, key):
+        if key == "trash":
+            return self.trash
+        slot, well_name = key
+        labware = self.get_labware(slot)
+        if labware is None:
+            raise ValueError(f"No labware found in deck slot {slot}")
+        return labware[well_name]
+
+    def _normalize_transfer_arguments(
+        self, volumes, source_wells, destination_wells, blow_out_to, volley_packing
+    ):
         """
-        logging.debug(f"Transfer called with new tip: {new_tip}")
+        Broadcast the volumes and wells of a transfer to lists of equal length and validate the parameters.
 
+        Returns:
+            tuple: Lists of volumes, source wells and destination wells.
+        """
         operations_length = max(
             len(source_wells) if isinstance(source_wells, list) else 1,
             len(destination_wells) if isinstance(destination_wells, list) else 1,
@@ -932,228 +1534,248 @@ class LiquidHandler:
             else destination_wells * operations_length
         )
         # Parameter validation
+        if volley_packing not in VOLLEY_PACKING_STRATEGIES:
+            raise ValueError(
+                f"Got an invalid value for the optional argument 'volley_packing': {volley_packing}"
+            )
         assert blow_out_to in ["source", "destination", "trash", "source_after_pipetting", ""], (
             "The parameter blow_out_to must always be defined and one of source, destination, trash, source_after_pipetting or empty string. Blow out happens only if there's air gap or overhead liquid"
         )
+        return volumes, source_wells, destination_wells
 
+    def _split_transfer_operations(
+        self, volumes, source_wells, destination_wells, add_air_gap, overhead_liquid
+    ):
+        """
+        Split the volumes exceeding the capacity of the pipettes.
+
+        Returns:
+            OperationTable: The split operations.
+        """
         # Check for volumes exceeding effective pipette max volume (accounting for overhead liquid and air gap)
         air_gap_volume = self.p300_multi.min_volume if add_air_gap else 0
         overhead_volume = self.p300_multi.min_volume if overhead_liquid else 0
         effective_max_single_volume = self.max_volume - overhead_volume - air_gap_volume
-        new_operations = []
-        for operation in [[v, s, d] for v, s, d in zip(volumes, source_wells, destination_wells)]:
-            volume = operation[0]
-            while volume > effective_max_single_volume:
-                if volume > effective_max_single_volume + self.p300_multi.min_volume:
-                    new_operations.append([effective_max_single_volume, operation[1], operation[2]])
-                    volume -= effective_max_single_volume
-                else:
-                    split_volume = volume / 2
-                    new_operations.append([split_volume, operation[1], operation[2]])
-                    new_operations.append([split_volume, operation[1], operation[2]])
-                    volume = 0
-            if volume > 0:
-                new_operations.append([volume, operation[1], operation[2]])
-        volumes, source_wells, destination_wells = [list(lst) for lst in zip(*new_operations)] if new_operations else ([], [], [])
-
-
-        # Split the liquid handling operations so that the source wells are within one labware, and destination wells too
-        source_labware = {well.parent for well in source_wells}
-        destination_labware = {
-            well.parent if isinstance(well, Well) else well for well in destination_wells
-        }
-        transfer_params = {
-            "new_tip": new_tip,
-            "touch_tip": touch_tip,
-            "blow_out_to": blow_out_to,
-            "trash_tips": trash_tips,
-            "add_air_gap": add_air_gap,
-            "overhead_liquid": overhead_liquid,
-            "retention_time": retention_time,
-            **kwargs,
+        return OperationTable(source_wells, destination_wells, volumes).split_volumes(
+            effective_max_single_volume, self.p300_multi.min_volume
+        )
+
+    def _plan_cache_key(self, volumes, source_wells, destination_wells, parameters, pipette_kwargs):
+        """
+        Return the plan cache key of a transfer, or None if no plan cache is used.
+
+        The key covers the operations, the transfer parameters, the pipettes, the tip racks and the labware
+        on the deck, so that a cached plan is only used for an identical transfer on an identical deck.
+        """
+        if self.plan_cache is None:
+            return None
+        pipettes = [
+            [getattr(pipette, "name", None), pipette.min_volume, pipette.max_volume]
+            for pipette in [self.p300_multi, self.p20]
+        ]
+        tip_racks = [
+            [location_key(tip_rack.wells()[0]), tip_rack.load_name]
+            for tip_rack in self.p300_tips + self.single_p300_tips + self.single_p20_tips
+        ]
+        deck = sorted(
+            [str(slot), getattr(item, "load_name", None) or type(item).__name__]
+            for slot, item in self.protocol_api.deck.items()
+            if item is not None
+        ) + sorted([slot, proxy.load_name] for slot, proxy in self.deck_proxies.items())
+        return self.plan_cache.key(
+            [location_key(well) for well in source_wells],
+            [location_key(well) for well in destination_wells],
+            volumes,
+            parameters,
+            pipette_kwargs,
+            pipettes,
+            self.max_volume,
+            tip_racks,
+            deck,
+        )
+
+    def _load_cached_plan(self, cache_key):
+        if cache_key is None:
+            return None
+        data = self.plan_cache.get(cache_key)
+        if data is None:
+            return None
+        try:
+            plan = self.load_plan(data)
+        except (KeyError, ValueError, TypeError) as e:
+            logger.warning("Ignoring cached transfer plan that cannot be loaded: %s", e)
+            return None
+        logger.debug("Loaded cached transfer plan %s", cache_key)
+        return plan
+
+    def _store_cached_plan(self, cache_key, plan):
+        if cache_key is not None:
+            self.plan_cache.put(cache_key, plan.to_dict())
+
+    def _plan_operations(self, operations, parameters, pipette_kwargs):
+        """
+        Plan the liquid handling of split operations.
+
+        Parameters:
+            operations (OperationTable): The split operations.
+            parameters (dict): The transfer parameters stored in the plan.
+            pipette_kwargs (dict): Additional keyword arguments for the pipette operations.
+
+        Returns:
+            TransferPlan: The plan, without the recorded steps.
+        """
+        source_wells = operations.source_wells
+        destination_wells = operations.destination_wells
+        volumes = operations.volumes.tolist()
+        plan_fields = {
+            "source_wells": tuple(source_wells),
+            "destination_wells": tuple(destination_wells),
+            "volumes": tuple(volumes),
+            "original_indexes": tuple(operations.original_indexes.tolist()),
+            "pipette_kwargs": tuple(pipette_kwargs.items()),
+            **parameters,
         }
-        failed_operations = []
-        done = False
-        if len(source_labware) > 1:
-            for labware in source_labware:
-                # Take a fresh tip only for the first call
-                if transfer_params["new_tip"] == "once" and done:
-                    transfer_params["new_tip"] = "never"
-                indexes = [i for i, well in enumerate(source_wells) if well.parent == labware]
-                failed_operations += self.transfer(
-                    [volumes[i] for i in indexes],
-                    [source_wells[i] for i in indexes],
-                    [destination_wells[i] for i in indexes],
-                    **transfer_params,
-                )
-                done = True
-        elif len(destination_labware) > 1:
-            for labware in destination_labware:
-                # Take a fresh tip only for the first call
-                if transfer_params["new_tip"] == "once" and done:
-                    transfer_params["new_tip"] = "never"
-                indexes = [
-                    i
-                    for i, well in enumerate(destination_wells)
-                    if well.parent == labware or well == labware
-                ]
-                failed_operations += self.transfer(
-                    [volumes[i] for i in indexes],
-                    [source_wells[i] for i in indexes],
-                    [destination_wells[i] for i in indexes],
-                    **transfer_params,
+
+        # Plan the dependency stages one after the other, and the operations of each source and
+        # destination labware separately
+        group_indexes = operations.dependency_stages()
+        if len(group_indexes) <= 1:
+            group_indexes = operations.labware_groups()
+        if len(group_indexes) > 1:
+            group_parameters = dict(parameters)
+            travel_report = TravelReport()
+            groups = []
+            for group_index, indexes in enumerate(group_indexes):
+                # Take a fresh tip only for the first group
+                if group_parameters["new_tip"] == "once" and group_index > 0:
+                    group_parameters["new_tip"] = "never"
+                group_operations = operations.take(indexes)
+                group_operations.original_indexes = np.arange(len(group_operations))
+                group_plan = self._plan_operations(
+                    group_operations, group_parameters, pipette_kwargs
                 )
-                done = True
-        if done:
-            return failed_operations
+                groups.append((tuple(indexes.tolist()), group_plan))
+                travel_report.merge(group_plan.travel_report)
+            return TransferPlan(
+                groups=tuple(groups),
+                travel_distances=(travel_report.default_distance, travel_report.optimized_distance),
+                **plan_fields,
+            )
 
-        def add_failed_pipette_operations(
-            pipette_name: str, orig_idx: int, failed_operations: list, failure_reason: str
-        ):
-            added_indexes = []
-            if pipette_name == "p300_multi":
-                # Recreate the original operations
-                hidden_source_wells = source.parent.columns()[int(source.well_name[1:]) - 1]
-                if len(hidden_source_wells) == 1:
-                    hidden_source_wells = hidden_source_wells * 8
-
-                hidden_destination_wells = destination.parent.columns()[
-                    int(destination.well_name[1:]) - 1
-                ]
-                if len(hidden_destination_wells) == 1:
-                    hidden_destination_wells = hidden_destination_wells * 8
-
-                for i in range(8):
-                    original_idx = -1
-                    for op in zip(
-                        source_wells, destination_wells, volumes, range(len(source_wells))
-                    ):
-                        if (
-                            op[0] == hidden_source_wells[i]
-                            and op[1] == hidden_destination_wells[i]
-                            and op[2] == volume
-                        ):
-                            original_idx = op[3]
-                            break
-                    if original_idx not in [o[3] for o in failed_operations]:
-                        failed_operations.append(
-                            [
-                                hidden_source_wells[i],
-                                hidden_destination_wells[i],
-                                volume,
-                                original_idx,
-                                failure_reason,
-                            ]
-                        )
-                        added_indexes.append(original_idx)
+        new_tip = parameters["new_tip"]
+        add_air_gap = parameters["add_air_gap"]
+        overhead_liquid = parameters["overhead_liquid"]
+        mix_after = parameters["mix_after"]
+        volley_packing = parameters["volley_packing"]
+        optimize_path = parameters["optimize_path"]
+
+        planning_failures = {}
+
+        def add_failed_pipette_operations(pipette_name: str, orig_idx: int, failure_reason: str):
+            # A multichannel operation stands for the operations of the column it covers
+            if CONFIGURATION_CHANNELS[pipette_name] > 1:
+                indexes = multichannel_members.get(orig_idx, [orig_idx])
             else:
-                if orig_idx not in [o[3] for o in failed_operations]:
-                    failed_operations.append(
-                        [source, destination, volume, orig_idx, failure_reason]
-                    )
-                    added_indexes.append(orig_idx)
-            return added_indexes, failed_operations
+                indexes = [orig_idx]
+            for i in indexes:
+                if i not in planning_failures:
+                    planning_failures[i] = failure_reason
+                    allocated_indexes.add(i)
+
+        # Coordinates of the wells for path optimization
+        well_points = {}
+
+        def point_of(well):
+            if id(well) not in well_points:
+                well_points[id(well)] = well_point(well)
+            return well_points[id(well)]
+
+        travel_report = TravelReport()
 
         # Allocate the liquid handling operations to each available pipette configuration
         # Format: [index, source well, destination well, volume]
+        multichannel_members = {}
+        partial_operations = {} if parameters.get("partial_columns") else None
         p300_multi_steps, p300_single_steps, p20_steps = self._allocate_liquid_handling_steps(
-            source_wells=source_wells, destination_wells=destination_wells, volumes=volumes
+            source_wells=source_wells,
+            destination_wells=destination_wells,
+            volumes=volumes,
+            operation_table=operations,
+            multichannel_members=multichannel_members,
+            partial_operations=partial_operations,
         )
 
-        # [pipette to use, in single channel mode, steps to take]
-        allocated_sets = [
-            [self.p300_multi, False, p300_multi_steps, "p300_multi"],
-            [self.p300_multi, True, p300_single_steps, "p300_multisingle"],
-            [self.p20, False, p20_steps, "p20"],
+        # [pipette to use, steps to take]
+        allocated_sets = [[self.p300_multi, p300_multi_steps, "p300_multi"]]
+        for size, partial_steps in (partial_operations or {}).items():
+            allocated_sets.append([self.p300_multi, partial_steps, f"p300_partial{size}"])
+        allocated_sets += [
+            [self.p300_multi, p300_single_steps, "p300_multisingle"],
+            [self.p20, p20_steps, "p20"],
         ]
 
-        # Track which pipettes have run out of tips
-        out_of_tips_pipettes = set()
-
-        # Track tip usage counts for tip_reuse_limit
-        tip_usage_counts = {pipette_name: 0 for _, _, _, pipette_name in allocated_sets}
-        
-        # Track tip state for overhead liquid and air gap to prevent duplicate additions
-        tip_state = {pipette_name: {"has_overhead": False, "has_air_gap": False} for _, _, _, pipette_name in allocated_sets}
-
         # When possible, group the operations for multi-dispense and multi-aspiration
-        allocated_indexes = []
-        for pipette, single_tip_mode, steps, pipette_name in allocated_sets:
-            # Skip operations for pipettes that have run out of tips
-            if pipette_name in out_of_tips_pipettes:
-                # Add all operations from this pipette to failed operations
-                for idx, source, destination, volume in steps:
-                    if idx not in allocated_indexes:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, idx, failed_operations, "out_of_tips"
-                        )
-                        allocated_indexes.extend(idxs)
-                continue
-
+        allocated_indexes = set()
+        pipette_plans = []
+        for pipette, steps, pipette_name in allocated_sets:
             max_vol = min(self.max_volume, pipette.max_volume)
-            unique_source_wells = {op[1] for op in steps}
-            unique_destination_wells = {op[2] for op in steps}
             # Scenario 1: shared source, possibly different destination
+            # Scenario 2: shared destination, possibly different source
             grouped_sets = {1: [], 2: []}
-            for pivot_set, p_idx in [[unique_source_wells, 1], [unique_destination_wells, 2]]:
-                for pivot_well in pivot_set:
-                    ops = [
-                        op
-                        for op in steps
-                        if op[p_idx] == pivot_well and op[0] not in allocated_indexes
-                    ]
+            for p_idx in [1, 2]:
+                # Index the pending operations by the pivot well. The steps share a single source
+                # and destination labware, so the well name identifies the well.
+                pivot_operations = {}
+                for op in steps:
+                    if op[0] not in allocated_indexes:
+                        pivot_operations.setdefault(
+                            getattr(op[p_idx], "well_name", None), []
+                        ).append(op)
+                for ops in pivot_operations.values():
                     if len(ops) > 1:
                         ops.sort(key=lambda x: x[-1])
-                        current_set = []
-                        set_volume = 0
+                        # No multi-dispense if tip change is set as "always", no-multi aspiration if if tip change set as "always" or "on aspiration"
+                        groupable = new_tip != "always" and (
+                            (p_idx == 1 and mix_after is False)
+                            or (p_idx == 2 and new_tip != "on aspiration")
+                        )
+                        air_gap_vol = pipette.min_volume if add_air_gap else 0
+                        overhead_vol = pipette.min_volume if overhead_liquid else 0
+                        effective_max_vol = max_vol - overhead_vol - air_gap_vol
+                        packable_ops = []
+                        split_sets = []
                         for idx, source, destination, volume in ops:
                             if idx in allocated_indexes or volume <= 0:
                                 continue
                             if volume < pipette.min_volume:
-                                logging.warning(
-                                    f"Volume too low, requested operation ignored: dispense {volume} ul to {destination} with pipette {pipette}"
+                                logger.warning(
+                                    "Volume too low, requested operation ignored: dispense %s ul to %s with pipette %s",
+                                    volume,
+                                    destination,
+                                    pipette,
                                 )
-                                idxs, failed_operations = add_failed_pipette_operations(
-                                    pipette_name, idx, failed_operations, "volume_too_low"
+                                add_failed_pipette_operations(
+                                    pipette_name, idx, "volume_too_low"
                                 )
-                                allocated_indexes.extend(idxs)
                                 continue
-                            # No multi-dispense if tip change is set as "always", no-multi aspiration if if tip change set as "always" or "on aspiration"
-                            air_gap_vol = pipette.min_volume if add_air_gap else 0
-                            overhead_vol = pipette.min_volume if overhead_liquid else 0
-                            effective_max_vol = max_vol - overhead_vol - air_gap_vol
-                            if (
-                                set_volume + volume <= effective_max_vol
-                                and new_tip != "always"
-                                and (
-                                    (p_idx == 1 and mix_after is False)
-                                    or (p_idx == 2 and new_tip != "on aspiration")
-                                )
-                            ):
-                                current_set.append([source, destination, volume, idx])
-                                set_volume += volume
-                                allocated_indexes.append(idx)
-                            else:
-                                if current_set:
-                                    grouped_sets[p_idx].append(current_set)
-                                    current_set = []
-                                air_gap_vol_single = pipette.min_volume if add_air_gap else 0
-                                overhead_vol_single = pipette.min_volume if overhead_liquid else 0
-                                effective_max_vol_single = max_vol - overhead_vol_single - air_gap_vol_single
-                                if volume > effective_max_vol_single:
-                                    sets = math.ceil(volume / effective_max_vol_single)
-                                    set_volume = volume / sets
-                                    for i in range(sets):
-                                        grouped_sets[p_idx].append(
-                                            [[source, destination, set_volume, idx]]
-                                        )
-                                    allocated_indexes.append(idx)
-                                    continue
-                                current_set.append([source, destination, volume, idx])
-                                allocated_indexes.append(idx)
-                                set_volume = volume
-                        if current_set:
-                            grouped_sets[p_idx].append(current_set)
+                            allocated_indexes.add(idx)
+                            if volume > effective_max_vol:
+                                sets = math.ceil(volume / effective_max_vol)
+                                split_sets += [
+                                    [[source, destination, volume / sets, idx]]
+                                    for _ in range(sets)
+                                ]
+                                continue
+                            packable_ops.append([source, destination, volume, idx])
+                        if groupable:
+                            volleys = pack_volumes(
+                                [op[2] for op in packable_ops], effective_max_vol, volley_packing
+                            )
+                        else:
+                            volleys = [[i] for i in range(len(packable_ops))]
+                        for volley in volleys:
+                            grouped_sets[p_idx].append([packable_ops[i] for i in volley])
+                        grouped_sets[p_idx] += split_sets
             aspiration_sets = grouped_sets[1]
             dispense_sets = grouped_sets[2]
             orphan_operations = []
@@ -1172,19 +1794,15 @@ class LiquidHandler:
                     elif volume > pipette.min_volume:
                         orphan_operations.append([source, destination, volume, idx])
                     else:
-                        logging.warning(
-                            f"Volume too low, requested operation ignored: dispense {volume} ul to {destination} with pipette {pipette}"
+                        logger.warning(
+                            "Volume too low, requested operation ignored: dispense %s ul to %s with pipette %s",
+                            volume,
+                            destination,
+                            pipette,
                         )
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, idx, failed_operations, "volume_too_low"
+                        add_failed_pipette_operations(
+                            pipette_name, idx, "volume_too_low"
                         )
-                        allocated_indexes.extend(idxs)
-
-            first_round = True
-            if single_tip_mode and steps:
-                self._set_single_tip_mode(True)
-
-            # Actual liquid handling
 
             # Single aspirate, multi-dispense
             # Sort the dispense operations based on the destination well name
@@ -1204,533 +1822,744 @@ class LiquidHandler:
                     "".join(filter(str.isalpha, x[0][1].well_name)),
                 ),
             )
-            for aspiration_set in aspiration_sets:
-                # Skip this set if pipette has run out of tips
-                if pipette_name in out_of_tips_pipettes:
-                    # Add all operations in this set to failed operations
-                    for source, destination, volume, orig_idx in aspiration_set:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, "out_of_tips"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
-
-                # [[[source, dest, vol], [source, dest, vol]],[[source, dest2, vol2], [source, dest2, vol2]],...]
-                source_well = aspiration_set[0][0]
-                set_volume = sum([op[2] for op in aspiration_set])
-
-                try:
-                    # Check if tip should be changed due to reuse limit
-                    force_tip_change = (
-                        tip_reuse_limit is not None 
-                        and tip_usage_counts[pipette_name] >= tip_reuse_limit
-                        and pipette.has_tip
+            if optimize_path:
+                aspiration_sets, default_distance, optimized_distance = order_operation_sets(
+                    aspiration_sets, 0, True, point_of
+                )
+                travel_report.add(default_distance, optimized_distance)
+            # Multi-aspirate single dispense
+            # Sort the dispense operations based on the source well name
+            dispense_sets = sorted(
+                [sorted(d_set, key=lambda x: str(x[0])) for d_set in dispense_sets],
+                key=lambda x: str(x[0][0]),
+            )
+            if optimize_path:
+                dispense_sets, default_distance, optimized_distance = order_operation_sets(
+                    dispense_sets, 1, False, point_of
+                )
+                travel_report.add(default_distance, optimized_distance)
+            # Simple aspirate and dispense
+            # Sort the orphan operations based on the source well name
+            orphan_operations = sorted(orphan_operations, key=lambda x: str(x[0]))
+            if optimize_path:
+                orphan_sets, default_distance, optimized_distance = order_operation_sets(
+                    [[op] for op in orphan_operations], 0, True, point_of
+                )
+                orphan_operations = [op for orphan_set in orphan_sets for op in orphan_set]
+                travel_report.add(default_distance, optimized_distance)
+
+            pipette_plans.append(
+                PipettePlan(
+                    name=pipette_name,
+                    indexes=tuple(op[0] for op in steps),
+                    volleys=tuple(
+                        [Volley("multi_dispense", tuple(map(tuple, s))) for s in aspiration_sets]
+                        + [Volley("multi_aspirate", tuple(map(tuple, s))) for s in dispense_sets]
+                        + [Volley("single", (tuple(op),)) for op in orphan_operations]
+                    ),
+                )
+            )
+
+        return TransferPlan(
+            multichannel_members=tuple(
+                (index, tuple(members)) for index, members in multichannel_members.items()
+            ),
+            failed_operations=tuple(planning_failures.items()),
+            pipette_plans=tuple(pipette_plans),
+            travel_distances=(travel_report.default_distance, travel_report.optimized_distance),
+            **plan_fields,
+        )
+
+    def _run_plan(
+        self,
+        plan,
+        p300_multi,
+        p20,
+        set_nozzle_layout,
+        wait,
+        trace=None,
+        restore_layout=True,
+        keep_tips=False,
+    ):
+        """
+        Run a transfer plan on the given pipettes, which are either the pipettes of the robot or stand-ins that
+        record the commands.
+
+        Parameters:
+            plan (TransferPlan): The plan to run.
+            p300_multi, p20: The pipettes.
+            set_nozzle_layout (callable): Sets the nozzle layout of the p300_multi by its number of channels.
+            wait (callable): Waits for the given number of seconds.
+            trace (ExecutionTrace, optional): Trace of the pipettes, which is told the operations of
+                each volley.
+            restore_layout (bool, optional): Whether to set the p300_multi back to all nozzles
+                at the end, unless keep_nozzle_layout is set. False for the groups of a plan.
+            keep_tips (bool, optional): Whether to keep the tips attached at the end instead of
+                dropping them. True for the groups of a plan taking a fresh tip "once", which carry
+                the tip from one group to the next.
+
+        Returns:
+            list: The failed operations, as returned by transfer.
+        """
+        failed_operations = _FailedOperations(plan.original_indexes)
+        if plan.groups:
+            # With new_tip "once", the tip is carried from one group to the next, and dropped
+            # after the last one
+            carry_tips = keep_tips or plan.new_tip == "once"
+            for indexes, group_plan in plan.groups:
+                with self._mapped_trace_indexes(trace, plan.original_indexes, indexes):
+                    group_failed_operations = self._run_plan(
+                        group_plan,
+                        p300_multi,
+                        p20,
+                        set_nozzle_layout,
+                        wait,
+                        trace,
+                        restore_layout=False,
+                        keep_tips=carry_tips,
+                    )
+                for source, destination, volume, idx, reason in group_failed_operations:
+                    failed_operations.add(indexes[idx], reason, source, destination, volume)
+            if carry_tips and not keep_tips:
+                for pipette in (p300_multi, p20):
+                    try:
+                        if pipette.has_tip:
+                            pipette.drop_tip() if plan.trash_tips else pipette.return_tip()
+                    except Exception as e:
+                        logger.error("Error dropping/returning tip: %s", e)
+            if restore_layout:
+                self._restore_nozzle_layout(set_nozzle_layout)
+            return failed_operations.as_list()
+
+        multichannel_members = dict(plan.multichannel_members)
+
+        def add_failed_pipette_operations(pipette_name: str, orig_idx: int, failure_reason: str):
+            # A multichannel operation stands for the operations of the column it covers
+            if CONFIGURATION_CHANNELS.get(pipette_name, 1) > 1:
+                indexes = multichannel_members.get(orig_idx, [orig_idx])
+            else:
+                indexes = [orig_idx]
+            for i in indexes:
+                failed_operations.add(
+                    i, failure_reason, plan.source_wells[i], plan.destination_wells[i], plan.volumes[i]
+                )
+
+        def trace_pipette_operations(pipette_name: str, operations):
+            if trace is None:
+                return
+            trace.set_operations(
+                [
+                    (
+                        source,
+                        destination,
+                        multichannel_members.get(orig_idx, [orig_idx])
+                        if CONFIGURATION_CHANNELS[pipette_name] > 1
+                        else [orig_idx],
+                    )
+                    for source, destination, volume, orig_idx in operations
+                ]
+            )
+
+        for index, reason in plan.failed_operations:
+            add_failed_pipette_operations("", index, reason)
+
+        # The p300_multi starts with the configuration of its current nozzle layout, which the
+        # previous plan or group left, and stays in the layout of its last configuration
+        current_channels = p300_multi.active_channels
+        pipette_plans = sorted(
+            plan.pipette_plans,
+            key=lambda pipette_plan: pipette_plan.name == "p20"
+            or pipette_plan.channels != current_channels,
+        )
+        with self._mapped_trace_indexes(trace, plan.original_indexes):
+            for pipette_plan in pipette_plans:
+                self._execute_pipette_plan(
+                    plan,
+                    pipette_plan,
+                    p20 if pipette_plan.name == "p20" else p300_multi,
+                    set_nozzle_layout,
+                    wait,
+                    add_failed_pipette_operations,
+                    trace_pipette_operations,
+                    keep_tips,
+                )
+        if restore_layout:
+            self._restore_nozzle_layout(set_nozzle_layout)
+        return failed_operations.as_list()
+
+    def _restore_nozzle_layout(self, set_nozzle_layout):
+        """
+        Set the p300_multi back to all nozzles at the end of a liquid handling call, unless
+        keep_nozzle_layout is set.
+        """
+        if self.keep_nozzle_layout:
+            return
+        try:
+            set_nozzle_layout(8)
+        except Exception as e:
+            logger.error("Error resetting the nozzle layout: %s", e)
+
+    def _execute_pipette_plan(
+        self,
+        plan,
+        pipette_plan,
+        pipette,
+        set_nozzle_layout,
+        wait,
+        add_failed_pipette_operations,
+        trace_pipette_operations,
+        keep_tips=False,
+    ):
+        """
+        Run the volleys of a pipette configuration: single aspirate multi-dispense volleys first, then
+        multi-aspirate single dispense volleys and finally the single operations. The p300_multi is left in
+        the nozzle layout of the configuration, and the tip is dropped at the end unless keep_tips is set.
+        """
+        new_tip = plan.new_tip
+        touch_tip = plan.touch_tip
+        blow_out_to = plan.blow_out_to
+        trash_tips = plan.trash_tips
+        add_air_gap = plan.add_air_gap
+        overhead_liquid = plan.overhead_liquid
+        mix_after = plan.mix_after
+        retention_time = plan.retention_time
+        tip_reuse_limit = plan.tip_reuse_limit
+        kwargs = dict(plan.pipette_kwargs)
+
+        pipette_name = pipette_plan.name
+        single_tip_mode = pipette_plan.single_tip_mode
+        max_vol = min(self.max_volume, pipette.max_volume)
+        aspiration_sets = [v.operations for v in pipette_plan.volleys if v.kind == "multi_dispense"]
+        dispense_sets = [v.operations for v in pipette_plan.volleys if v.kind == "multi_aspirate"]
+        orphan_operations = [v.operations[0] for v in pipette_plan.volleys if v.kind == "single"]
+
+        # Track whether the pipette has run out of tips
+        out_of_tips_pipettes = set()
+
+        # Track tip usage counts for tip_reuse_limit
+        tip_usage_counts = {pipette_name: 0}
+
+        # Track tip state for overhead liquid and air gap to prevent duplicate additions
+        tip_state = {pipette_name: {"has_overhead": False, "has_air_gap": False}}
+
+        first_round = True
+        if pipette_name != "p20" and pipette_plan.indexes:
+            set_nozzle_layout(pipette_plan.channels)
+
+        # Actual liquid handling
+
+        # Single aspirate, multi-dispense
+        for aspiration_set in aspiration_sets:
+            # Skip this set if pipette has run out of tips
+            if pipette_name in out_of_tips_pipettes:
+                # Add all operations in this set to failed operations
+                for source, destination, volume, orig_idx in aspiration_set:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, "out_of_tips"
                     )
-                    
-                    match new_tip:
-                        case "always" | "on aspiration":
+                continue
+
+            # [[[source, dest, vol], [source, dest, vol]],[[source, dest2, vol2], [source, dest2, vol2]],...]
+            trace_pipette_operations(pipette_name, aspiration_set)
+            source_well = aspiration_set[0][0]
+            set_volume = sum([op[2] for op in aspiration_set])
+
+            try:
+                # Check if tip should be changed due to reuse limit
+                force_tip_change = (
+                    tip_reuse_limit is not None 
+                    and tip_usage_counts[pipette_name] >= tip_reuse_limit
+                    and pipette.has_tip
+                )
+                
+                match new_tip:
+                    case "always" | "on aspiration":
+                        if pipette.has_tip:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                pipette.blow_out(source_well.top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                        pipette.pick_up_tip()
+                        tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        # Reset tip state for new tip
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    case "once":
+                        if first_round or force_tip_change:
                             if pipette.has_tip:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
+                                # For source_after_pipetting, blow out to source before dropping tip
                                 if blow_out_to == "source_after_pipetting" and pipette.current_volume:
                                     pipette.blow_out(source_well.top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
+                                pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
+                                # Reset tip state when tip is dropped
                                 tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            first_round = False
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        if not pipette.has_tip:
                             pipette.pick_up_tip()
                             tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
                             # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case "once":
-                            if first_round or force_tip_change:
-                                if pipette.has_tip:
-                                    # For source_after_pipetting, blow out to source before dropping tip
-                                    if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                        pipette.blow_out(source_well.top())
-                                    pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
-                                    # Reset tip state when tip is dropped
-                                    tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                first_round = False
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                            if not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case _:
-                            # Keep the tips already attached, otherwise pick up fresh ones
-                            if force_tip_change:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
-                                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                    pipette.blow_out(source_well.top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                            elif not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                
-                    # Now calculate overhead liquid and air gap AFTER tip management
-                    # Check if overhead liquid and air gap should be added based on current tip state
-                    should_add_overhead = overhead_liquid and not tip_state[pipette_name]["has_overhead"]
-                    should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
-                    
-                    extra_volume = (
-                        pipette.min_volume if should_add_overhead and set_volume + pipette.min_volume <= max_vol else 0
-                    )
-                    air_gap_volume = (
-                        pipette.min_volume if should_add_air_gap else 0
-                    )
-                except OutOfTipsError:
-                    logging.error(
-                        f"Out of tips for {pipette}. Marking all related operations as failed."
-                    )
-                    out_of_tips_pipettes.add(pipette_name)
-                    # Add all operations in this set to failed operations
-                    for source, destination, volume, orig_idx in aspiration_set:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, "out_of_tips"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
-
-                last_index = 0
-                try:
-                    # Perform aspiration with air gap
-                    if air_gap_volume:
-                        pipette.move_to(location=source_well.top(5))
-                        pipette.air_gap(volume=air_gap_volume)
-                        # Mark that air gap has been added to this tip
-                        tip_state[pipette_name]["has_air_gap"] = True
-                    pipette.aspirate(
-                        volume=set_volume + extra_volume, location=source_well, **kwargs
-                    )
-                    # Mark that overhead liquid has been added to this tip if extra_volume > 0
-                    if extra_volume > 0:
-                        tip_state[pipette_name]["has_overhead"] = True
-                    time.sleep(retention_time)
-                    if touch_tip:
-                        pipette.touch_tip(v_offset=-1)
-
-                    # Perform dispenses
-                    for last_index, (source, destination_well, volume, orig_idx) in enumerate(
-                        aspiration_set
-                    ):
-                        pipette.dispense(volume=volume, location=destination_well, **kwargs)
-                        time.sleep(retention_time)
-                        if touch_tip:
-                            pipette.touch_tip(v_offset=-1)
-
-                        if mix_after:
-                            if len(aspiration_set) == 1:
-                                if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
-                                    logging.warning(
-                                        f"Mixing ignored: mixing volume ({mix_after[1]} ul) exceeds the pipette / tip volume range ({pipette.min_volume} ul - {max_vol} ul)"
-                                    )
-                                else:
-                                    pipette.mix(
-                                        repetitions=mix_after[0],
-                                        volume=mix_after[1],
-                                        location=destination_well,
-                                    )
-                            else:
-                                logging.warning(
-                                    "Mixing ignored: mixing volume is not supported for multi-dispense operations"
-                                )
-
-                    # Handle remaining volume
-                    if pipette.current_volume:
-                        if blow_out_to == "trash":
-                            pipette.blow_out(self.trash)
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
+                    case _:
+                        # Keep the tips already attached, otherwise pick up fresh ones
+                        if force_tip_change:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                pipette.blow_out(source_well.top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "source":
-                            pipette.blow_out(source_well.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
-                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "destination":
-                            pipette.blow_out(destination_well.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to in ["source_after_pipetting", ""]:
-                            # Don't blow out here - keep overhead liquid and air gap for reuse
-                            pass
-                        # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
-                    
-                    # Increment tip usage counter after successful aspiration-dispense cycle
-                    if tip_reuse_limit is not None:
-                        tip_usage_counts[pipette_name] += 1
-
-                except Exception as e:
-                    logging.error(f"Error during aspiration/dispense: {str(e)}")
-                    for source, destination, volume, orig_idx in aspiration_set[last_index:]:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, f"pipette_error: {str(e)}"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
-
-            # Multi-aspirate single dispense
-            # Sort the dispense operations based on the source well name
-            dispense_sets = sorted(
-                [sorted(d_set, key=lambda x: str(x[0])) for d_set in dispense_sets],
-                key=lambda x: str(x[0][0]),
-            )
-            for dispense_set in dispense_sets:
-                # Skip this set if pipette has run out of tips
-                if pipette_name in out_of_tips_pipettes:
-                    # Add all operations in this set to failed operations
-                    for source, destination, volume, orig_idx in dispense_set:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, "out_of_tips"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
-
-                # [[[source1, dest, vol1], [source2, dest, vol2]],[[source3, dest, vol3], [source4, dest, vol4]],...]
-                destination_well = dispense_set[0][1]
-                set_volume = sum([op[2] for op in dispense_set])
-
-                try:
-                    # Check if tip should be changed due to reuse limit
-                    force_tip_change = (
-                        tip_reuse_limit is not None 
-                        and tip_usage_counts[pipette_name] >= tip_reuse_limit
-                        and pipette.has_tip
-                    )
-                    
-                    match new_tip:
-                        case "always" | "on aspiration":
-                            if pipette.has_tip:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
-                                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                    # Use the first source well from the dispense set
-                                    pipette.blow_out(dispense_set[0][0].top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                        elif not pipette.has_tip:
                             pipette.pick_up_tip()
                             tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
                             # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case "once":
-                            if first_round or force_tip_change:
-                                if pipette.has_tip:
-                                    # For source_after_pipetting, blow out to source before dropping tip
-                                    if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                        pipette.blow_out(dispense_set[0][0].top())
-                                    pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
-                                    # Reset tip state when tip is dropped
-                                    tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                first_round = False
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                            if not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case _:
-                            # Keep the tips already attached, otherwise pick up fresh ones
-                            if force_tip_change:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
-                                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                    pipette.blow_out(dispense_set[0][0].top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                            elif not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                
-                    # Now calculate air gap AFTER tip management
-                    # Check if air gap should be added based on current tip state
-                    should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
-                    
-                    air_gap_volume = (
-                        pipette.min_volume if should_add_air_gap else 0
-                    )
-                except OutOfTipsError:
-                    logging.error(
-                        f"Out of tips for {pipette}. Marking all related operations as failed."
+                            
+                # Now calculate overhead liquid and air gap AFTER tip management
+                # Check if overhead liquid and air gap should be added based on current tip state
+                should_add_overhead = overhead_liquid and not tip_state[pipette_name]["has_overhead"]
+                should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
+                
+                extra_volume = (
+                    pipette.min_volume if should_add_overhead and set_volume + pipette.min_volume <= max_vol else 0
+                )
+                air_gap_volume = (
+                    pipette.min_volume if should_add_air_gap else 0
+                )
+            except OutOfTipsError:
+                logger.error(
+                    "Out of tips for %s. Marking all related operations as failed.", pipette
+                )
+                out_of_tips_pipettes.add(pipette_name)
+                # Add all operations in this set to failed operations
+                for source, destination, volume, orig_idx in aspiration_set:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, "out_of_tips"
                     )
-                    out_of_tips_pipettes.add(pipette_name)
-                    # Add all operations in this set to failed operations
-                    for source, destination, volume, orig_idx in dispense_set:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, "out_of_tips"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
-
-                try:
-                    # Perform aspirations with air gap
-                    if air_gap_volume:
-                        pipette.move_to(location=dispense_set[0][0].top(5))
-                        pipette.air_gap(volume=air_gap_volume)
-                        # Mark that air gap has been added to this tip
-                        tip_state[pipette_name]["has_air_gap"] = True
-                    total_volume = 0
-                    for source, _, volume, idx in dispense_set:
-                        pipette.aspirate(volume=volume, location=source, **kwargs)
-                        time.sleep(retention_time)
-                        if touch_tip:
-                            pipette.touch_tip(v_offset=-1)
-                        total_volume += volume
-
-                    # Perform dispense
-                    pipette.dispense(volume=total_volume, location=destination_well, **kwargs)
-                    time.sleep(retention_time)
+                continue
+
+            last_index = 0
+            try:
+                # Perform aspiration with air gap
+                if air_gap_volume:
+                    pipette.move_to(location=source_well.top(5))
+                    pipette.air_gap(volume=air_gap_volume)
+                    # Mark that air gap has been added to this tip
+                    tip_state[pipette_name]["has_air_gap"] = True
+                pipette.aspirate(
+                    volume=set_volume + extra_volume, location=source_well, **kwargs
+                )
+                # Mark that overhead liquid has been added to this tip if extra_volume > 0
+                if extra_volume > 0:
+                    tip_state[pipette_name]["has_overhead"] = True
+                wait(retention_time)
+                if touch_tip:
+                    pipette.touch_tip(v_offset=-1)
+
+                # Perform dispenses
+                for last_index, (source, destination_well, volume, orig_idx) in enumerate(
+                    aspiration_set
+                ):
+                    pipette.dispense(volume=volume, location=destination_well, **kwargs)
+                    wait(retention_time)
                     if touch_tip:
                         pipette.touch_tip(v_offset=-1)
 
                     if mix_after:
-                        if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
-                            logging.warning(
-                                f"Mixing ignored: mixing volume ({mix_after[1]} ul) exceeds the pipette / tip volume range ({pipette.min_volume} ul - {max_vol} ul)"
-                            )
+                        if len(aspiration_set) == 1:
+                            if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
+                                logger.warning(
+                                    "Mixing ignored: mixing volume (%s ul) exceeds the pipette / tip volume range (%s ul - %s ul)",
+                                    mix_after[1],
+                                    pipette.min_volume,
+                                    max_vol,
+                                )
+                            else:
+                                pipette.mix(
+                                    repetitions=mix_after[0],
+                                    volume=mix_after[1],
+                                    location=destination_well,
+                                )
                         else:
-                            pipette.mix(
-                                repetitions=mix_after[0],
-                                volume=mix_after[1],
-                                location=destination_well,
+                            logger.warning(
+                                "Mixing ignored: mixing volume is not supported for multi-dispense operations"
                             )
 
-                    # Handle remaining volume
-                    if pipette.current_volume:
-                        if blow_out_to == "trash":
-                            pipette.blow_out(self.trash)
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
-                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "source":
-                            pipette.blow_out(source.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
-                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "destination":
-                            pipette.blow_out(destination_well.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
-                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to in ["source_after_pipetting", ""]:
-                            # Don't blow out here - keep overhead liquid and air gap for reuse
-                            # Blow out will happen only when tip is about to be changed/dropped (for source_after_pipetting)
-                            # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
-                            pass
-                    
-                    # Increment tip usage counter after successful aspiration-dispense cycle
-                    if tip_reuse_limit is not None:
-                        tip_usage_counts[pipette_name] += 1
-
-                except Exception as e:
-                    logging.error(f"Error during aspiration/dispense: {str(e)}", exc_info=True)
-                    for source, destination, volume, orig_idx in dispense_set:
-                        idxs, failed_operations = add_failed_pipette_operations(
-                            pipette_name, orig_idx, failed_operations, f"pipette_error: {str(e)}"
-                        )
-                        allocated_indexes.extend(idxs)
-                    continue
+                # Handle remaining volume
+                if pipette.current_volume:
+                    if blow_out_to == "trash":
+                        pipette.blow_out(self.trash)
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "source":
+                        pipette.blow_out(source_well.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "destination":
+                        pipette.blow_out(destination_well.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to in ["source_after_pipetting", ""]:
+                        # Don't blow out here - keep overhead liquid and air gap for reuse
+                        pass
+                    # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
+                
+                # Increment tip usage counter after successful aspiration-dispense cycle
+                if tip_reuse_limit is not None:
+                    tip_usage_counts[pipette_name] += 1
 
-            # Simple aspirate and dispense
-            # Sort the orphan operations based on the source well name
-            orphan_operations = sorted(orphan_operations, key=lambda x: str(x[0]))
-            for source, destination, volume, orig_idx in orphan_operations:
-                # Skip this operation if pipette has run out of tips
-                if pipette_name in out_of_tips_pipettes:
-                    idxs, failed_operations = add_failed_pipette_operations(
-                        pipette_name, orig_idx, failed_operations, "out_of_tips"
+            except Exception as e:
+                logger.error("Error during aspiration/dispense: %s", e)
+                for source, destination, volume, orig_idx in aspiration_set[last_index:]:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, f"pipette_error: {str(e)}"
                     )
-                    allocated_indexes.extend(idxs)
-                    continue
-
-                try:
-                    # Check if tip should be changed due to reuse limit
-                    force_tip_change = (
-                        tip_reuse_limit is not None 
-                        and tip_usage_counts[pipette_name] >= tip_reuse_limit
-                        and pipette.has_tip
+                continue
+
+        # Multi-aspirate single dispense
+        for dispense_set in dispense_sets:
+            # Skip this set if pipette has run out of tips
+            if pipette_name in out_of_tips_pipettes:
+                # Add all operations in this set to failed operations
+                for source, destination, volume, orig_idx in dispense_set:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, "out_of_tips"
                     )
-                    
-                    match new_tip:
-                        case "always" | "on aspiration":
+                continue
+
+            # [[[source1, dest, vol1], [source2, dest, vol2]],[[source3, dest, vol3], [source4, dest, vol4]],...]
+            trace_pipette_operations(pipette_name, dispense_set)
+            destination_well = dispense_set[0][1]
+            set_volume = sum([op[2] for op in dispense_set])
+
+            try:
+                # Check if tip should be changed due to reuse limit
+                force_tip_change = (
+                    tip_reuse_limit is not None 
+                    and tip_usage_counts[pipette_name] >= tip_reuse_limit
+                    and pipette.has_tip
+                )
+                
+                match new_tip:
+                    case "always" | "on aspiration":
+                        if pipette.has_tip:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                # Use the first source well from the dispense set
+                                pipette.blow_out(dispense_set[0][0].top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                        pipette.pick_up_tip()
+                        tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        # Reset tip state for new tip
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    case "once":
+                        if first_round or force_tip_change:
                             if pipette.has_tip:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
+                                # For source_after_pipetting, blow out to source before dropping tip
                                 if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                    pipette.blow_out(source.top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
+                                    pipette.blow_out(dispense_set[0][0].top())
+                                pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
+                                # Reset tip state when tip is dropped
                                 tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            first_round = False
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        if not pipette.has_tip:
                             pipette.pick_up_tip()
                             tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
                             # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case "once":
-                            if first_round or force_tip_change:
-                                if pipette.has_tip:
-                                    # For source_after_pipetting, blow out to source before dropping tip
-                                    if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                        pipette.blow_out(source.top())
-                                    pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
-                                    # Reset tip state when tip is dropped
-                                    tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                first_round = False
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                            if not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        case _:
-                            # Keep the tips already attached, otherwise pick up fresh ones
-                            if force_tip_change:
-                                # For source_after_pipetting, blow out to source before dropping/returning tip
-                                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                                    pipette.blow_out(source.top())
-                                pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
-                                # Reset tip state when tip is dropped/returned
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                            elif not pipette.has_tip:
-                                pipette.pick_up_tip()
-                                tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
-                                # Reset tip state for new tip
-                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                                
-                    # Now calculate overhead liquid and air gap AFTER tip management
-                    # Check if overhead liquid and air gap should be added based on current tip state
-                    should_add_overhead = overhead_liquid and not tip_state[pipette_name]["has_overhead"]
-                    should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
-                    
-                    extra_volume = (
-                        pipette.min_volume if should_add_overhead and volume + pipette.min_volume <= max_vol else 0
-                    )
-                    air_gap_volume = (
-                        pipette.min_volume if should_add_air_gap else 0
-                    )
-                except OutOfTipsError:
-                    logging.error(
-                        f"Out of tips for {pipette}. Marking all related operations as failed."
-                    )
-                    out_of_tips_pipettes.add(pipette_name)
-                    idxs, failed_operations = add_failed_pipette_operations(
-                        pipette_name, orig_idx, failed_operations, "out_of_tips"
+                    case _:
+                        # Keep the tips already attached, otherwise pick up fresh ones
+                        if force_tip_change:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                pipette.blow_out(dispense_set[0][0].top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                        elif not pipette.has_tip:
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            
+                # Now calculate air gap AFTER tip management
+                # Check if air gap should be added based on current tip state
+                should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
+                
+                air_gap_volume = (
+                    pipette.min_volume if should_add_air_gap else 0
+                )
+            except OutOfTipsError:
+                logger.error(
+                    "Out of tips for %s. Marking all related operations as failed.", pipette
+                )
+                out_of_tips_pipettes.add(pipette_name)
+                # Add all operations in this set to failed operations
+                for source, destination, volume, orig_idx in dispense_set:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, "out_of_tips"
                     )
-                    allocated_indexes.extend(idxs)
-                    continue
-
-                try:
-                    # Perform aspiration with air gap
-                    if air_gap_volume:
-                        pipette.move_to(location=source.top(5))
-                        pipette.air_gap(volume=air_gap_volume)
-                        # Mark that air gap has been added to this tip
-                        tip_state[pipette_name]["has_air_gap"] = True
-                    pipette.aspirate(volume=volume + extra_volume, location=source, **kwargs)
-                    # Mark that overhead liquid has been added to this tip if extra_volume > 0
-                    if extra_volume > 0:
-                        tip_state[pipette_name]["has_overhead"] = True
-                    time.sleep(retention_time)
-                    if touch_tip:
-                        pipette.touch_tip(v_offset=-1)
+                continue
 
-                    # Perform dispense
-                    pipette.dispense(volume=volume, location=destination, **kwargs)
-                    time.sleep(retention_time)
+            try:
+                # Perform aspirations with air gap
+                if air_gap_volume:
+                    pipette.move_to(location=dispense_set[0][0].top(5))
+                    pipette.air_gap(volume=air_gap_volume)
+                    # Mark that air gap has been added to this tip
+                    tip_state[pipette_name]["has_air_gap"] = True
+                total_volume = 0
+                for source, _, volume, idx in dispense_set:
+                    pipette.aspirate(volume=volume, location=source, **kwargs)
+                    wait(retention_time)
                     if touch_tip:
                         pipette.touch_tip(v_offset=-1)
+                    total_volume += volume
+
+                # Perform dispense
+                pipette.dispense(volume=total_volume, location=destination_well, **kwargs)
+                wait(retention_time)
+                if touch_tip:
+                    pipette.touch_tip(v_offset=-1)
+
+                if mix_after:
+                    if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
+                        logger.warning(
+                            "Mixing ignored: mixing volume (%s ul) exceeds the pipette / tip volume range (%s ul - %s ul)",
+                            mix_after[1],
+                            pipette.min_volume,
+                            max_vol,
+                        )
+                    else:
+                        pipette.mix(
+                            repetitions=mix_after[0],
+                            volume=mix_after[1],
+                            location=destination_well,
+                        )
 
-                    if mix_after:
-                        if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
-                            logging.warning(
-                                f"Mixing ignored: mixing volume ({mix_after[1]} ul) exceeds the pipette / tip volume range ({pipette.min_volume} ul - {max_vol} ul)"
-                            )
-                        else:
-                            pipette.mix(
-                                repetitions=mix_after[0],
-                                volume=mix_after[1],
-                                location=destination,
-                            )
+                # Handle remaining volume
+                if pipette.current_volume:
+                    if blow_out_to == "trash":
+                        pipette.blow_out(self.trash)
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "source":
+                        pipette.blow_out(source.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "destination":
+                        pipette.blow_out(destination_well.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to in ["source_after_pipetting", ""]:
+                        # Don't blow out here - keep overhead liquid and air gap for reuse
+                        # Blow out will happen only when tip is about to be changed/dropped (for source_after_pipetting)
+                        # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
+                        pass
+                
+                # Increment tip usage counter after successful aspiration-dispense cycle
+                if tip_reuse_limit is not None:
+                    tip_usage_counts[pipette_name] += 1
+
+            except Exception as e:
+                logger.error("Error during aspiration/dispense: %s", e, exc_info=True)
+                for source, destination, volume, orig_idx in dispense_set:
+                    add_failed_pipette_operations(
+                        pipette_name, orig_idx, f"pipette_error: {str(e)}"
+                    )
+                continue
+
+        # Simple aspirate and dispense
+        for source, destination, volume, orig_idx in orphan_operations:
+            # Skip this operation if pipette has run out of tips
+            if pipette_name in out_of_tips_pipettes:
+                add_failed_pipette_operations(
+                    pipette_name, orig_idx, "out_of_tips"
+                )
+                continue
 
-                    # Handle remaining volume
-                    if pipette.current_volume:
-                        if blow_out_to == "trash":
-                            pipette.blow_out(self.trash)
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
+            trace_pipette_operations(pipette_name, [(source, destination, volume, orig_idx)])
+            try:
+                # Check if tip should be changed due to reuse limit
+                force_tip_change = (
+                    tip_reuse_limit is not None 
+                    and tip_usage_counts[pipette_name] >= tip_reuse_limit
+                    and pipette.has_tip
+                )
+                
+                match new_tip:
+                    case "always" | "on aspiration":
+                        if pipette.has_tip:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                pipette.blow_out(source.top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "source":
-                            pipette.blow_out(source.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        pipette.pick_up_tip()
+                        tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        # Reset tip state for new tip
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    case "once":
+                        if first_round or force_tip_change:
+                            if pipette.has_tip:
+                                # For source_after_pipetting, blow out to source before dropping tip
+                                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                    pipette.blow_out(source.top())
+                                pipette.drop_tip()  # Tips are trashed always, because they are leftovers from previous operations
+                                # Reset tip state when tip is dropped
+                                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            first_round = False
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                        if not pipette.has_tip:
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to == "destination":
-                            pipette.blow_out(destination.top())
-                            # Reset tip state after blowout as air gap and overhead liquid are expelled
+                    case _:
+                        # Keep the tips already attached, otherwise pick up fresh ones
+                        if force_tip_change:
+                            # For source_after_pipetting, blow out to source before dropping/returning tip
+                            if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                                pipette.blow_out(source.top())
+                            pipette.drop_tip() if trash_tips or single_tip_mode else pipette.return_tip()
+                            # Reset tip state when tip is dropped/returned
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                        elif blow_out_to in ["source_after_pipetting", ""]:
-                            # Don't blow out here - keep overhead liquid and air gap for reuse
-                            # Blow out will happen only when tip is about to be changed/dropped (for source_after_pipetting)
-                            # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
-                            pass
-                    
-                    # Increment tip usage counter after successful aspiration-dispense cycle
-                    if tip_reuse_limit is not None:
-                        tip_usage_counts[pipette_name] += 1
-
-                except Exception as e:
-                    logging.error(f"Error during aspiration/dispense: {str(e)}")
-                    idxs, failed_operations = add_failed_pipette_operations(
-                        pipette_name, orig_idx, failed_operations, f"pipette_error: {str(e)}"
-                    )
-                    allocated_indexes.extend(idxs)
-                    continue
-
-            # Clean up tips for this pipette at the end of its operations
-            if pipette_name not in out_of_tips_pipettes and pipette.has_tip:
-                try:
-                    # For source_after_pipetting, blow out to source at the end of transfers, regardless of tip handling
-                    if blow_out_to == "source_after_pipetting" and pipette.current_volume:
-                        # Find the last source well used by this pipette
-                        last_source_well = None
-                        for step in reversed(steps):
-                            if step:  # step format: [idx, source, destination, volume]
-                                last_source_well = step[1]
-                                break
-                        if last_source_well:
-                            pipette.blow_out(last_source_well.top())
-                            # Reset tip state after blowout
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
                             tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                    
-                    if new_tip != "never":
-                        if trash_tips:
-                            pipette.drop_tip()
-                        else:
-                            pipette.return_tip()
-                        # Reset tip state when tip is dropped/returned
-                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
-                except Exception as e:
-                    logging.error(f"Error dropping/returning tip: {str(e)}")
-                    # Reset tip state even if drop/return fails
-                    tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                        elif not pipette.has_tip:
+                            pipette.pick_up_tip()
+                            tip_usage_counts[pipette_name] = 0  # Reset counter on new tip
+                            # Reset tip state for new tip
+                            tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                            
+                # Now calculate overhead liquid and air gap AFTER tip management
+                # Check if overhead liquid and air gap should be added based on current tip state
+                should_add_overhead = overhead_liquid and not tip_state[pipette_name]["has_overhead"]
+                should_add_air_gap = add_air_gap and not tip_state[pipette_name]["has_air_gap"]
+                
+                extra_volume = (
+                    pipette.min_volume if should_add_overhead and volume + pipette.min_volume <= max_vol else 0
+                )
+                air_gap_volume = (
+                    pipette.min_volume if should_add_air_gap else 0
+                )
+            except OutOfTipsError:
+                logger.error(
+                    "Out of tips for %s. Marking all related operations as failed.", pipette
+                )
+                out_of_tips_pipettes.add(pipette_name)
+                add_failed_pipette_operations(
+                    pipette_name, orig_idx, "out_of_tips"
+                )
+                continue
 
-            # All liquid handling is done
             try:
-                if single_tip_mode:
-                    self._set_single_tip_mode(False)
+                # Perform aspiration with air gap
+                if air_gap_volume:
+                    pipette.move_to(location=source.top(5))
+                    pipette.air_gap(volume=air_gap_volume)
+                    # Mark that air gap has been added to this tip
+                    tip_state[pipette_name]["has_air_gap"] = True
+                pipette.aspirate(volume=volume + extra_volume, location=source, **kwargs)
+                # Mark that overhead liquid has been added to this tip if extra_volume > 0
+                if extra_volume > 0:
+                    tip_state[pipette_name]["has_overhead"] = True
+                wait(retention_time)
+                if touch_tip:
+                    pipette.touch_tip(v_offset=-1)
+
+                # Perform dispense
+                pipette.dispense(volume=volume, location=destination, **kwargs)
+                wait(retention_time)
+                if touch_tip:
+                    pipette.touch_tip(v_offset=-1)
+
+                if mix_after:
+                    if mix_after[1] > max_vol or mix_after[1] < pipette.min_volume:
+                        logger.warning(
+                            "Mixing ignored: mixing volume (%s ul) exceeds the pipette / tip volume range (%s ul - %s ul)",
+                            mix_after[1],
+                            pipette.min_volume,
+                            max_vol,
+                        )
+                    else:
+                        pipette.mix(
+                            repetitions=mix_after[0],
+                            volume=mix_after[1],
+                            location=destination,
+                        )
+
+                # Handle remaining volume
+                if pipette.current_volume:
+                    if blow_out_to == "trash":
+                        pipette.blow_out(self.trash)
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "source":
+                        pipette.blow_out(source.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to == "destination":
+                        pipette.blow_out(destination.top())
+                        # Reset tip state after blowout as air gap and overhead liquid are expelled
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                    elif blow_out_to in ["source_after_pipetting", ""]:
+                        # Don't blow out here - keep overhead liquid and air gap for reuse
+                        # Blow out will happen only when tip is about to be changed/dropped (for source_after_pipetting)
+                        # If blow_out_to is empty string, no blowout occurs, so tip state is preserved
+                        pass
+                
+                # Increment tip usage counter after successful aspiration-dispense cycle
+                if tip_reuse_limit is not None:
+                    tip_usage_counts[pipette_name] += 1
+
             except Exception as e:
-                logging.error(f"Error resetting single tip mode: {str(e)}")
+                logger.error("Error during aspiration/dispense: %s", e)
+                add_failed_pipette_operations(
+                    pipette_name, orig_idx, f"pipette_error: {str(e)}"
+                )
+                continue
 
-        failed_operations.sort(key=lambda x: x[3])
-        return failed_operations
+        # Clean up tips for this pipette at the end of its operations
+        if pipette_name not in out_of_tips_pipettes and pipette.has_tip:
+            try:
+                # For source_after_pipetting, blow out to source at the end of transfers, regardless of tip handling
+                if blow_out_to == "source_after_pipetting" and pipette.current_volume:
+                    # Find the last source well used by this pipette
+                    last_source_well = None
+                    if pipette_plan.indexes:
+                        last_source_well = plan.source_wells[pipette_plan.indexes[-1]]
+                    if last_source_well:
+                        pipette.blow_out(last_source_well.top())
+                        # Reset tip state after blowout
+                        tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+                
+                if new_tip != "never" and not keep_tips:
+                    if trash_tips:
+                        pipette.drop_tip()
+                    else:
+                        pipette.return_tip()
+                    # Reset tip state when tip is dropped/returned
+                    tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
+            except Exception as e:
+                logger.error("Error dropping/returning tip: %s", e)
+                # Reset tip state even if drop/return fails
+                tip_state[pipette_name] = {"has_overhead": False, "has_air_gap": False}
 
     def distribute(
         self,
@@ -1770,6 +2599,7 @@ class LiquidHandler:
                 even if new_tip is "never" or "once". Default: None (no limit enforced).
             **kwargs: Additional keyword arguments to pass to the underlying transfer method. Such as:
                 - mix_after (tuple, optional): First element is repetitions and second element is volume of mixing at the destination well after dispense. False when no mixing needed. Will block multi-dispense mode.
+                - optimize_path (bool, optional): Whether to order the dispense operations by the well coordinates to minimize the path.
 
         Returns:
             list: A list of failed operations, where each entry is a list containing the index of the destination well,
@@ -1782,16 +2612,44 @@ class LiquidHandler:
 
         TODO:
             - Manage contamination through hover dispense, tip touch and tip handling strategies.
-            - Calculate tips in advance, raise error if not enough tips
             - Single tip touch before aspiration if reusing tips
-            - Enable chaching of tips (providing a tip box location where tips are found with the well index)
-
-        Nice-to-have:
-            - Optimize the order within the dispense set to minimize the path.
 
         Raises:
             TypeError: If the source well is not a Well object or a list containing a single Well.
         """
+        transfer_args, transfer_kwargs = self._distribute_arguments(
+            volumes,
+            source_well,
+            destination_wells,
+            new_tip=new_tip,
+            touch_tip=touch_tip,
+            blow_out_to=blow_out_to,
+            trash_tips=trash_tips,
+            add_air_gap=add_air_gap,
+            overhead_liquid=overhead_liquid,
+            tip_reuse_limit=tip_reuse_limit,
+            **kwargs,
+        )
+        return self.transfer(*transfer_args, **transfer_kwargs)
+
+    def _distribute_arguments(
+        self,
+        volumes,
+        source_well,
+        destination_wells,
+        new_tip: str = "once",
+        touch_tip: bool = False,
+        blow_out_to: bool = "trash",
+        trash_tips: bool = True,
+        add_air_gap: bool = True,
+        overhead_liquid: bool = True,
+        tip_reuse_limit: int = None,
+        **kwargs,
+    ):
+        """
+        Check the arguments of distribute and return the positional and keyword arguments of the
+        transfer it runs.
+        """
         # Checking and reformatting parameters
         if not isinstance(source_well, Well):
             if isinstance(source_well, list) and len(source_well) == 1:
@@ -1806,24 +2664,28 @@ class LiquidHandler:
 
         if blow_out_to == "" and new_tip in ["on aspiration", "always"]:
             msg = "blow_out_to should be set when new_tip is 'on aspiration' or 'always'. Setting to 'trash'."
-            logging.warning(msg)
+            logger.warning(msg)
             blow_out_to = "trash"
 
         if isinstance(volumes, float) or isinstance(volumes, int):
             volumes = [volumes] * len(destination_wells)
 
-        return self.transfer(
-            volumes,
-            [source_well] * len(destination_wells),
-            destination_wells,
-            new_tip=new_tip,
-            touch_tip=touch_tip,
-            blow_out_to=blow_out_to,
-            trash_tips=trash_tips,
-            add_air_gap=add_air_gap,
-            overhead_liquid=overhead_liquid,
-            tip_reuse_limit=tip_reuse_limit,
-            **kwargs,
+        return (
+            [
+                volumes,
+                [source_well] * len(destination_wells),
+                destination_wells,
+            ],
+            {
+                "new_tip": new_tip,
+                "touch_tip": touch_tip,
+                "blow_out_to": blow_out_to,
+                "trash_tips": trash_tips,
+                "add_air_gap": add_air_gap,
+                "overhead_liquid": overhead_liquid,
+                "tip_reuse_limit": tip_reuse_limit,
+                **kwargs,
+            },
         )
 
     def pool(
@@ -1854,6 +2716,33 @@ class LiquidHandler:
             TypeError: If the source well is not a Well object or a list containing Well objects.
             ValueError: If an invalid value is provided for 'new_tip'.
         """
+        transfer_args, transfer_kwargs = self._pool_arguments(
+            volumes,
+            source_wells,
+            destination_well,
+            new_tip=new_tip,
+            touch_tip=touch_tip,
+            trash_tips=trash_tips,
+            add_air_gap=add_air_gap,
+            **kwargs,
+        )
+        return self.transfer(*transfer_args, **transfer_kwargs)
+
+    def _pool_arguments(
+        self,
+        volumes,
+        source_wells,
+        destination_well,
+        new_tip: str = "once",
+        touch_tip: bool = False,
+        trash_tips: bool = True,
+        add_air_gap: bool = True,
+        **kwargs,
+    ):
+        """
+        Check the arguments of pool and return the positional and keyword arguments of the
+        transfer it runs.
+        """
         # Checking and reformatting parameters
         if isinstance(destination_well, list):
             if len(destination_well) != 1:
@@ -1876,7 +2765,7 @@ class LiquidHandler:
             volumes = [volumes] * (len(source_wells) if isinstance(source_wells, list) else 1)
 
         if "overhead_liquid" in kwargs:
-            logging.warning("overhead_liquid is not supported for pool, ignoring")
+            logger.warning("overhead_liquid is not supported for pool, ignoring")
             del kwargs["overhead_liquid"]
 
         source_wells = source_wells if isinstance(source_wells, list) else [source_wells]
@@ -1884,17 +2773,21 @@ class LiquidHandler:
         # Multiply the destination wells to match the number of source wells for the transfer method format
         destination_wells = [destination_well] * len(source_wells)
 
-        return self.transfer(
-            volumes,
-            source_wells,
-            destination_wells,
-            new_tip=new_tip,
-            touch_tip=touch_tip,
-            blow_out_to="destination",
-            trash_tips=trash_tips,
-            add_air_gap=add_air_gap,
-            overhead_liquid=False,
-            **kwargs,
+        return (
+            [
+                volumes,
+                source_wells,
+                destination_wells,
+            ],
+            {
+                "new_tip": new_tip,
+                "touch_tip": touch_tip,
+                "blow_out_to": "destination",
+                "trash_tips": trash_tips,
+                "add_air_gap": add_air_gap,
+                "overhead_liquid": False,
+                **kwargs,
+            },
         )
 
     def consolidate(self, *args, **kwargs):
@@ -1937,6 +2830,39 @@ class LiquidHandler:
             list: A list of failed operations, where each entry is a list containing the index of the operation,
                   source well, destination well, and the volume that failed to be dispensed. This can be used to repeat failed operations.
         """
+        transfer_args, transfer_kwargs = self._stamp_arguments(
+            volume,
+            source_plate,
+            destination_plate,
+            sample_count=sample_count,
+            new_tip=new_tip,
+            touch_tip=touch_tip,
+            blow_out_to=blow_out_to,
+            trash_tips=trash_tips,
+            add_air_gap=add_air_gap,
+            overhead_liquid=overhead_liquid,
+            **kwargs,
+        )
+        return self.transfer(*transfer_args, **transfer_kwargs)
+
+    def _stamp_arguments(
+        self,
+        volume: float,
+        source_plate,
+        destination_plate,
+        sample_count: int = 0,
+        new_tip: str = "always",
+        touch_tip: bool = False,
+        blow_out_to: str = "destination",
+        trash_tips: bool = True,
+        add_air_gap: bool = True,
+        overhead_liquid: bool = False,
+        **kwargs,
+    ):
+        """
+        Check the arguments of stamp and return the positional and keyword arguments of the
+        transfer it runs.
+        """
 
         source_wells = source_plate.wells()
         destination_wells = destination_plate.wells()
@@ -1947,19 +2873,24 @@ class LiquidHandler:
         if isinstance(volume, float) or isinstance(volume, int):
             volumes = [volume] * len(destination_wells)
 
-        return self.transfer(
-            volumes,
-            source_wells,
-            destination_wells,
-            new_tip=new_tip,
-            touch_tip=touch_tip,
-            blow_out_to=blow_out_to,
-            trash_tips=trash_tips,
-            add_air_gap=add_air_gap,
-            overhead_liquid=overhead_liquid,
-            **kwargs,
+        return (
+            [
+                volumes,
+                source_wells,
+                destination_wells,
+            ],
+            {
+                "new_tip": new_tip,
+                "touch_tip": touch_tip,
+                "blow_out_to": blow_out_to,
+                "trash_tips": trash_tips,
+                "add_air_gap": add_air_gap,
+                "overhead_liquid": overhead_liquid,
+                **kwargs,
+            },
         )
 
+    @_runs_batch_first
     def mix(self, wells, repetitions, volume, new_tip="once", trash_tip=True):
         """
         Mix the contents of the specified wells using an appropriate pipette based on the volume.
@@ -1974,29 +2905,90 @@ class LiquidHandler:
         TODO:
         - Could this be done with transfer, using the mix after, but zero aspiration for same source and destination?
         """
-        logging.debug(
-            f"Mixing {len(wells)} wells with {repetitions} repetitions at {volume}µL each"
+        logger.debug(
+            "Mixing %s wells with %s repetitions at %sµL each", len(wells), repetitions, volume
         )
 
-        fresh_tip = False
+        self._load_pending_tips()
+        self._check_tips(
+            lambda: self._record_steps(
+                lambda recorder: self._run_mix(
+                    wells,
+                    repetitions,
+                    volume,
+                    new_tip,
+                    trash_tip,
+                    recorder.p300_multi,
+                    recorder.p20,
+                    recorder.set_nozzle_layout,
+                )
+            )
+        )
+        p300_multi, p20 = self._traced_pipettes()
+        self._run_mix(
+            wells,
+            repetitions,
+            volume,
+            new_tip,
+            trash_tip,
+            p300_multi,
+            p20,
+            self._set_nozzle_layout,
+            self._command_trace,
+        )
+
+    def _run_mix(
+        self,
+        wells,
+        repetitions,
+        volume,
+        new_tip,
+        trash_tip,
+        p300_multi,
+        p20,
+        set_nozzle_layout,
+        trace=None,
+    ):
+        """
+        Mix the wells with the given pipettes, which are either the pipettes of the robot or stand-ins that
+        record the commands. See mix.
+        """
+        # Each mix is [index of the well, well, number of wells mixed, channels of the p300_multi
+        # or None for the p20]
+        mixes = []
         i = 0
         while i < len(wells):
             well = wells[i]
             column_wells = well.parent.columns_by_name()[well.well_name[1:]]
             all_wells_in_column = all(w in wells for w in column_wells)
+            if volume > p20.max_volume:
+                channels = 8 if all_wells_in_column else 1
+            else:
+                channels = None
+            mixes.append((i, well, len(column_wells) if all_wells_in_column else 1, channels))
+            if all_wells_in_column:
+                i += len(column_wells)  # Skip the remaining wells in the column
+            else:
+                i += 1
+
+        # The wells of the current nozzle layout of the p300_multi are mixed first, so that the
+        # layout changes at most once
+        current_channels = p300_multi.active_channels
+        mixes.sort(key=lambda mix: mix[3] is not None and mix[3] != current_channels)
 
-            if all_wells_in_column and volume > self.p20.max_volume:
-                pipette = self.p300_multi
-                self._set_single_tip_mode(False)
-            elif volume > self.p20.max_volume:
-                pipette = self.p300_multi
-                self._set_single_tip_mode(True)
+        fresh_tip = False
+        for position, (i, well, mixed, channels) in enumerate(mixes):
+            if channels is None:
+                pipette = p20
             else:
-                pipette = self.p20
+                pipette = p300_multi
+                set_nozzle_layout(channels)
+            if trace is not None:
+                trace.set_operations([(well, well, range(i, i + mixed))])
 
             if not pipette.has_tip:
                 pipette.pick_up_tip()
-            elif not fresh_tip and new_tip == "always" or (i == 0 and new_tip == "once"):
+            elif not fresh_tip and new_tip == "always" or (position == 0 and new_tip == "once"):
                 if pipette.has_tip:
                     if trash_tip:
                         pipette.drop_tip()
@@ -2007,20 +2999,17 @@ class LiquidHandler:
             pipette.mix(repetitions=repetitions, volume=volume, location=well)
             fresh_tip = False
 
-            if all_wells_in_column:
-                i += len(column_wells)  # Skip the remaining wells in the column
-            else:
-                i += 1
-
         if new_tip in ["once", "always"] and pipette.has_tip:
             if trash_tip:
                 pipette.drop_tip()
             else:
                 pipette.return_tip()
+        self._restore_nozzle_layout(set_nozzle_layout)
 
-        if pipette == self.p300_multi:
-            self._set_single_tip_mode(False)
+        if trace is not None:
+            trace.set_operations([])
 
+    @_runs_batch_first
     def engage_magnets(self, height=5.4, **kwargs):
         """
         Engage the magnets of the magnetic module.
@@ -2031,6 +3020,7 @@ class LiquidHandler:
             raise Exception("No magnetic module has been loaded on the deck.")
         self.magnetic_module.engage(height_from_base=height, **kwargs)
 
+    @_runs_batch_first
     def disengage_magnets(self):
         """
         Disengage the magnets of the magnetic module.
@@ -0,0 +1,95 @@
+"""
+Opt-in logging pipeline of the ot_handler loggers.
+
+The library installs no handlers of its own. configure_logging attaches a QueueHandler to the
+ot_handler logger, and a QueueListener thread formats the records and writes them to a rotating
+log file. Logging from the pipetting loops only puts the record on the queue; the messages are
+formatted lazily from their %-style arguments, and the file is written, in the listener thread.
+"""
+
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FILE = "ot_handler.log"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+_queue_handler = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The queue does not leave the process, so the records are passed on unformatted instead of
+    # formatting the message in the logging thread
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def configure_logging(
+    filename=LOG_FILE,
+    level=logging.DEBUG,
+    max_bytes=10 * 1024 * 1024,
+    backup_count=5,
+    handlers=None,
+):
+    """
+    Log the messages of ot_handler through a background thread to a rotating log file.
+
+    The log file is rolled over when the logging is configured, so that each run starts a new
+    file and the logs of the previous runs are kept as ot_handler.log.1, ot_handler.log.2, ...
+
+    Parameters:
+        filename (str, optional): The log file. None logs only to the given handlers.
+        level (int, optional): The level of the ot_handler logger. Defaults to DEBUG.
+        max_bytes (int, optional): Size at which the log file is rolled over.
+        backup_count (int, optional): Number of rolled over log files to keep.
+        handlers (list, optional): Additional handlers of the listener, e.g. a StreamHandler.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener. Stop it with stop_logging.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    handlers = list(handlers or [])
+    if filename:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, delay=True
+        )
+        if os.path.isfile(filename) and os.path.getsize(filename) > 0:
+            file_handler.doRollover()
+        handlers.append(file_handler)
+    formatter = logging.Formatter(LOG_FORMAT)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    logger = logging.getLogger("ot_handler")
+    logger.addHandler(_queue_handler)
+    logger.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """
+    Write the queued messages, stop the listener of configure_logging and close its handlers.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    logging.getLogger("ot_handler").removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
@@ -0,0 +1,325 @@
+"""
+Throughput metrics of a LiquidHandler.
+
+LiquidHandlerMetrics counts the tips consumed, aspirations, dispenses and microliters moved
+per pipette, the failed operations per reason and the time spent in retention waits, and
+keeps a histogram of the latency of transfer calls. Each update is passed to the registered
+hooks, and the metrics can be rendered in the Prometheus text format and served on a local
+HTTP endpoint:
+
+    lh = LiquidHandler(metrics=True)
+    MetricsServer(lh.metrics, port=9464).start()
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_PORT = 9464
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), hooks=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.hooks = hooks if hooks is not None else []
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _notify(self, value, labels):
+        for hook in self.hooks:
+            try:
+                hook(self.name, value, labels)
+            except Exception:
+                logger.exception("Metrics hook %r failed", hook)
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value per combination of label values.
+
+    Parameters:
+        name (str): Name of the metric, ending with _total.
+        documentation (str): Help text of the metric.
+        labelnames (tuple, optional): Names of the labels.
+        hooks (list, optional): Callbacks called with the name, the increment and the labels of
+            each update.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be increased.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._notify(amount, labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Parameters:
+        name (str): Name of the metric.
+        documentation (str): Help text of the metric.
+        buckets (tuple): Upper bounds of the buckets.
+        labelnames (tuple, optional): Names of the labels.
+        hooks (list, optional): Callbacks called with the name, the observed value and the labels
+            of each observation.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets, labelnames=(), hooks=None):
+        super().__init__(name, documentation, labelnames, hooks)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+        self._notify(value, labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ((), 0.0))
+        return sum(counts)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append((self.name + "_bucket", key + (("le", bound),), cumulative))
+                samples.append((self.name + "_sum", key, total))
+                samples.append((self.name + "_count", key, cumulative))
+        return samples
+
+
+class LiquidHandlerMetrics:
+    """
+    Metrics of the liquid handling of a LiquidHandler, updated from its pipette commands.
+
+    Parameters:
+        latency_buckets (tuple, optional): Upper bounds in seconds of the buckets of the transfer
+            latency histogram.
+
+    Attributes:
+        hooks (list): Callbacks called as hook(metric name, value, labels) on every update.
+    """
+
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS):
+        self.hooks = []
+        self.tips_consumed = Counter(
+            "ot_handler_tips_consumed_total", "Tips picked up.", ("pipette",), self.hooks
+        )
+        self.aspirations = Counter(
+            "ot_handler_aspirations_total", "Aspirations.", ("pipette",), self.hooks
+        )
+        self.dispenses = Counter(
+            "ot_handler_dispenses_total", "Dispenses.", ("pipette",), self.hooks
+        )
+        self.volume_dispensed = Counter(
+            "ot_handler_dispensed_microliters_total",
+            "Liquid dispensed in ul, over all channels of the pipette.",
+            ("pipette",),
+            self.hooks,
+        )
+        self.failed_operations = Counter(
+            "ot_handler_failed_operations_total",
+            "Failed transfer operations.",
+            ("reason",),
+            self.hooks,
+        )
+        self.retention_time = Counter(
+            "ot_handler_retention_seconds_total",
+            "Time spent waiting for the retention time.",
+            (),
+            self.hooks,
+        )
+        self.transfer_latency = Histogram(
+            "ot_handler_transfer_duration_seconds",
+            "Duration of transfer calls.",
+            latency_buckets,
+            (),
+            self.hooks,
+        )
+        self.metrics = [
+            self.tips_consumed,
+            self.aspirations,
+            self.dispenses,
+            self.volume_dispensed,
+            self.failed_operations,
+            self.retention_time,
+            self.transfer_latency,
+        ]
+        self._transfer_depth = 0
+
+    def add_hook(self, hook):
+        """
+        Register a callback called as hook(metric name, value, labels) on every update, e.g. to
+        forward the metrics to another monitoring system.
+        """
+        self.hooks.append(hook)
+
+    def observe(self, event):
+        """
+        Update the metrics from a TraceEvent of a pipette command.
+        """
+        if event.error is not None:
+            return
+        # The p300_multi moves a tip and the volume per channel holding a tip
+        channels = event.channels or 1
+        if event.action == "pick_up_tip":
+            self.tips_consumed.inc(channels, pipette=event.pipette)
+        elif event.action == "aspirate":
+            self.aspirations.inc(pipette=event.pipette)
+        elif event.action == "dispense":
+            self.dispenses.inc(pipette=event.pipette)
+            if event.volume:
+                self.volume_dispensed.inc(event.volume * channels, pipette=event.pipette)
+        elif event.action == "delay":
+            self.retention_time.inc(event.duration)
+
+    def record_failed_operations(self, failed_operations):
+        """
+        Count the failed operations returned by transfer by reason. Pipette errors are counted as
+        "pipette_error" without their message.
+        """
+        for operation in failed_operations:
+            self.failed_operations.inc(reason=operation[4].split(":")[0])
+
+    @contextmanager
+    def time_transfer(self):
+        """
+        Observe the duration of the transfer run within the context. Transfers nested in a
+        timed transfer, such as those of the labware groups, are not observed separately.
+        """
+        self._transfer_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._transfer_depth -= 1
+            if self._transfer_depth == 0:
+                self.transfer_latency.observe(time.perf_counter() - start)
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                labels = [
+                    (label, _format_value(value) if label == "le" else value)
+                    for label, value in labels
+                ]
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics request: " + format, *args)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    HTTP server of the metrics in the Prometheus text format on /metrics.
+
+    Parameters:
+        metrics (LiquidHandlerMetrics): The metrics.
+        host (str, optional): Address to listen on. Defaults to the local host only.
+        port (int, optional): Port to listen on. Defaults to 9464; 0 picks a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics, host="127.0.0.1", port=DEFAULT_METRICS_PORT):
+        self.metrics = metrics
+        super().__init__((host, port), _MetricsRequestHandler)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """
+        Serve the metrics in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("Serving the metrics on http://%s:%s/metrics", *self.server_address[:2])
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,237 @@
+"""
+Columnar table of liquid handling operations used for transfer planning.
+
+Each operation is a row: the wells are kept as lists of objects, while well coordinates,
+volumes, labware ids and original indexes are stored as NumPy arrays, so that volume
+splitting, labware grouping and allocation run as vectorized passes.
+
+Operations that depend on each other, such as the steps of a serial dilution, are scheduled
+in dependency stages: the operations form a directed acyclic graph in which an operation
+depends on the earlier operations that write a well it reads (read after write) or read a
+well it writes (write after read). Each operation is placed in the stage after the latest
+stage it depends on, so that the independent operations of a stage, e.g. the rows of a
+column, can be allocated together while the stages run in order.
+"""
+
+import numpy as np
+
+
+def _well_name(well):
+    # Locations without a well name (e.g. a trash bin) behave as a single A1 well
+    return getattr(well, "well_name", "A1")
+
+
+def _factorize(objects):
+    """
+    Assign an integer id to each distinct object in order of first appearance.
+
+    Returns:
+        tuple: Array of ids per object and the list of distinct objects.
+    """
+    ids = {}
+    distinct = []
+    codes = np.empty(len(objects), dtype=np.intp)
+    for i, obj in enumerate(objects):
+        code = ids.get(id(obj))
+        if code is None:
+            code = ids[id(obj)] = len(distinct)
+            distinct.append(obj)
+        codes[i] = code
+    return codes, distinct
+
+
+def _compact(codes, distinct):
+    """
+    Drop the objects that are no longer referenced by codes and renumber the codes in order of
+    first appearance.
+    """
+    if len(codes) == 0:
+        return codes, []
+    unique_codes, first_indexes = np.unique(codes, return_index=True)
+    order = unique_codes[np.argsort(first_indexes)]
+    renumbering = np.empty(len(distinct), dtype=np.intp)
+    renumbering[order] = np.arange(len(order))
+    return renumbering[codes], [distinct[code] for code in order]
+
+
+class OperationTable:
+    """
+    Liquid handling operations stored column-wise.
+
+    Attributes:
+        source_wells (list): Source well of each operation.
+        destination_wells (list): Destination well (or trash bin) of each operation.
+        source_names (list): Well name of each source well.
+        destination_names (list): Well name of each destination, "A1" for a trash bin.
+        volumes (np.ndarray): Volume of each operation.
+        source_rows, source_columns (np.ndarray): Zero-based row and column of each source well.
+        destination_rows, destination_columns (np.ndarray): Zero-based row and column of each
+            destination well.
+        source_labware_ids, destination_labware_ids (np.ndarray): Index of the labware of each
+            operation in source_labware and destination_labware.
+        source_labware, destination_labware (list): Distinct labware in order of appearance.
+        original_indexes (np.ndarray): Index of each operation in the list the table was
+            originally built from. Split operations share the index of the operation they
+            were split from.
+    """
+
+    def __init__(self, source_wells, destination_wells, volumes, original_indexes=None):
+        if not (len(source_wells) == len(destination_wells) == len(volumes)):
+            raise ValueError(
+                "The number of wells in source and destination must be equal to the number of volumes provided."
+            )
+        self.source_wells = list(source_wells)
+        self.destination_wells = list(destination_wells)
+        self.source_names = [_well_name(well) for well in self.source_wells]
+        self.destination_names = [_well_name(well) for well in self.destination_wells]
+        self.volumes = np.asarray(volumes, dtype=float).reshape(-1)
+        self.original_indexes = (
+            np.arange(len(self.volumes))
+            if original_indexes is None
+            else np.asarray(original_indexes, dtype=np.intp)
+        )
+
+        self.source_rows, self.source_columns = self._coordinates(self.source_names)
+        self.destination_rows, self.destination_columns = self._coordinates(
+            self.destination_names
+        )
+        self.source_labware_ids, self.source_labware = _factorize(
+            [well.parent for well in self.source_wells]
+        )
+        self.destination_labware_ids, self.destination_labware = _factorize(
+            [getattr(well, "parent", well) for well in self.destination_wells]
+        )
+
+    @staticmethod
+    def _coordinates(names):
+        rows = np.fromiter((ord(name[0]) - ord("A") for name in names), np.intp, len(names))
+        columns = np.fromiter((int(name[1:]) - 1 for name in names), np.intp, len(names))
+        return rows, columns
+
+    def __len__(self):
+        return len(self.volumes)
+
+    def take(self, indexes):
+        """
+        Return a new table with the operations at the given indexes.
+        """
+        indexes = np.asarray(indexes, dtype=np.intp)
+        table = object.__new__(OperationTable)
+        positions = indexes.tolist()
+        table.source_wells = [self.source_wells[i] for i in positions]
+        table.destination_wells = [self.destination_wells[i] for i in positions]
+        table.source_names = [self.source_names[i] for i in positions]
+        table.destination_names = [self.destination_names[i] for i in positions]
+        for attribute in [
+            "volumes",
+            "original_indexes",
+            "source_rows",
+            "source_columns",
+            "destination_rows",
+            "destination_columns",
+        ]:
+            setattr(table, attribute, getattr(self, attribute)[indexes])
+        table.source_labware_ids, table.source_labware = _compact(
+            self.source_labware_ids[indexes], self.source_labware
+        )
+        table.destination_labware_ids, table.destination_labware = _compact(
+            self.destination_labware_ids[indexes], self.destination_labware
+        )
+        return table
+
+    def split_volumes(self, max_volume, min_volume):
+        """
+        Split the operations exceeding max_volume into several operations.
+
+        Full max_volume operations are split off while the remainder exceeds max_volume by
+        more than min_volume. A remainder between max_volume and max_volume + min_volume is
+        split into two equal halves, so that no operation falls below min_volume. Operations
+        with a zero or negative volume are dropped.
+
+        Parameters:
+            max_volume (float): The largest volume of a single operation.
+            min_volume (float): Minimum volume of the pipette.
+
+        Returns:
+            OperationTable: A table where no operation exceeds max_volume.
+        """
+        remainder = self.volumes.copy()
+        full_operations = np.zeros(len(remainder), dtype=np.intp)
+        # Subtract repeatedly rather than dividing, so that the volumes match sequential splitting
+        mask = remainder > max_volume + min_volume
+        while mask.any():
+            full_operations += mask
+            remainder[mask] -= max_volume
+            mask = remainder > max_volume + min_volume
+        halved = remainder > max_volume
+        half_volumes = remainder / 2
+        remainder[halved] = 0
+
+        counts = full_operations + 2 * halved + (remainder > 0)
+        indexes = np.repeat(np.arange(len(counts)), counts)
+        table = self.take(indexes)
+
+        # Position of each new operation among the operations split from the same operation
+        starts = np.cumsum(counts) - counts
+        position = np.arange(len(indexes)) - np.repeat(starts, counts)
+        full_operations = full_operations[indexes]
+        table.volumes = np.where(
+            position < full_operations,
+            max_volume,
+            np.where(
+                position < full_operations + 2 * halved[indexes],
+                half_volumes[indexes],
+                remainder[indexes],
+            ),
+        )
+        return table
+
+    def dependency_stages(self):
+        """
+        Schedule the operations in stages by their read and write dependencies on the wells.
+
+        An operation is placed in the first stage after the stages of the earlier operations that
+        write its source well or read its destination well. Operations adding to the same
+        destination well do not depend on each other. No well is read in a stage in which it is
+        written by another operation, but an operation with the same source and destination well
+        reads and writes it within its stage.
+
+        Returns:
+            list: Index arrays of the operations of each stage in the order the stages run,
+            keeping the order of the operations within a stage.
+        """
+        read_stages = {}
+        write_stages = {}
+        stages = np.zeros(len(self), dtype=np.intp)
+        for i, (source, destination) in enumerate(zip(self.source_wells, self.destination_wells)):
+            source_key = (id(source.parent), self.source_names[i])
+            destination_key = (
+                id(getattr(destination, "parent", destination)),
+                self.destination_names[i],
+            )
+            stage = max(
+                write_stages.get(source_key, -1) + 1, read_stages.get(destination_key, -1) + 1
+            )
+            stages[i] = stage
+            read_stages[source_key] = max(read_stages.get(source_key, 0), stage)
+            write_stages[destination_key] = max(write_stages.get(destination_key, 0), stage)
+        if len(stages) == 0:
+            return []
+        # Every stage but the first holds an operation depending on the previous stage
+        order = np.argsort(stages, kind="stable")
+        return np.split(order, np.cumsum(np.bincount(stages))[:-1])
+
+    def labware_groups(self):
+        """
+        Group the operations by source and destination labware.
+
+        Returns:
+            list: Index arrays of the operations sharing a source and destination labware, ordered
+            by the first appearance of the source labware and then the destination labware.
+        """
+        keys = self.source_labware_ids * len(self.destination_labware) + (
+            self.destination_labware_ids
+        )
+        order = np.argsort(keys, kind="stable")
+        unique_keys, counts = np.unique(keys[order], return_counts=True)
+        return np.split(order, np.cumsum(counts)[:-1]) if len(unique_keys) else []
@@ -0,0 +1,112 @@
+"""
+Packing of liquid handling operations into volleys, i.e. the operations served by a single
+aspiration or a single dispense.
+
+Volumes are packed into bins of the available tip capacity. The greedy strategy fills the
+volleys in the given order, while the optimal strategy minimizes the number of volleys: small
+sets are solved exactly and larger sets with first-fit-decreasing.
+"""
+
+VOLLEY_PACKING_STRATEGIES = ["greedy", "optimal"]
+EXACT_PACKING_LIMIT = 12
+
+
+def pack_volumes(volumes, capacity, strategy="greedy"):
+    """
+    Pack volumes into as few volleys as the strategy allows.
+
+    Parameters:
+        volumes (list of float): Volumes to pack. Each volume must fit the capacity.
+        capacity (float): The largest total volume of a volley.
+        strategy (str, optional): "greedy" fills the volleys in the given order, starting a new
+            volley when the next volume does not fit. "optimal" minimizes the number of volleys.
+
+    Returns:
+        list: Volleys as lists of indexes into volumes. The indexes of each volley are in
+        ascending order and the volleys are ordered by their first index.
+    """
+    if strategy not in VOLLEY_PACKING_STRATEGIES:
+        raise ValueError(f"Got an invalid value for the volley packing strategy: {strategy}")
+    if any(volume > capacity for volume in volumes):
+        raise ValueError("Volumes exceeding the capacity cannot be packed.")
+    if not volumes:
+        return []
+
+    volleys = _pack_next_fit(volumes, capacity)
+    if strategy == "optimal" and len(volleys) > 1:
+        candidates = [_pack_first_fit_decreasing(volumes, capacity)]
+        if len(volumes) <= EXACT_PACKING_LIMIT:
+            candidates.append(_pack_exact(volumes, capacity))
+        for candidate in candidates:
+            if len(candidate) < len(volleys):
+                volleys = candidate
+    return sorted(sorted(volley) for volley in volleys)
+
+
+def _pack_next_fit(volumes, capacity):
+    volleys = []
+    current_volley = []
+    volley_volume = 0
+    for i, volume in enumerate(volumes):
+        if current_volley and volley_volume + volume > capacity:
+            volleys.append(current_volley)
+            current_volley = []
+            volley_volume = 0
+        current_volley.append(i)
+        volley_volume += volume
+    volleys.append(current_volley)
+    return volleys
+
+
+def _pack_first_fit_decreasing(volumes, capacity):
+    volleys = []
+    volley_volumes = []
+    for i in sorted(range(len(volumes)), key=lambda i: -volumes[i]):
+        for j, volley_volume in enumerate(volley_volumes):
+            if volley_volume + volumes[i] <= capacity:
+                volleys[j].append(i)
+                volley_volumes[j] += volumes[i]
+                break
+        else:
+            volleys.append([i])
+            volley_volumes.append(volumes[i])
+    return volleys
+
+
+def _pack_exact(volumes, capacity):
+    """
+    Minimize the number of volleys with dynamic programming over subsets of the volumes.
+
+    The state of a subset is the number of volleys needed to pack it and the smallest volume of
+    the last, still open volley. Runs in O(2^n * n) time.
+    """
+    n = len(volumes)
+    states = [None] * (1 << n)
+    parents = [None] * (1 << n)
+    states[0] = (1, 0)
+    for subset in range(1 << n):
+        if states[subset] is None:
+            continue
+        volley_count, open_volume = states[subset]
+        for i in range(n):
+            if subset & (1 << i):
+                continue
+            if open_volume + volumes[i] <= capacity:
+                state = (volley_count, open_volume + volumes[i])
+            else:
+                state = (volley_count + 1, volumes[i])
+            next_subset = subset | (1 << i)
+            if states[next_subset] is None or state < states[next_subset]:
+                states[next_subset] = state
+                parents[next_subset] = (subset, i)
+
+    # Walk back from the full set; a new volley starts where the volley count drops
+    volleys = [[]]
+    subset = (1 << n) - 1
+    while subset:
+        previous_subset, i = parents[subset]
+        volleys[-1].append(i)
+        if states[previous_subset][0] < states[subset][0]:
+            volleys.append([])
+        subset = previous_subset
+    return [volley for volley in volleys if volley]
@@ -0,0 +1,168 @@
+"""
+Ordering of liquid handling operations to shorten the travel of the gantry.
+
+Wells are placed by the XY coordinates of their top, taken from the labware geometry. The
+operations of a volley (a single aspiration with several dispenses, or several aspirations
+with a single dispense) are ordered into a short open path with nearest-neighbour
+construction and 2-opt improvement, and the volleys are chained across the deck by nearest
+neighbour.
+"""
+
+import math
+
+TWO_OPT_LIMIT = 100
+
+
+def well_point(location):
+    """
+    Return the XY coordinates of the top of a well, or None for locations without a well
+    geometry, such as a trash bin.
+    """
+    try:
+        point = location.top().point
+    except AttributeError:
+        return None
+    return (point.x, point.y)
+
+
+def _distance(a, b):
+    # Unknown locations do not contribute to the travel
+    if a is None or b is None:
+        return 0.0
+    return math.dist(a, b)
+
+
+def path_length(points):
+    """
+    Return the length of the path through the points in the given order.
+    """
+    return sum(_distance(a, b) for a, b in zip(points, points[1:]))
+
+
+def order_points(points, start=None):
+    """
+    Order points into a short open path.
+
+    Parameters:
+        points (list): XY coordinates to visit.
+        start (tuple, optional): Coordinates where the path starts. If None, the path starts
+            from the first point.
+
+    Returns:
+        list: Indexes of the points in the order of visit.
+    """
+    remaining = list(range(len(points)))
+    order = []
+    current = start
+    while remaining:
+        if current is None:
+            i = remaining[0]
+        else:
+            i = min(remaining, key=lambda i: _distance(current, points[i]))
+        remaining.remove(i)
+        order.append(i)
+        current = points[i]
+
+    if len(order) > TWO_OPT_LIMIT:
+        return order
+    # Reverse segments of the path as long as that shortens it
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(order) - 1):
+            before_segment = start if i == 0 else points[order[i - 1]]
+            for j in range(i + 1, len(order)):
+                after_segment = points[order[j + 1]] if j + 1 < len(order) else None
+                change = (
+                    _distance(before_segment, points[order[j]])
+                    + _distance(points[order[i]], after_segment)
+                    - _distance(before_segment, points[order[i]])
+                    - _distance(points[order[j]], after_segment)
+                )
+                if change < -1e-9:
+                    order[i : j + 1] = order[i : j + 1][::-1]
+                    improved = True
+    return order
+
+
+def order_operation_sets(operation_sets, pivot_index, pivot_first, point_of):
+    """
+    Order the operations within each set, and the sets, to shorten the travel of the gantry.
+
+    Parameters:
+        operation_sets (list): Sets of operations in the format [source, destination, volume,
+            index]. The operations of a set share the well at pivot_index.
+        pivot_index (int): 0 if the operations of a set share the source well, or 1 if they
+            share the destination well.
+        pivot_first (bool): True if the shared well is visited before the other wells of the
+            set, False if it is visited after them.
+        point_of (callable): Returns the XY coordinates of a well, or None if unknown.
+
+    Returns:
+        tuple: The ordered sets, and the estimated travel in the given and in the new order.
+    """
+    target_index = 1 - pivot_index
+
+    def set_path(operation_set):
+        pivot = [point_of(operation_set[0][pivot_index])]
+        targets = [point_of(op[target_index]) for op in operation_set]
+        return pivot + targets if pivot_first else targets + pivot
+
+    default_length = path_length([point for s in operation_sets for point in set_path(s)])
+
+    ordered_sets = []
+    for operation_set in operation_sets:
+        pivot = point_of(operation_set[0][pivot_index])
+        order = order_points([point_of(op[target_index]) for op in operation_set], pivot)
+        if not pivot_first:
+            # The path ends at the shared well
+            order.reverse()
+        ordered_sets.append([operation_set[i] for i in order])
+
+    # Chain the sets by nearest neighbour, starting from the first set
+    paths = [set_path(s) for s in ordered_sets]
+    remaining = list(range(len(ordered_sets)))
+    order = []
+    while remaining:
+        if order:
+            end = paths[order[-1]][-1]
+            i = min(remaining, key=lambda i: _distance(end, paths[i][0]))
+        else:
+            i = remaining[0]
+        remaining.remove(i)
+        order.append(i)
+    ordered_sets = [ordered_sets[i] for i in order]
+
+    optimized_length = path_length([point for s in ordered_sets for point in set_path(s)])
+    if optimized_length > default_length:
+        return operation_sets, default_length, default_length
+    return ordered_sets, default_length, optimized_length
+
+
+class TravelReport:
+    """
+    Estimated gantry travel of the liquid handling operations, in millimeters, in the default
+    order and in the optimized order.
+    """
+
+    def __init__(self):
+        self.default_distance = 0.0
+        self.optimized_distance = 0.0
+
+    @property
+    def saved_distance(self):
+        return self.default_distance - self.optimized_distance
+
+    def add(self, default_distance, optimized_distance):
+        self.default_distance += default_distance
+        self.optimized_distance += optimized_distance
+
+    def merge(self, report):
+        self.add(report.default_distance, report.optimized_distance)
+
+    def __repr__(self):
+        return (
+            f"TravelReport(default_distance={self.default_distance:.1f}, "
+            f"optimized_distance={self.optimized_distance:.1f}, "
+            f"saved_distance={self.saved_distance:.1f})"
+        )
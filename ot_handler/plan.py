@@ -0,0 +1,441 @@
+"""
+Transfer plans.
+
+A TransferPlan holds the outcome of planning a transfer: the operations split to the pipette
+capacity, allocated to the pipette configurations, grouped into volleys and ordered. Plans
+are immutable, so that a plan can be computed once and executed, inspected or serialized
+any number of times.
+"""
+
+from dataclasses import dataclass, field, replace
+
+from .path import TravelReport
+
+VOLLEY_KINDS = ["multi_dispense", "multi_aspirate", "single"]
+PLAN_FORMAT_VERSION = 2
+PLAN_PARAMETERS = [
+    "new_tip",
+    "touch_tip",
+    "blow_out_to",
+    "trash_tips",
+    "add_air_gap",
+    "overhead_liquid",
+    "mix_after",
+    "retention_time",
+    "tip_reuse_limit",
+    "volley_packing",
+    "optimize_path",
+    "partial_columns",
+]
+
+# Channels of the pipette picking up tips in each pipette configuration
+CONFIGURATION_CHANNELS = {
+    "p300_multi": 8,
+    "p300_partial4": 4,
+    "p300_partial2": 2,
+    "p300_multisingle": 1,
+    "p20": 1,
+}
+
+
+def location_key(location):
+    """
+    Return a JSON serializable reference to a location: [deck slot, well name] for a well,
+    "trash" for a location without wells such as a trash bin, or None for no location.
+    """
+    if location is None:
+        return None
+    if not hasattr(location, "well_name"):
+        return "trash"
+    slot = location.parent.parent
+    # Labware on a module or an adapter is referenced by the slot of the module
+    while not isinstance(slot, str):
+        slot = slot.parent
+    return [slot, location.well_name]
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """
+    A single pipette command of a plan.
+
+    Attributes:
+        action (str): The command, e.g. "pick_up_tip", "aspirate", "dispense", "blow_out" or
+            "drop_tip". Changes of the nozzle layout are recorded as "configure_nozzles".
+        pipette (str): "p300_multi" or "p20".
+        single_channel (bool): Whether the pipette is used in single channel mode.
+        location: The well (or trash bin) of the command, if any.
+        volume (float): The volume of the command, if any.
+        duration (float): The duration of a delay in seconds.
+        repetitions (int): The number of repetitions of a mix.
+        channels (int): The number of channels of the pipette holding tips: 8 for the
+            p300_multi with all nozzles, 4 or 2 with a partial column, 1 in single channel mode.
+            Derived from single_channel if not given.
+    """
+
+    action: str
+    pipette: str
+    single_channel: bool
+    location: object = None
+    volume: float = None
+    duration: float = None
+    repetitions: int = None
+    channels: int = None
+
+    def __post_init__(self):
+        if self.channels is None and self.pipette is not None:
+            object.__setattr__(self, "channels", 1 if self.single_channel else 8)
+
+
+@dataclass(frozen=True)
+class Volley:
+    """
+    Operations handled with one tip fill.
+
+    Attributes:
+        kind (str): "multi_dispense" for a single aspiration followed by several dispenses,
+            "multi_aspirate" for several aspirations followed by a single dispense, or
+            "single" for a single aspiration and dispense.
+        operations (tuple): Operations in the format (source, destination, volume, index),
+            in the order they are pipetted.
+    """
+
+    kind: str
+    operations: tuple
+
+
+@dataclass(frozen=True)
+class PipettePlan:
+    """
+    Volleys of a pipette configuration, in the order they are executed.
+
+    Attributes:
+        name (str): "p300_multi", "p300_partial4" and "p300_partial2" (p300 with a partial
+            column of 4 or 2 nozzles), "p300_multisingle" (p300 in single channel mode) or "p20".
+        indexes (tuple): Indexes of all operations allocated to the configuration.
+        volleys (tuple): The volleys of the configuration.
+    """
+
+    name: str
+    indexes: tuple
+    volleys: tuple
+
+    @property
+    def single_tip_mode(self):
+        return self.name == "p300_multisingle"
+
+    @property
+    def channels(self):
+        return CONFIGURATION_CHANNELS[self.name]
+
+
+@dataclass(frozen=True)
+class TransferPlan:
+    """
+    Planned liquid handling of a transfer, created by LiquidHandler.plan_transfer and run by
+    LiquidHandler.execute.
+
+    The operation indexes of the plan refer to the operations after splitting the volumes;
+    original_indexes maps them back to the lists passed to plan_transfer. A transfer between
+    several labware is planned as one sub-plan per pair of source and destination labware,
+    stored in groups together with the indexes of their operations.
+
+    Attributes:
+        source_wells, destination_wells, volumes (tuple): The split operations.
+        original_indexes (tuple): Index of each split operation in the planned lists.
+        multichannel_members (tuple): Pairs of a multichannel operation index and the indexes
+            of the eight operations it covers.
+        failed_operations (tuple): Pairs of an operation index and the reason it could not be
+            planned, such as "volume_too_low".
+        pipette_plans (tuple): PipettePlan of each pipette configuration.
+        groups (tuple): Pairs of operation indexes and the TransferPlan of a labware pair.
+        steps (tuple): PlanStep of every pipette command, assuming the pipette state at
+            planning time and that all commands succeed.
+        travel_distances (tuple): Estimated gantry travel in the default and the planned
+            order, in millimeters.
+        Remaining attributes are the parameters of the transfer.
+    """
+
+    source_wells: tuple
+    destination_wells: tuple
+    volumes: tuple
+    original_indexes: tuple
+    new_tip: str = "once"
+    touch_tip: bool = False
+    blow_out_to: str = "trash"
+    trash_tips: bool = True
+    add_air_gap: bool = True
+    overhead_liquid: bool = True
+    mix_after: object = False
+    retention_time: float = 0.0
+    tip_reuse_limit: int = None
+    volley_packing: str = "greedy"
+    optimize_path: bool = False
+    partial_columns: bool = False
+    pipette_kwargs: tuple = ()
+    multichannel_members: tuple = ()
+    failed_operations: tuple = ()
+    pipette_plans: tuple = ()
+    groups: tuple = ()
+    steps: tuple = ()
+    travel_distances: tuple = field(default=(0.0, 0.0))
+
+    @property
+    def travel_report(self):
+        report = TravelReport()
+        report.add(*self.travel_distances)
+        return report
+
+    def with_steps(self, steps):
+        """
+        Return a copy of the plan with the given steps.
+        """
+        return replace(self, steps=tuple(steps))
+
+    def __len__(self):
+        return len(self.volumes)
+
+    def to_dict(self):
+        """
+        Return the plan as a JSON serializable dictionary. Wells are referenced by deck slot and
+        well name, so the plan can be loaded for the same deck layout with from_dict.
+        """
+        return {
+            "version": PLAN_FORMAT_VERSION,
+            "source_wells": [location_key(well) for well in self.source_wells],
+            "destination_wells": [location_key(well) for well in self.destination_wells],
+            "volumes": list(self.volumes),
+            "original_indexes": list(self.original_indexes),
+            "parameters": {name: getattr(self, name) for name in PLAN_PARAMETERS},
+            "pipette_kwargs": dict(self.pipette_kwargs),
+            "multichannel_members": [
+                [index, list(members)] for index, members in self.multichannel_members
+            ],
+            "failed_operations": [list(failure) for failure in self.failed_operations],
+            "pipette_plans": [
+                {
+                    "name": pipette_plan.name,
+                    "indexes": list(pipette_plan.indexes),
+                    "volleys": [
+                        [volley.kind, [[op[3], op[2]] for op in volley.operations]]
+                        for volley in pipette_plan.volleys
+                    ],
+                }
+                for pipette_plan in self.pipette_plans
+            ],
+            "groups": [[list(indexes), plan.to_dict()] for indexes, plan in self.groups],
+            "steps": [
+                [
+                    step.action,
+                    step.pipette,
+                    step.single_channel,
+                    location_key(step.location),
+                    step.volume,
+                    step.duration,
+                    step.repetitions,
+                    step.channels,
+                ]
+                for step in self.steps
+            ],
+            "travel_distances": list(self.travel_distances),
+        }
+
+    @classmethod
+    def from_dict(cls, data, resolve_location):
+        """
+        Load a plan serialized with to_dict.
+
+        Parameters:
+            data (dict): The serialized plan.
+            resolve_location (callable): Returns the well (or trash bin) of a location key.
+
+        Returns:
+            TransferPlan: The loaded plan.
+        """
+        if data.get("version") != PLAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported transfer plan version: {data.get('version')}")
+        resolved = {}
+
+        def resolve(key):
+            if key is None:
+                return None
+            hashable_key = tuple(key) if isinstance(key, list) else key
+            if hashable_key not in resolved:
+                resolved[hashable_key] = resolve_location(key)
+            return resolved[hashable_key]
+
+        source_wells = tuple(resolve(key) for key in data["source_wells"])
+        destination_wells = tuple(resolve(key) for key in data["destination_wells"])
+        return cls(
+            source_wells=source_wells,
+            destination_wells=destination_wells,
+            volumes=tuple(data["volumes"]),
+            original_indexes=tuple(data["original_indexes"]),
+            pipette_kwargs=tuple(data["pipette_kwargs"].items()),
+            multichannel_members=tuple(
+                (index, tuple(members)) for index, members in data["multichannel_members"]
+            ),
+            failed_operations=tuple(tuple(failure) for failure in data["failed_operations"]),
+            pipette_plans=tuple(
+                PipettePlan(
+                    name=pipette_plan["name"],
+                    indexes=tuple(pipette_plan["indexes"]),
+                    volleys=tuple(
+                        Volley(
+                            kind,
+                            tuple(
+                                (source_wells[index], destination_wells[index], volume, index)
+                                for index, volume in operations
+                            ),
+                        )
+                        for kind, operations in pipette_plan["volleys"]
+                    ),
+                )
+                for pipette_plan in data["pipette_plans"]
+            ),
+            groups=tuple(
+                (tuple(indexes), cls.from_dict(plan, resolve_location))
+                for indexes, plan in data["groups"]
+            ),
+            steps=tuple(
+                PlanStep(action, pipette, single_channel, resolve(key), *values)
+                for action, pipette, single_channel, key, *values in data["steps"]
+            ),
+            travel_distances=tuple(data["travel_distances"]),
+            **{
+                name: tuple(value) if isinstance(value, list) else value
+                for name, value in data["parameters"].items()
+            },
+        )
+
+
+class StepRecorder:
+    """
+    Stand-in for the pipettes of a LiquidHandler that records the commands of a plan instead
+    of executing them.
+
+    The tips and the volume in the tips are modeled starting from the state of the pipettes
+    at the time of recording.
+
+    Parameters:
+        p300_multi: The p300 multichannel pipette.
+        p20: The p20 single channel pipette.
+        single_tip_mode (bool): Whether the p300 multichannel pipette is in single tip mode.
+        channels (int, optional): The channels of the current nozzle layout of the p300
+            multichannel pipette, overriding single_tip_mode.
+    """
+
+    def __init__(self, p300_multi, p20, single_tip_mode=False, channels=None):
+        self.steps = []
+        self.channels = channels if channels is not None else (1 if single_tip_mode else 8)
+        self.p300_multi = _RecordingPipette(self, "p300_multi", p300_multi)
+        self.p20 = _RecordingPipette(self, "p20", p20)
+
+    @property
+    def single_tip_mode(self):
+        return self.channels == 1
+
+    def record(
+        self, action, pipette, location=None, volume=None, duration=None, repetitions=None
+    ):
+        channels = {"p300_multi": self.channels, "p20": 1}.get(pipette)
+        self.steps.append(
+            PlanStep(
+                action,
+                pipette,
+                channels == 1,
+                location,
+                volume,
+                duration,
+                repetitions,
+                channels,
+            )
+        )
+
+    def set_nozzle_layout(self, channels):
+        if channels != self.channels:
+            if self.p300_multi.has_tip:
+                self.p300_multi.drop_tip()
+            self.channels = channels
+            self.record("configure_nozzles", "p300_multi")
+        return self.channels
+
+    def set_single_tip_mode(self, state):
+        return self.set_nozzle_layout(1 if state else 8) == 1
+
+    def wait(self, duration):
+        if duration:
+            self.record("delay", None, duration=duration)
+
+
+def _location_well(location):
+    # Locations relative to a well, such as well.top(), are recorded as the well
+    labware = getattr(location, "labware", None)
+    if labware is not None and getattr(labware, "is_well", False):
+        return labware.as_well()
+    return location
+
+
+class _RecordingPipette:
+    def __init__(self, recorder, name, pipette):
+        self.recorder = recorder
+        self.name = name
+        self.min_volume = pipette.min_volume
+        self.max_volume = pipette.max_volume
+        self.has_tip = bool(pipette.has_tip)
+        current_volume = pipette.current_volume
+        self.current_volume = (
+            current_volume if isinstance(current_volume, (int, float)) else 0
+        )
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def active_channels(self):
+        return self.recorder.channels if self.name == "p300_multi" else 1
+
+    def _record(self, action, location=None, volume=None, repetitions=None):
+        self.recorder.record(
+            action, self.name, _location_well(location), volume, repetitions=repetitions
+        )
+
+    def pick_up_tip(self):
+        self.has_tip = True
+        self.current_volume = 0
+        self._record("pick_up_tip")
+
+    def drop_tip(self):
+        self.has_tip = False
+        self.current_volume = 0
+        self._record("drop_tip")
+
+    def return_tip(self):
+        self.has_tip = False
+        self.current_volume = 0
+        self._record("return_tip")
+
+    def move_to(self, location):
+        self._record("move_to", location)
+
+    def air_gap(self, volume):
+        self.current_volume += volume
+        self._record("air_gap", volume=volume)
+
+    def aspirate(self, volume, location, **kwargs):
+        self.current_volume += volume
+        self._record("aspirate", location, volume)
+
+    def dispense(self, volume, location, **kwargs):
+        self.current_volume = max(0, self.current_volume - volume)
+        self._record("dispense", location, volume)
+
+    def blow_out(self, location):
+        self.current_volume = 0
+        self._record("blow_out", location)
+
+    def touch_tip(self, **kwargs):
+        self._record("touch_tip")
+
+    def mix(self, repetitions, volume, location):
+        self._record("mix", location, volume, repetitions)
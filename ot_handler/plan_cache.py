@@ -0,0 +1,136 @@
+"""
+On-disk cache of transfer plans.
+
+Plans are stored as JSON files named by a hash of everything that determines the plan: the
+operations, the transfer parameters, the pipettes, the tip racks and the deck layout. A
+cached plan can therefore be loaded instead of planning the same transfer again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+PLAN_CACHE_SUFFIX = ".plan.json"
+
+
+class PlanCache:
+    """
+    Content-addressed cache of serialized transfer plans with least recently used eviction.
+
+    Reading an entry refreshes its modification time, and the least recently used entries are
+    evicted whenever the cache holds more than max_entries entries or max_bytes bytes.
+
+    Parameters:
+        directory (str): Directory of the cache entries. Created if it does not exist.
+        max_entries (int, optional): Maximum number of cached plans.
+        max_bytes (int, optional): Maximum total size of the cached plans in bytes.
+    """
+
+    def __init__(self, directory, max_entries=256, max_bytes=64 * 1024 * 1024):
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("The plan cache must allow at least one entry and one byte.")
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """
+        Return the cache key of the given JSON serializable parts. Values that cannot be
+        serialized are represented by their repr.
+        """
+        content = json.dumps(parts, sort_keys=True, default=repr, separators=(",", ":"))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + PLAN_CACHE_SUFFIX)
+
+    def get(self, key):
+        """
+        Return the cached plan data of the key, or None if the plan is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable plan cache entry %s: %s", path, e)
+            self._remove(path)
+            return None
+        self._touch(path)
+        return data
+
+    def put(self, key, data):
+        """
+        Store plan data under the key and evict the least recently used entries if the cache
+        exceeds its size.
+        """
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            # Replacing is atomic, so readers never see a partially written entry
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            self._remove(temporary_path)
+            raise
+        self._touch(self._path(key))
+        self._evict()
+
+    def clear(self):
+        """
+        Remove all cached plans.
+        """
+        for path, _, _ in self._entries():
+            self._remove(path)
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key):
+        return os.path.isfile(self._path(key))
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(PLAN_CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # Least recently used first
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_bytes = sum(size for _, _, size in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            path, _, size = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    def _touch(path):
+        now = time.time_ns()
+        try:
+            os.utime(path, ns=(now, now))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,101 @@
+"""
+Robot state persisted between LiquidHandler sessions.
+
+A warm-started LiquidHandler skips homing when the previous session ended cleanly and left the
+robot homed with no tips attached. Trust in the position of the robot is lost when the
+previous session did not end cleanly, e.g. after a crash, when the robot has been restarted
+since, or when the state is older than a maximum age. A session on the robot never trusts the
+position stored by a simulated session, which has not moved the robot.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = "ot_handler_state.json"
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+
+def boot_id():
+    """
+    Return the identifier of the current boot of the system, or None if it is not available.
+    """
+    try:
+        with open(BOOT_ID_FILE) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class RobotState:
+    """
+    State of the robot stored in a JSON file.
+
+    Parameters:
+        path (str, optional): The state file. Defaults to ot_handler_state.json in the working
+            directory.
+        max_age (float, optional): Time in seconds after which the position of the robot is no
+            longer trusted. Defaults to None (no limit).
+        simulation (bool, optional): Whether the state belongs to a simulated session. The
+            position is only trusted if it was stored by a session of the same kind, and saved
+            with the simulation field.
+    """
+
+    def __init__(self, path=None, max_age=None, simulation=False):
+        self.path = path or DEFAULT_STATE_FILE
+        self.max_age = max_age
+        self.simulation = simulation
+
+    def load(self):
+        """
+        Return the stored state, or an empty dictionary if there is no readable state.
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable robot state %s: %s", self.path, e)
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def position_trusted(self):
+        """
+        Return whether the robot can be used without homing.
+        """
+        state = self.load()
+        if not state.get("position_trusted"):
+            return False
+        if state.get("simulation", False) != self.simulation:
+            logger.info("The stored robot state was not written by a session of the same kind")
+            return False
+        current_boot_id = boot_id()
+        if current_boot_id is not None and state.get("boot_id") != current_boot_id:
+            logger.info("The robot has been restarted since the last session")
+            return False
+        if self.max_age is not None and time.time() - state.get("updated", 0) > self.max_age:
+            logger.info("The stored robot state is too old to be trusted")
+            return False
+        return True
+
+    def save(self, **fields):
+        """
+        Update the stored state with the given fields.
+        """
+        state = self.load()
+        state.update(fields, updated=time.time(), boot_id=boot_id())
+        directory = os.path.dirname(os.path.abspath(self.path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w") as f:
+                json.dump(state, f, indent=4)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
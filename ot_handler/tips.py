@@ -0,0 +1,289 @@
+"""
+Tip accounting of planned liquid handling.
+
+The tips a run needs are counted from its planned pipette commands per tip kind, and
+compared with the tips left in the tip racks of that kind before the run starts:
+
+- "p300_multi": columns of eight tips picked up by the p300_multi with all nozzles, from the
+  racks in p300_tips. The tips of partial columns, which come from the same racks, are counted
+  as the columns they fill.
+- "p300_single": single tips picked up by the p300_multi in single tip mode, from the racks in
+  single_p300_tips.
+- "p20": single tips picked up by the p20, from the racks in single_p20_tips.
+
+TipOccupancy keeps the tips used from each tip rack in the robot state file, so that a later
+session continues with the tips the previous sessions left in the racks.
+"""
+
+import logging
+import math
+from dataclasses import dataclass, field
+
+from .plan import location_key
+
+logger = logging.getLogger(__name__)
+
+TIP_KINDS = ("p300_multi", "p300_single", "p20")
+
+
+class InsufficientTipsError(ValueError):
+    """
+    Raised before a run when the tip racks do not hold the tips the run needs.
+
+    Attributes:
+        budget (TipBudget): The tips needed and available.
+    """
+
+    def __init__(self, budget):
+        super().__init__(f"Not enough tips for the run: {budget.describe()}")
+        self.budget = budget
+
+
+def tip_kind(step):
+    """
+    Return the tip kind of a pick_up_tip PlanStep.
+    """
+    if step.pipette == "p20":
+        return "p20"
+    return "p300_single" if step.single_channel else "p300_multi"
+
+
+def count_required_tips(steps):
+    """
+    Count the tip pick-ups of the given plan steps per tip kind.
+    """
+    required = dict.fromkeys(TIP_KINDS, 0)
+    partial_column_tips = 0
+    for step in steps:
+        if step.action != "pick_up_tip":
+            continue
+        if step.pipette == "p300_multi" and 1 < step.channels < 8:
+            partial_column_tips += step.channels
+        else:
+            required[tip_kind(step)] += 1
+    required["p300_multi"] += math.ceil(partial_column_tips / 8)
+    return required
+
+
+def count_tips(racks, full_columns=False, assume_full=False, has_tip=None):
+    """
+    Count the tips in the tip racks.
+
+    Parameters:
+        racks (list): The tip racks.
+        full_columns (bool, optional): Count the columns of eight tips instead of single tips.
+        assume_full (bool, optional): Count the tips of full racks instead of the tips left.
+        has_tip (callable, optional): Tells whether a well holds a tip. Defaults to the tip
+            tracking of the protocol.
+    """
+    if has_tip is None:
+
+        def has_tip(well):
+            return well.has_tip
+
+    count = 0
+    for rack in racks:
+        if full_columns:
+            count += sum(
+                1
+                for column in rack.columns()
+                if len(column) == 8 and (assume_full or all(has_tip(well) for well in column))
+            )
+        else:
+            count += sum(1 for well in rack.wells() if assume_full or has_tip(well))
+    return count
+
+
+def rack_slot(rack):
+    """
+    Return the deck slot of a tip rack.
+    """
+    return location_key(rack.wells()[0])[0]
+
+
+@dataclass
+class TipBudget:
+    """
+    Tips needed by a run and tips available, per tip kind. Tips of the p300_multi with all
+    nozzles are counted as columns.
+
+    Attributes:
+        required (dict): Tips (or columns) the run picks up.
+        available (dict): Tips (or columns) left in the tip racks.
+        capacity (dict): Tips (or columns) of the tip racks when full.
+    """
+
+    required: dict
+    available: dict
+    capacity: dict = field(default_factory=dict)
+
+    @property
+    def shortfall(self):
+        """
+        The tips (or columns) missing per tip kind, for the kinds that are short.
+        """
+        return {
+            kind: self.required[kind] - self.available.get(kind, 0)
+            for kind in TIP_KINDS
+            if self.required.get(kind, 0) > self.available.get(kind, 0)
+        }
+
+    @property
+    def sufficient(self):
+        return not self.shortfall
+
+    @property
+    def refillable(self):
+        """
+        Whether refilling the tip racks of the kinds that are short covers the run.
+        """
+        return all(self.required[kind] <= self.capacity.get(kind, 0) for kind in self.shortfall)
+
+    def describe(self):
+        parts = []
+        for kind in TIP_KINDS:
+            unit = "columns" if kind == "p300_multi" else "tips"
+            parts.append(
+                f"{kind} needs {self.required.get(kind, 0)} {unit}, "
+                f"{self.available.get(kind, 0)} available of {self.capacity.get(kind, 0)}"
+            )
+        return "; ".join(parts)
+
+
+class TipOccupancy:
+    """
+    Tips used from the tip racks, stored per deck slot in the robot state file as
+    {"tips": {slot: {"load_name": ..., "used": [well names]}}}.
+
+    The protocol API tracks the tips of a session only, and cannot mark single tips as used.
+    The tips that earlier sessions used from a rack are kept here as missing, and the next tip
+    is chosen among the tips left when a rack of the pipette has missing tips.
+
+    Parameters:
+        robot_state (RobotState): The state file.
+        out_of_tips_error (type, optional): Exception raised by next_tip when the racks hold no
+            tip for the pick-up. The LiquidHandler passes the OutOfTipsError of the protocol API,
+            so that running out of restored tips is handled like running out of tips.
+    """
+
+    def __init__(self, robot_state, out_of_tips_error=LookupError):
+        self.robot_state = robot_state
+        self.out_of_tips_error = out_of_tips_error
+        self._stored = robot_state.load().get("tips", {})
+        self._racks = {}
+        self._missing = {}
+
+    def restore(self, rack):
+        """
+        Register a loaded tip rack and restore the tips used from it, if the rack in its slot has
+        the same load name as in the state file.
+        """
+        slot = rack_slot(rack)
+        self._racks[slot] = rack
+        entry = self._stored.get(slot)
+        if not entry or entry.get("load_name") != rack.load_name:
+            self._missing[slot] = set()
+            return
+        self._missing[slot] = set(entry.get("used", ()))
+        logger.info(
+            "Restored the tip rack in slot %s with %s of %s tips used",
+            slot,
+            len(self._missing[slot]),
+            len(rack.wells()),
+        )
+
+    def reset(self, rack):
+        """
+        Mark a refilled tip rack full.
+        """
+        self._missing[rack_slot(rack)] = set()
+        self.save()
+
+    def has_tip(self, well):
+        return well.has_tip and well.well_name not in self._missing.get(rack_slot(well.parent), ())
+
+    def next_tip(self, kind, racks, channels=8):
+        """
+        Return the next tip of the tip kind in the racks, or None if no rack has missing tips and
+        the protocol API can choose the tip. Raises out_of_tips_error if no tip is left.
+
+        Columns of eight tips are taken for "p300_multi". A partial column of the front nozzles
+        takes the first tips left in a column, and is located by its front-most tip. In single tip
+        mode the nozzle at the back of the p300_multi picks up the front-most tip of a column, so
+        that the other nozzles do not touch the tips left in the column.
+        """
+        if not any(self._missing.get(rack_slot(rack)) for rack in racks):
+            return None
+        for rack in racks:
+            for column in rack.columns():
+                if kind == "p300_multi":
+                    present = [self.has_tip(well) for well in column]
+                    if channels < 8 and True in present:
+                        first = present.index(True)
+                        if all(present[first : first + channels]) and first + channels <= 8:
+                            return column[first + channels - 1]
+                    elif len(column) == 8 and all(present):
+                        return column[0]
+                    continue
+                wells = reversed(column) if kind == "p300_single" else column
+                for well in wells:
+                    if self.has_tip(well):
+                        return well
+        tips = f"{channels} tips" if kind == "p300_multi" else "tip"
+        raise self.out_of_tips_error(
+            "No {} left for {} in the tip racks in slots {}".format(
+                tips, kind, ", ".join(str(rack_slot(rack)) for rack in racks)
+            )
+        )
+
+    def save(self):
+        """
+        Store the tips used from the registered racks, keeping the entries of the other slots.
+        """
+        for slot, rack in self._racks.items():
+            self._stored[slot] = {
+                "load_name": rack.load_name,
+                "used": [well.well_name for well in rack.wells() if not self.has_tip(well)],
+            }
+        self.robot_state.save(tips=self._stored)
+
+
+class TipTrackingPipette:
+    """
+    Pipette that picks up the next tip of a TipOccupancy and stores the occupancy after each
+    pick-up and return. Other attributes are those of the pipette.
+
+    Parameters:
+        pipette (InstrumentContext): The pipette.
+        occupancy (TipOccupancy): The tips used from the tip racks.
+        kind (callable): Returns the current tip kind of the pipette.
+    """
+
+    def __init__(self, pipette, occupancy, kind):
+        self._pipette = pipette
+        self._occupancy = occupancy
+        self._kind = kind
+
+    def __getattr__(self, name):
+        return getattr(self._pipette, name)
+
+    def __repr__(self):
+        return repr(self._pipette)
+
+    def pick_up_tip(self, location=None, **kwargs):
+        if location is None:
+            location = self._occupancy.next_tip(
+                self._kind(), self._pipette.tip_racks, self._pipette.active_channels
+            )
+        try:
+            if location is None:
+                return self._pipette.pick_up_tip(**kwargs)
+            return self._pipette.pick_up_tip(location, **kwargs)
+        finally:
+            self._occupancy.save()
+
+    def return_tip(self, *args, **kwargs):
+        try:
+            return self._pipette.return_tip(*args, **kwargs)
+        finally:
+            self._occupancy.save()
@@ -0,0 +1,307 @@
+"""
+Structured trace of the pipette commands run by a LiquidHandler.
+
+With tracing enabled, each tip pick-up, aspiration, air gap, dispense, mix, blow-out, tip drop
+and retention wait of transfer and mix is recorded as a TraceEvent with the pipette, its nozzle
+mode, the volume, the well, the indexes of the operations it serves and its start and end time.
+The trace can be written as JSON Lines or, with pyarrow installed, as Parquet, e.g. to see where
+the run time of a protocol goes:
+
+    lh = LiquidHandler(trace=True)
+    lh.transfer(...)
+    lh.trace.write("run.jsonl")
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from .plan import _location_well, location_key
+
+
+@dataclass(frozen=True)
+class TraceEvent:
+    """
+    A pipette command or wait that has been run.
+
+    Attributes:
+        action (str): "pick_up_tip", "aspirate", "air_gap", "dispense", "mix", "touch_tip",
+            "blow_out", "drop_tip", "return_tip" or "delay".
+        pipette (str): "p300_multi" or "p20", None for a delay.
+        nozzle_mode (str): "all", "single" when the p300_multi picks up single tips, or "partial"
+            when it picks up a partial column. None for a delay.
+        volume (float): Volume in ul, if the command moves liquid.
+        well (Union[list, str]): The well as [deck slot, well name], "trash", or None. A column
+            handled by the p300_multi is referenced by its first well.
+        operations (tuple): Indexes of the operations served by the command, in the lists passed
+            to transfer (or plan_transfer for an executed plan), or of the wells passed to mix.
+        start (float): Time at which the command started, in seconds of the trace clock.
+        end (float): Time at which the command returned.
+        repetitions (int): Number of mixing repetitions.
+        error (str): The error raised by the command, None if it succeeded.
+        channels (int): Number of channels of the pipette holding tips. None for a delay.
+    """
+
+    action: str
+    pipette: Optional[str]
+    nozzle_mode: Optional[str]
+    volume: Optional[float]
+    well: object
+    operations: tuple
+    start: float
+    end: float
+    repetitions: Optional[int] = None
+    error: Optional[str] = None
+    channels: Optional[int] = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def to_dict(self):
+        data = asdict(self)
+        data["operations"] = list(self.operations)
+        return data
+
+
+class ExecutionTrace:
+    """
+    Events recorded while running liquid handling commands.
+
+    Parameters:
+        clock (callable, optional): Returns the current time in seconds. Defaults to
+            time.monotonic. The LiquidHandler uses the now method of its clock, so that waits in
+            simulation advance the virtual time of the trace.
+        keep_events (bool, optional): Whether to keep the events in events. False only passes
+            them to the listeners. Defaults to True.
+
+    Attributes:
+        events (list of TraceEvent): The recorded events, in the order they started.
+        listeners (list): Callbacks called with each event when it has been recorded.
+    """
+
+    def __init__(self, clock=time.monotonic, keep_events=True):
+        self.clock = clock
+        self.keep_events = keep_events
+        self.events = []
+        self.listeners = []
+        self._index_maps = []
+        self._operations = ()
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def clear(self):
+        self.events = []
+
+    @contextmanager
+    def mapped_indexes(self, indexes):
+        """
+        Map the operation indexes set within the context through indexes, e.g. from the
+        operations of a labware group to the operations of the whole transfer.
+        """
+        self._index_maps.append(indexes)
+        try:
+            yield
+        finally:
+            self._index_maps.pop()
+
+    def original_index(self, index):
+        for indexes in reversed(self._index_maps):
+            index = indexes[index]
+        return int(index)
+
+    def set_operations(self, operations):
+        """
+        Set the operations served by the following commands.
+
+        Parameters:
+            operations (list): (source well, destination well, indexes) of each operation, where
+                indexes are the operation indexes before mapping.
+        """
+        self._operations = [
+            (
+                location_key(source),
+                location_key(destination),
+                tuple(self.original_index(i) for i in indexes),
+            )
+            for source, destination, indexes in operations
+        ]
+
+    def _operation_indexes(self, action, well):
+        # Aspirations serve the operations of their source well and dispenses and mixing those of
+        # their destination well, the other commands serve all operations of the volley
+        if action == "aspirate":
+            position = 0
+        elif action in ("dispense", "mix"):
+            position = 1
+        else:
+            position = None
+        indexes = []
+        for operation in self._operations:
+            if position is None or operation[position] == well:
+                indexes.extend(operation[2])
+        if not indexes and position is not None:
+            return self._operation_indexes(None, well)
+        return tuple(sorted(set(indexes)))
+
+    @contextmanager
+    def step(
+        self,
+        action,
+        pipette=None,
+        nozzle_mode=None,
+        location=None,
+        volume=None,
+        repetitions=None,
+        channels=None,
+    ):
+        """
+        Record the command run within the context as an event.
+        """
+        well = location_key(_location_well(location))
+        start = self.clock()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event = TraceEvent(
+                action,
+                pipette,
+                nozzle_mode,
+                volume,
+                well,
+                self._operation_indexes(action, well),
+                start,
+                self.clock(),
+                repetitions,
+                error,
+                channels,
+            )
+            if self.keep_events:
+                self.events.append(event)
+            for listener in self.listeners:
+                listener(event)
+
+    def time_by_action(self):
+        """
+        Return the total duration of the events by action.
+        """
+        totals = {}
+        for event in self.events:
+            totals[event.action] = totals.get(event.action, 0.0) + event.duration
+        return totals
+
+    def to_records(self):
+        """
+        Return the events as a list of dictionaries.
+        """
+        return [event.to_dict() for event in self.events]
+
+    def write_jsonl(self, path):
+        with open(path, "w") as f:
+            for record in self.to_records():
+                f.write(json.dumps(record) + "\n")
+
+    def write_parquet(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Writing the trace as Parquet requires pyarrow.") from e
+        records = self.to_records()
+        for record in records:
+            # Parquet columns have a single type
+            record["well"] = json.dumps(record["well"])
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), path)
+
+    def write(self, path):
+        """
+        Write the events to a file, as Parquet if the file name ends with .parquet and as JSON
+        Lines otherwise.
+        """
+        if str(path).endswith(".parquet"):
+            self.write_parquet(path)
+        else:
+            self.write_jsonl(path)
+
+
+class TracedPipette:
+    """
+    Pipette recording its commands in a trace. Other attributes are those of the pipette.
+
+    Parameters:
+        pipette: The pipette.
+        name (str): "p300_multi" or "p20".
+        trace (ExecutionTrace): The trace.
+        nozzle_mode (callable): Returns the current nozzle mode of the pipette.
+    """
+
+    def __init__(self, pipette, name, trace, nozzle_mode):
+        self._pipette = pipette
+        self._name = name
+        self._trace = trace
+        self._nozzle_mode = nozzle_mode
+
+    def __getattr__(self, name):
+        return getattr(self._pipette, name)
+
+    def __repr__(self):
+        return repr(self._pipette)
+
+    def _step(self, action, location=None, volume=None, repetitions=None):
+        return self._trace.step(
+            action,
+            self._name,
+            self._nozzle_mode(),
+            location,
+            volume,
+            repetitions,
+            getattr(self._pipette, "active_channels", 1),
+        )
+
+    def pick_up_tip(self, *args, **kwargs):
+        with self._step("pick_up_tip"):
+            return self._pipette.pick_up_tip(*args, **kwargs)
+
+    def drop_tip(self, *args, **kwargs):
+        with self._step("drop_tip"):
+            return self._pipette.drop_tip(*args, **kwargs)
+
+    def return_tip(self, *args, **kwargs):
+        with self._step("return_tip"):
+            return self._pipette.return_tip(*args, **kwargs)
+
+    def air_gap(self, volume=None, **kwargs):
+        with self._step("air_gap", volume=volume):
+            return self._pipette.air_gap(volume=volume, **kwargs)
+
+    def aspirate(self, volume=None, location=None, **kwargs):
+        with self._step("aspirate", location, volume):
+            return self._pipette.aspirate(volume=volume, location=location, **kwargs)
+
+    def dispense(self, volume=None, location=None, **kwargs):
+        with self._step("dispense", location, volume):
+            return self._pipette.dispense(volume=volume, location=location, **kwargs)
+
+    def mix(self, repetitions=1, volume=None, location=None, **kwargs):
+        with self._step("mix", location, volume, repetitions):
+            return self._pipette.mix(
+                repetitions=repetitions, volume=volume, location=location, **kwargs
+            )
+
+    def touch_tip(self, *args, **kwargs):
+        with self._step("touch_tip"):
+            return self._pipette.touch_tip(*args, **kwargs)
+
+    def blow_out(self, location=None):
+        with self._step("blow_out", location):
+            return self._pipette.blow_out(location)
@@ -5,7 +5,7 @@ with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
 # Requirements
-requirements = ["opentrons==8.2.0"]
+requirements = ["opentrons==8.2.0", "numpy"]
 
 setuptools.setup(
     name="ot_handler",  
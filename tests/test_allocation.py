@@ -0,0 +1,374 @@
+import random
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from opentrons.protocol_api.labware import Well
+from opentrons.protocol_api.disposal_locations import TrashBin
+
+from ot_handler.liquid_handler import LiquidHandler
+
+
+def reference_allocate(source_wells, destination_wells, volumes, min_volume=20):
+    """
+    The list-based allocation that preceded the indexed allocation engine. Kept verbatim as the
+    reference for the differential tests.
+    """
+
+    def get_column_index(well):
+        if isinstance(well, Well):
+            return well.well_name[1:]
+        if isinstance(well, TrashBin):
+            return "1"
+
+    def get_row_index(well):
+        if isinstance(well, Well):
+            return well.well_name[0]
+        if isinstance(well, TrashBin):
+            return "A"
+
+    source_labware = source_wells[0].parent
+    if isinstance(destination_wells[0], Well):
+        destination_labware = destination_wells[0].parent
+    else:
+        destination_labware = destination_wells[0]
+
+    # Construct helper dictionaries to assist in well allocation
+    column_operations = {}
+    large_volume_operations = []
+    for i, source, dest, vol in zip(
+        range(len(volumes)), source_wells, destination_wells, volumes
+    ):
+        if vol > min_volume:
+            op = (i, source, dest, vol)
+            large_volume_operations.append(op)
+            key = (get_column_index(source), get_column_index(dest))
+            column_operations.setdefault(key, []).append(op)
+
+    # Search for column-wise operations with equal volumes
+    multichannel_operations = []
+    multichannel_operations_indexes = []
+    for key, column_ops in column_operations.items():
+        if len(column_ops) >= 8:
+            volumes_set = set(op[3] for op in column_ops)
+            for vol in volumes_set:
+                matching_volumes = [
+                    op
+                    for op in column_ops
+                    if op[3] == vol and op[0] not in multichannel_operations_indexes
+                ]
+                # Eight column-wise operations with the same volume exist
+                if len(matching_volumes) >= 8:
+                    found = True
+                    while found:
+                        found = False
+                        # Scenario 1: row indexes match and populate the whole column
+                        matching_rows = [
+                            op
+                            for op in matching_volumes
+                            if get_row_index(op[1]) == get_row_index(op[2])
+                        ]
+                        row_indices_source = {get_row_index(op[1]) for op in matching_rows}
+                        row_indices_dest = {get_row_index(op[2]) for op in matching_rows}
+                        if len(row_indices_source) == 8 and len(row_indices_dest) == 8:
+                            # We have 8 addressed unique matching rows. Now capture those operations
+                            ops_collection = {get_row_index(op[1]): op for op in matching_rows}
+
+                            if len(ops_collection) == 8:
+                                multichannel_operations.append(ops_collection["A"])
+                                multichannel_operations_indexes.extend(
+                                    [op[0] for op in ops_collection.values()]
+                                )
+                                matching_volumes = [
+                                    op
+                                    for op in matching_volumes
+                                    if op[0] not in multichannel_operations_indexes
+                                ]
+                                found = True
+                        else:
+                            # Scenario 2: source or destination well can fit all multichannel pipettes
+                            # Find a well that is present at least 8 times
+                            source_well_names = [op[1].well_name for op in matching_volumes]
+                            destination_well_names = [
+                                op[2].well_name if isinstance(op[2], Well) else "A1"
+                                for op in matching_volumes
+                            ]
+                            source_well_count = {}
+                            destination_well_count = {}
+                            for well_name in source_well_names:
+                                source_well_count[well_name] = (
+                                    source_well_count.get(well_name, 0) + 1
+                                )
+                            for well_name in destination_well_names:
+                                destination_well_count[well_name] = (
+                                    destination_well_count.get(well_name, 0) + 1
+                                )
+
+                            source_troughs = []
+                            for name, count in source_well_count.items():
+                                well = source_labware.wells(name)[0]
+                                if count >= 8 and hasattr(well, "width") and well.width and well.width > 70:
+                                    source_troughs.append(well)
+
+                            destination_troughs = []
+                            if isinstance(destination_labware, TrashBin):
+                                destination_troughs.append(destination_labware)
+                            else:
+                                for name, count in destination_well_count.items():
+                                    well = destination_labware.wells(name)[0]
+                                    if (
+                                        count >= 8
+                                        and hasattr(well, "width")
+                                        and well.width > 70
+                                    ):
+                                        destination_troughs.append(well)
+                            # Check transfers between troughs and columns
+                            check_set = [
+                                (source_troughs, destination_troughs, 2, 1),
+                                (destination_troughs, source_troughs, 1, 2),
+                            ]
+                            for primary, secondary, idxa, idxb in check_set:
+                                for well in primary:
+                                    # Primary is a trough
+                                    ops = [
+                                        op
+                                        for op in matching_volumes
+                                        if op[idxb] == well
+                                        and op[0] not in multichannel_operations_indexes
+                                    ]
+                                    if len(ops) >= 8:
+                                        found2 = True
+                                        while found2:
+                                            found2 = False
+                                            # Scenario 1: secondary is a column
+                                            ops_collection = {
+                                                get_row_index(op[idxa]): op for op in ops
+                                            }
+                                            if len(ops_collection) == 8:
+                                                multichannel_operations.append(
+                                                    ops_collection["A"]
+                                                )
+                                                multichannel_operations_indexes.extend(
+                                                    [op[0] for op in ops_collection.values()]
+                                                )
+                                                ops = [
+                                                    op
+                                                    for op in ops
+                                                    if op[0]
+                                                    not in multichannel_operations_indexes
+                                                ]
+                                                found = True
+                                                found2 = True
+                                            else:
+                                                # Scenario 2: secondary is a trough
+                                                for dest_well in secondary:
+                                                    trough_to_trough = [
+                                                        op for op in ops if op[2] == dest_well
+                                                    ]
+                                                    while len(trough_to_trough) >= 8:
+                                                        # Operations are identical; add the first one
+                                                        multichannel_operations.append(
+                                                            trough_to_trough[0]
+                                                        )
+                                                        multichannel_operations_indexes.extend(
+                                                            [
+                                                                op[0]
+                                                                for op in trough_to_trough[:8]
+                                                            ]
+                                                        )
+                                                        del trough_to_trough[:8]
+                                                        found = True
+                                                        found2 = True
+                                                        ops = [
+                                                            op
+                                                            for op in ops
+                                                            if op[0]
+                                                            not in multichannel_operations_indexes
+                                                        ]
+
+    allocated_operations = multichannel_operations_indexes
+    p300_single_ops = []
+    p20_ops = []
+    labware_forcing_p20 = [
+        "opentrons_10_tuberack_falcon_4x50ml_6x15ml_conical",
+        "opentrons_10_tuberack_nest_4x50ml_6x15ml_conical",
+        "opentrons_15_tuberack_falcon_15ml_conical",
+        "opentrons_15_tuberack_nest_15ml_conical",
+    ]
+    for op in large_volume_operations:
+        if op[0] in allocated_operations:
+            continue
+        if (
+            source_labware.parent in ["1", "2", "3"] and get_row_index(op[1]) in ["G", "H"]
+        ) or (
+            destination_labware.parent in ["1", "2", "3"] and get_row_index(op[2]) in ["G", "H"]
+        ):
+            p20_ops.append(op)
+            allocated_operations.append(op[0])
+        elif (
+            source_labware.load_name in labware_forcing_p20
+            or destination_labware in labware_forcing_p20
+        ):
+            p20_ops.append(op)
+            allocated_operations.append(op[0])
+        else:
+            p300_single_ops.append(op)
+            allocated_operations.append(op[0])
+
+    for i in range(len(volumes)):
+        if i not in allocated_operations:
+            p20_ops.append(
+                [i, source_wells[i], destination_wells[i], volumes[i]]
+            )  # i is the original index
+
+    return multichannel_operations, p300_single_ops, p20_ops
+
+
+class TestAllocationEngine(unittest.TestCase):
+    def setUp(self):
+        # Initialize LiquidHandler with simulation mode
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+
+        # Mock pipettes
+        self.lh.p300_multi = MagicMock()
+        self.lh.p20 = MagicMock()
+        self.lh.p20.min_volume = 1
+        self.lh.p20.max_volume = 20
+        self.lh.p300_multi.min_volume = 20
+        self.lh.p300_multi.max_volume = 300
+
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        self.front_plate = self.lh.load_labware(
+            "nest_96_wellplate_100ul_pcr_full_skirt", 3, "front plate"
+        )
+        self.reservoir = self.lh.load_labware("nest_12_reservoir_15ml", 5, "reservoir")
+        self.second_reservoir = self.lh.load_labware("nest_12_reservoir_15ml", 6, "reservoir 2")
+        self.plate_384 = self.lh.load_labware("corning_384_wellplate_112ul_flat", 8, "384")
+        self.second_plate_384 = self.lh.load_labware(
+            "corning_384_wellplate_112ul_flat", 10, "384 2"
+        )
+
+    def assertSameAllocation(self, source_wells, destination_wells, volumes):
+        expected = reference_allocate(source_wells, destination_wells, volumes)
+        allocated = self.lh._allocate_liquid_handling_steps(
+            source_wells=source_wells, destination_wells=destination_wells, volumes=volumes
+        )
+        for name, expected_ops, allocated_ops in zip(
+            ["p300_multi", "p300_single", "p20"], expected, allocated
+        ):
+            self.assertEqual(allocated_ops, expected_ops, f"{name} allocation differs")
+
+    def test_plate_stamp(self):
+        for volumes in ([50] * 96, [10] * 96, [random.choice([5, 50]) for _ in range(96)]):
+            with self.subTest(volumes=volumes[:8]):
+                self.assertSameAllocation(self.plate.wells(), self.front_plate.wells(), volumes)
+                self.assertSameAllocation(
+                    self.plate.wells() * 2, self.front_plate.wells() * 2, volumes * 2
+                )
+
+    def test_cherry_picks(self):
+        random.seed(1)
+        for _ in range(20):
+            source_wells = random.sample(self.plate.wells(), 96) * 2
+            destination_wells = random.sample(self.front_plate.wells(), 96) * 2
+            volumes = [random.choice([5, 25, 50, 100]) for _ in source_wells]
+            with self.subTest(volumes=volumes[:8]):
+                self.assertSameAllocation(source_wells, destination_wells, volumes)
+
+    def test_partially_shuffled_columns(self):
+        random.seed(2)
+        for _ in range(20):
+            columns = self.plate.columns()
+            source_wells = [well for column in random.sample(columns, 12) for well in column]
+            destination_wells = list(self.front_plate.wells())
+            for i in random.sample(range(96), 10):
+                j = random.randrange(96)
+                destination_wells[i], destination_wells[j] = (
+                    destination_wells[j],
+                    destination_wells[i],
+                )
+            volumes = [random.choice([30, 30, 30, 70]) for _ in source_wells]
+            with self.subTest(volumes=volumes[:8]):
+                self.assertSameAllocation(source_wells, destination_wells, volumes)
+
+    def test_trough_to_plate(self):
+        random.seed(3)
+        for _ in range(10):
+            source_wells = [random.choice(self.reservoir.wells()[:3]) for _ in range(192)]
+            destination_wells = self.plate.wells() * 2
+            volumes = [random.choice([10, 40, 40, 120]) for _ in source_wells]
+            with self.subTest(volumes=volumes[:8]):
+                self.assertSameAllocation(source_wells, destination_wells, volumes)
+                self.assertSameAllocation(destination_wells, source_wells, volumes)
+
+    def test_trough_to_trough(self):
+        source_wells = [self.reservoir.wells()[0]] * 20 + [self.reservoir.wells()[1]] * 9
+        destination_wells = [self.second_reservoir.wells()[3]] * 29
+        self.assertSameAllocation(source_wells, destination_wells, [50] * 29)
+
+    def test_column_to_trash(self):
+        source_wells = self.plate.wells()[:16] * 3
+        destination_wells = [self.lh.trash] * len(source_wells)
+        self.assertSameAllocation(source_wells, destination_wells, [40] * len(source_wells))
+
+    def test_384_well_plates(self):
+        volumes = [50] * 384
+        self.assertSameAllocation(self.plate_384.wells(), self.second_plate_384.wells(), volumes)
+        self.assertSameAllocation(
+            [self.reservoir.wells()[0]] * 384, self.second_plate_384.wells(), volumes
+        )
+
+    def test_partial_columns(self):
+        source_wells = self.plate.columns()[0][1:]
+        destination_wells = self.front_plate.columns()[1][1:]
+        partial_operations = {}
+        multichannel_members = {}
+        p300_multi, p300, p20 = self.lh._allocate_liquid_handling_steps(
+            source_wells=source_wells,
+            destination_wells=destination_wells,
+            volumes=[50] * 7,
+            multichannel_members=multichannel_members,
+            partial_operations=partial_operations,
+        )
+
+        # Tip racks or labware behind the plates leave only the front rows to partial columns
+        self.assertEqual(p300_multi, [])
+        self.assertEqual([op[0] for op in partial_operations[4]], [6])
+        self.assertEqual(partial_operations[4][0][1], self.plate["H1"])
+        self.assertEqual(sorted(multichannel_members[6]), [3, 4, 5, 6])
+        self.assertEqual(partial_operations[2], [])
+        self.assertEqual(sorted(op[0] for op in p300), [0, 1, 2])
+        self.assertEqual(p20, [])
+
+        back_plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 11, "back")
+        partial_operations = {}
+        _, p300, _ = self.lh._allocate_liquid_handling_steps(
+            source_wells=back_plate.columns()[0][1:],
+            destination_wells=back_plate.columns()[1][1:],
+            volumes=[50] * 7,
+            partial_operations=partial_operations,
+        )
+        self.assertEqual(partial_operations[4][0][1], back_plate["E1"])
+        self.assertEqual(partial_operations[2][0][1], back_plate["G1"])
+        self.assertEqual([op[1] for op in p300], [back_plate["H1"]])
+
+    def test_large_worklist(self):
+        random.seed(5)
+        source_wells = [random.choice(self.reservoir.wells()) for _ in range(10000)]
+        destination_wells = [random.choice(self.plate.wells()) for _ in range(10000)]
+        volumes = [random.choice([5, 30, 50, 150]) for _ in range(10000)]
+
+        start = time.perf_counter()
+        p300_multi, p300, p20 = self.lh._allocate_liquid_handling_steps(
+            source_wells=source_wells, destination_wells=destination_wells, volumes=volumes
+        )
+        elapsed = time.perf_counter() - start
+
+        allocated_indexes = [op[0] for op in p300 + p20]
+        self.assertEqual(len(allocated_indexes), len(set(allocated_indexes)))
+        self.assertEqual(len(allocated_indexes) + 8 * len(p300_multi), 10000)
+        self.assertLess(elapsed, 5, "Allocation should scale near-linearly")
+
+
+if __name__ == "__main__":
+    unittest.main()
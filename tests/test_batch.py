@@ -0,0 +1,204 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from ot_handler import LiquidHandler
+from ot_handler.batch import TransferBatch
+
+
+class _Labware:
+    def __init__(self, slot):
+        self.parent = slot
+
+
+class _Well:
+    def __init__(self, name, labware):
+        self.well_name = name
+        self.parent = labware
+
+    def __repr__(self):
+        return self.well_name
+
+
+class TestTransferBatch(unittest.TestCase):
+    def setUp(self):
+        labware = _Labware("1")
+        self.wells = {name: _Well(name, labware) for name in ("A1", "A2", "A3", "B1", "B2", "B3")}
+        self.batch = TransferBatch()
+
+    def add(self, sources, destinations, **parameters):
+        parameters = {"new_tip": "always", "add_air_gap": True, **parameters}
+        return self.batch.add(
+            [50] * len(sources),
+            [self.wells[name] for name in sources],
+            [self.wells[name] for name in destinations],
+            parameters,
+            {},
+        )
+
+    def merged_calls(self):
+        return [merged.calls for merged in self.batch.merge()]
+
+    def test_merges_independent_calls(self):
+        self.add(["A1"], ["B1"])
+        self.add(["A2", "A3"], ["B2", "B3"])
+
+        transfers = self.batch.merge()
+        self.assertEqual([merged.calls for merged in transfers], [[0, 1]])
+        self.assertEqual(
+            transfers[0].destination_wells, [self.wells[name] for name in ("B1", "B2", "B3")]
+        )
+
+    def test_keeps_dependent_calls_in_order(self):
+        self.add(["A1"], ["B1"])
+        # Reads the well written by the first call, which transfer runs in a later stage
+        self.add(["B1"], ["B2"])
+        self.add(["A3"], ["B3"], add_air_gap=False)
+        # Reads the well written by the third call, so it cannot move before it
+        self.add(["B3"], ["A2"])
+        self.assertEqual(self.merged_calls(), [[0, 1], [2], [3]])
+
+    def test_moves_calls_past_independent_calls(self):
+        self.add(["A1"], ["B1"])
+        self.add(["A2"], ["B2"], add_air_gap=False)
+        self.add(["A3"], ["B3"])
+        # Writes a well read by the second call, so it cannot move before it
+        self.add(["A1"], ["A2"])
+        self.assertEqual(self.merged_calls(), [[0, 2], [1], [3]])
+
+    def test_once_requires_same_sources(self):
+        self.add(["A1"], ["B1"], new_tip="once")
+        self.add(["A1"], ["B2"], new_tip="once")
+        self.add(["A2"], ["B3"], new_tip="once")
+        self.assertEqual(self.merged_calls(), [[0, 1], [2]])
+
+    def test_failed_operations_of_calls(self):
+        self.add(["A1"], ["B1"])
+        self.add(["A2", "A3"], ["B2", "B3"])
+
+        def run_transfer(merged):
+            return [
+                [
+                    merged.source_wells[2],
+                    merged.destination_wells[2],
+                    merged.volumes[2],
+                    2,
+                    "volume_too_low",
+                ]
+            ]
+
+        self.batch.run(run_transfer)
+        self.assertEqual(self.batch.failed_operations[0], [])
+        self.assertEqual(
+            self.batch.failed_operations[1],
+            [[self.wells["A3"], self.wells["B3"], 50, 1, "volume_too_low"]],
+        )
+        # The calls have run
+        self.assertEqual(self.batch.merge(), [])
+
+
+class TestLiquidHandlerBatch(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False, trace=True)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 4, single_channel=True)
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        self.reservoir = self.lh.load_labware("nest_12_reservoir_15ml", 5, "reservoir")
+
+    def actions(self, action):
+        return [event for event in self.lh.trace if event.action == action]
+
+    def test_shares_tips_between_calls(self):
+        with self.lh.batch() as batch:
+            failed = self.lh.distribute(30, self.reservoir["A1"], self.plate.columns()[0])
+            self.lh.distribute(30, self.reservoir["A1"], self.plate.columns()[1])
+            # Nothing runs until the batch ends
+            self.assertEqual(failed, [])
+            self.assertEqual(len(self.lh.trace), 0)
+
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(batch.failed_operations, [[], []])
+        self.assertEqual(len(self.actions("pick_up_tip")), 1)
+        self.assertEqual(len(self.actions("dispense")), 2)
+
+    def test_reads_after_writes(self):
+        with self.lh.batch() as batch:
+            self.lh.transfer(50, self.plate["A1"], self.plate["A2"], new_tip="always")
+            self.lh.transfer(
+                [50, 1], self.plate["A2"], [self.plate["A3"], self.plate["A4"]], new_tip="always"
+            )
+
+        # Merged into one transfer, which reads A2 in the stage after it is written
+        self.assertEqual(
+            [event.operations for event in self.actions("aspirate")], [(0,), (1,)]
+        )
+
+        wells = [(event.action, event.well[1]) for event in self.lh.trace if event.well]
+        self.assertLess(wells.index(("dispense", "A2")), wells.index(("aspirate", "A2")))
+        self.assertEqual(batch.failed_operations[0], [])
+        self.assertEqual(
+            [operation[3:] for operation in batch.failed_operations[1]], [[1, "volume_too_low"]]
+        )
+
+    def test_mix_runs_collected_calls(self):
+        with self.lh.batch():
+            self.lh.transfer(50, self.plate["A1"], self.plate["A2"])
+            self.lh.mix([self.plate["A2"]], repetitions=2, volume=40)
+            self.lh.transfer(50, self.plate["B1"], self.plate["B2"])
+
+        wells = [(event.action, event.well[1]) for event in self.lh.trace if event.well]
+        self.assertLess(wells.index(("dispense", "A2")), wells.index(("mix", "A2")))
+        self.assertLess(wells.index(("mix", "A2")), wells.index(("dispense", "B2")))
+
+    def test_robot_commands_run_collected_calls(self):
+        self.lh.magnetic_module = MagicMock()
+        events_at_engage = []
+        self.lh.magnetic_module.engage.side_effect = lambda **kwargs: events_at_engage.append(
+            [event.well[1] for event in self.actions("dispense")]
+        )
+        with self.lh.batch():
+            self.lh.transfer(50, self.plate["A1"], self.plate["A2"])
+            self.lh.engage_magnets()
+            self.lh.transfer(50, self.plate["B1"], self.plate["B2"])
+
+        # The magnets are engaged after the first transfer and before the second
+        self.assertEqual(events_at_engage, [["A2"]])
+        self.assertEqual([event.well[1] for event in self.actions("dispense")], ["A2", "B2"])
+
+    def test_shaking_timer_leaves_collected_calls(self):
+        self.lh.shaker_module = MagicMock()
+        timer_released = threading.Event()
+        sleep = self.lh.clock.sleep
+        self.lh.clock.sleep = lambda duration: (
+            timer_released.wait(60) if duration == 5 else sleep(duration)
+        )
+        with self.lh.batch():
+            self.lh.transfer(50, self.plate["A1"], self.plate["A2"])
+            self.lh.shake(300, 5)
+            self.lh.transfer(50, self.plate["B1"], self.plate["B2"])
+            timer_released.set()
+            self.lh.shaking_timer.join()
+            # The timer stops the shaker without running the second transfer
+            self.lh.shaker_module.deactivate_shaker.assert_called_once()
+            self.assertEqual([event.well[1] for event in self.actions("dispense")], ["A2"])
+
+        self.assertEqual([event.well[1] for event in self.actions("dispense")], ["A2", "B2"])
+
+    def test_exception_discards_calls(self):
+        with self.assertRaises(RuntimeError):
+            with self.lh.batch():
+                self.lh.transfer(50, self.plate["A1"], self.plate["A2"])
+                raise RuntimeError("stop")
+
+        self.assertEqual(len(self.lh.trace), 0)
+        self.assertIsNone(self.lh._batch)
+
+    def test_nested_batch(self):
+        with self.lh.batch():
+            with self.assertRaises(ValueError):
+                with self.lh.batch():
+                    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
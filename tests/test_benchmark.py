@@ -0,0 +1,50 @@
+import unittest
+
+from ot_handler.benchmark import (
+    allocation_10k,
+    format_results,
+    import_planning,
+    mix_plate,
+    run_workload,
+    stamp_96,
+)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_executed_workload(self):
+        result = run_workload("stamp_96", stamp_96, "execute")
+
+        self.assertEqual(result.operations, 96)
+        self.assertGreater(result.planning_cpu_time, 0)
+        self.assertIsNotNone(result.execution_cpu_time)
+        # A fresh column of tips for each of the 12 columns
+        self.assertEqual(result.tips, 96)
+        self.assertGreater(result.commands, 12 * 4)
+        self.assertGreater(result.estimated_robot_time, 0)
+
+    def test_recorded_workload(self):
+        result = run_workload("mix_plate", mix_plate, "record")
+
+        self.assertEqual(result.operations, 58)
+        self.assertIsNone(result.planning_cpu_time)
+        self.assertEqual(result.commands, 19)
+
+    def test_allocation_workload(self):
+        result = run_workload("allocation_10k", allocation_10k, "plan")
+
+        self.assertEqual(result.operations, 10000)
+        self.assertIsNone(result.commands)
+        table = format_results([result])
+        self.assertIn("allocation_10k", table.splitlines()[1])
+
+    def test_import_workload(self):
+        result = run_workload("import_planning", import_planning, "import")
+
+        self.assertIsNone(result.operations)
+        self.assertIsNone(result.planning_cpu_time)
+        self.assertGreater(result.import_time, 0)
+        self.assertIn("import_planning", format_results([result]).splitlines()[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from ot_handler import LiquidHandler
+from ot_handler.clock import SystemClock, VirtualClock
+
+
+class TestClock(unittest.TestCase):
+    def test_virtual_clock(self):
+        clock = VirtualClock(start=10)
+        started = time.monotonic()
+        clock.sleep(3600)
+        clock.sleep(-1)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(clock.elapsed, 3600)
+        self.assertEqual(clock.now(), 3610)
+
+    def test_system_clock(self):
+        clock = SystemClock()
+        started = clock.now()
+        clock.sleep(0.01)
+
+        self.assertGreaterEqual(clock.now() - started, 0.01)
+        self.assertEqual(clock.elapsed, 0.01)
+
+
+class TestLiquidHandlerClock(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+
+    def test_simulation_uses_virtual_clock(self):
+        self.assertIsInstance(self.lh.clock, VirtualClock)
+
+    def test_retention_time_advances_virtual_time(self):
+        started = time.monotonic()
+        self.lh.transfer(
+            50, self.plate.columns()[0], self.plate.columns()[1], retention_time=600
+        )
+
+        self.assertLess(time.monotonic() - started, 60)
+        # Retention after the aspiration and the dispense
+        self.assertEqual(self.lh.clock.elapsed, 2 * 600)
+
+    def test_shake_and_sleep_advance_virtual_time(self):
+        self.lh.shaker_module = MagicMock()
+        self.lh.shake(1000, 300, wait=True)
+        self.lh.sleep(60)
+
+        self.lh.shaker_module.deactivate_shaker.assert_called_once()
+        self.assertEqual(self.lh.clock.elapsed, 360)
+
+    def test_custom_clock(self):
+        clock = VirtualClock()
+        lh = LiquidHandler(simulation=True, load_default=False, clock=clock)
+        lh.sleep(5)
+        self.assertIs(lh.clock, clock)
+        self.assertEqual(clock.elapsed, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
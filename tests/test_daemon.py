@@ -0,0 +1,104 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from ot_handler import LiquidHandler
+from ot_handler.daemon import LiquidHandlerClient, LiquidHandlerServer, LocalClient, RemoteError
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 6, single_channel=True)
+        self.lh.load_tips("opentrons_96_tiprack_20ul", 11, single_channel=True)
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+
+    def test_local_client_transfer(self):
+        client = LocalClient(self.lh)
+        failed_operations = client.transfer(
+            [50, 0.1],
+            client.well(9, "A1"),
+            client.wells(9, ["A2", "B2"]),
+            new_tip="always",
+        )
+
+        self.assertEqual(
+            failed_operations,
+            [[{"well": ["9", "A1"]}, {"well": ["9", "B2"]}, 0.1, 1, "volume_too_low"]],
+        )
+
+    def test_local_client_labware_and_estimates(self):
+        client = LocalClient(self.lh)
+        self.assertEqual(client.load_labware("nest_12_reservoir_15ml", 2), {"labware": "2"})
+
+        estimate = client.estimate_duration(
+            "distribute", 50, client.well(2, "A1"), client.wells(9, ["A1", "B1"])
+        )
+        self.assertGreater(estimate["total"], 0)
+        self.assertIn("dispense", estimate["by_action"])
+
+    def test_errors(self):
+        client = LocalClient(self.lh)
+        with self.assertRaises(RemoteError) as context:
+            # The deck position is occupied
+            client.load_labware("nest_12_reservoir_15ml", 9)
+        self.assertEqual(context.exception.type, "ValueError")
+
+        with self.assertRaises(RemoteError):
+            client.call("__del__")
+        with self.assertRaises(AttributeError):
+            client.protocol_api
+
+    def test_unix_socket_server(self):
+        directory = tempfile.mkdtemp()
+        socket_path = os.path.join(directory, "ot_handler.sock")
+        server = LiquidHandlerServer(socket_path, self.lh)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with LiquidHandlerClient(socket_path, timeout=60) as client:
+                self.assertEqual(client.ping(), "pong")
+                self.assertEqual(
+                    client.distribute(20, client.well(9, "A1"), client.wells(9, ["C1", "D1"])),
+                    [],
+                )
+                self.assertEqual(client.sleep(5), None)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertFalse(os.path.exists(socket_path))
+        self.assertEqual(self.lh.clock.elapsed, 5)
+        os.rmdir(directory)
+
+    def test_replaces_only_stale_sockets(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "ot_handler.sock")
+        with open(path, "w") as file:
+            file.write("protocol")
+        with self.assertRaises(ValueError):
+            LiquidHandlerServer(path, self.lh)
+        with open(path) as file:
+            self.assertEqual(file.read(), "protocol")
+        os.remove(path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen()
+        with self.assertRaises(ValueError):
+            LiquidHandlerServer(path, self.lh)
+        self.assertTrue(os.path.exists(path))
+
+        # The socket is stale once nothing listens on it
+        listener.close()
+        server = LiquidHandlerServer(path, self.lh)
+        server.server_close()
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+
+from ot_handler import LiquidHandler
+from ot_handler.duration import DurationModel, estimate_steps
+from ot_handler.plan import PlanStep
+
+
+class TestEstimateSteps(unittest.TestCase):
+    def setUp(self):
+        self.model = DurationModel(move_overhead=0, travel_height=0)
+        self.points = {"A": (0.0, 0.0), "B": (400.0, 0.0)}
+
+    def estimate(self, steps):
+        return estimate_steps(steps, self.points.get, self.model)
+
+    def test_moves_and_plunger(self):
+        estimate = self.estimate(
+            [
+                PlanStep("aspirate", "p20", True, "A", 7.56),
+                PlanStep("dispense", "p20", True, "B", 7.56),
+                PlanStep("dispense", "p20", True, "B", 0),
+            ]
+        )
+
+        durations = [duration for _, duration in estimate.steps]
+        # The first move starts from an unknown position
+        self.assertAlmostEqual(durations[0], self.model.unknown_move_time + 1)
+        self.assertAlmostEqual(durations[1], 1 + 1)
+        self.assertAlmostEqual(durations[2], 0)
+        self.assertAlmostEqual(estimate.total, sum(durations))
+
+    def test_mix_delay_and_tips(self):
+        estimate = self.estimate(
+            [
+                PlanStep("pick_up_tip", "p300_multi", False),
+                PlanStep("delay", None, False, duration=5),
+                PlanStep("mix", "p300_multi", False, "A", 94.0, repetitions=3),
+                PlanStep("drop_tip", "p300_multi", False),
+            ]
+        )
+
+        by_action = estimate.by_action()
+        self.assertAlmostEqual(by_action["delay"], 5)
+        self.assertAlmostEqual(by_action["mix"], self.model.unknown_move_time + 3 * 2)
+        self.assertAlmostEqual(
+            by_action["pick_up_tip"], self.model.unknown_move_time + self.model.pick_up_tip_time
+        )
+        self.assertAlmostEqual(
+            by_action["drop_tip"], self.model.unknown_move_time + self.model.drop_tip_time
+        )
+
+
+class TestEstimateDuration(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+        self.lh.p300_tips.append(
+            self.lh.protocol_api.load_labware("opentrons_96_tiprack_300ul", "7")
+        )
+        self.lh.single_p20_tips.append(
+            self.lh.protocol_api.load_labware("opentrons_96_tiprack_20ul", "11")
+        )
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        self.reservoir = self.lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+
+    def test_estimate_plan(self):
+        plan = self.lh.plan_transfer(50, self.reservoir["A1"], self.plate.columns()[0])
+        estimate = self.lh.estimate_duration(plan)
+
+        self.assertEqual([step for step, _ in estimate.steps], list(plan.steps))
+        self.assertGreater(estimate.total, 0)
+
+    def test_estimate_does_not_execute(self):
+        estimate = self.lh.estimate_duration(
+            "distribute", 50, self.reservoir["A1"], self.plate.wells()[:16]
+        )
+
+        self.assertGreater(estimate.by_action()["dispense"], 0)
+        self.assertFalse(self.lh.p300_multi.has_tip)
+        self.assertNotIn("transfer", vars(self.lh))
+
+    def test_retention_and_mixing(self):
+        arguments = (50, self.reservoir["A1"], self.plate.wells()[:2])
+        base = self.lh.estimate_duration("transfer", *arguments, new_tip="always")
+        slower = self.lh.estimate_duration(
+            "transfer", *arguments, new_tip="always", retention_time=3, mix_after=(3, 20)
+        )
+
+        # Retention after each aspiration and dispense
+        self.assertAlmostEqual(slower.by_action()["delay"], 4 * 3)
+        self.assertIn("mix", slower.by_action())
+        self.assertGreater(slower.total, base.total + 12)
+
+    def test_module_waits(self):
+        self.assertEqual(self.lh.estimate_duration("shake", 1000, 60, wait=True).total, 60)
+        self.assertEqual(self.lh.estimate_duration("shake", 1000, 60).total, 0)
+        self.assertEqual(self.lh.estimate_duration("sleep", 5).total, 5)
+        with self.assertRaises(ValueError):
+            self.lh.estimate_duration("home")
+
+
+if __name__ == "__main__":
+    unittest.main()
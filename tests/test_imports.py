@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import unittest
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLANNING_MODULES = [
+    "ot_handler",
+    "ot_handler.allocation",
+    "ot_handler.batch",
+    "ot_handler.benchmark",
+    "ot_handler.clock",
+    "ot_handler.daemon",
+    "ot_handler.duration",
+    "ot_handler.labware_registry",
+    "ot_handler.layout",
+    "ot_handler.lazy_deck",
+    "ot_handler.log",
+    "ot_handler.metrics",
+    "ot_handler.operation_table",
+    "ot_handler.packing",
+    "ot_handler.path",
+    "ot_handler.plan",
+    "ot_handler.plan_cache",
+    "ot_handler.robot_state",
+    "ot_handler.tips",
+    "ot_handler.trace",
+]
+
+
+def run_python(code):
+    # A fresh interpreter, so that the modules imported by the tests do not interfere
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=PACKAGE_ROOT, capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+class TestImports(unittest.TestCase):
+    def test_planning_modules_do_not_import_opentrons(self):
+        imported = run_python(
+            f"import importlib, sys\n"
+            f"for module in {PLANNING_MODULES!r}:\n"
+            f"    importlib.import_module(module)\n"
+            f"print(sorted(m for m in sys.modules if m.split('.')[0] == 'opentrons'))"
+        )
+        self.assertEqual(imported, "[]")
+
+    def test_liquid_handler_imports_opentrons(self):
+        imported = run_python(
+            "import sys\n"
+            "from ot_handler import LiquidHandler\n"
+            "print(LiquidHandler.__module__, 'opentrons' in sys.modules)"
+        )
+        self.assertEqual(imported, "ot_handler.liquid_handler True")
+
+
+if __name__ == "__main__":
+    unittest.main()
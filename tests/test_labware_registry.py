@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from opentrons.protocols.labware import get_labware_definition
+
+from ot_handler import LiquidHandler
+from ot_handler.labware_registry import LabwareRegistry
+
+
+def custom_definition(load_name):
+    definition = get_labware_definition("nest_12_reservoir_15ml")
+    definition["namespace"] = "custom_beta"
+    definition["parameters"]["loadName"] = load_name
+    return definition
+
+
+class TestLabwareRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.folder = self.directory.name
+        self.write_definition("custom_reservoir")
+
+    def write_definition(self, load_name):
+        with open(os.path.join(self.folder, f"{load_name}.json"), "w") as f:
+            json.dump(custom_definition(load_name), f)
+
+    def test_index_and_parse_once(self):
+        registry = LabwareRegistry(self.folder)
+
+        self.assertIn("custom_reservoir", registry)
+        self.assertNotIn("nest_12_reservoir_15ml", registry)
+        with patch("json.load", wraps=json.load) as load:
+            definition = registry.get("custom_reservoir")
+            self.assertIs(registry.get("custom_reservoir"), definition)
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(definition["parameters"]["loadName"], "custom_reservoir")
+        self.assertIsNone(registry.get("missing"))
+
+    def test_missing_folder(self):
+        registry = LabwareRegistry(os.path.join(self.folder, "missing"))
+        self.assertEqual(registry.names(), [])
+
+    def test_refresh(self):
+        registry = LabwareRegistry(self.folder)
+        self.assertEqual(registry.names(), ["custom_reservoir"])
+        self.write_definition("second_reservoir")
+        self.assertNotIn("second_reservoir", registry)
+
+        registry.refresh()
+        self.assertIn("second_reservoir", registry)
+
+    def test_cache_file(self):
+        LabwareRegistry(self.folder, cache_file=True).get("custom_reservoir")
+        self.assertTrue(os.path.isfile(os.path.join(self.folder, ".labware_definitions.pickle")))
+
+        with patch("json.load") as load:
+            definition = LabwareRegistry(self.folder, cache_file=True).get("custom_reservoir")
+            load.assert_not_called()
+        self.assertEqual(definition["parameters"]["loadName"], "custom_reservoir")
+
+    def test_modified_definition_is_reloaded(self):
+        registry = LabwareRegistry(self.folder)
+        registry.get("custom_reservoir")
+        path = os.path.join(self.folder, "custom_reservoir.json")
+        os.utime(path, ns=(0, 0))
+
+        with patch("json.load", wraps=json.load) as load:
+            registry.get("custom_reservoir")
+            self.assertEqual(load.call_count, 1)
+
+    def test_load_custom_labware(self):
+        lh = LiquidHandler(simulation=True, load_default=False, labware_folder=self.folder)
+
+        with patch.object(
+            lh.protocol_api,
+            "load_labware_from_definition",
+            wraps=lh.protocol_api.load_labware_from_definition,
+        ) as load_from_definition:
+            labware = lh.load_labware("custom_reservoir", 2)
+            lh.load_labware("nest_12_reservoir_15ml", 3)
+            # Only the custom labware is loaded from its definition
+            load_from_definition.assert_called_once()
+
+        self.assertEqual(labware.load_name, "custom_reservoir")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ot_handler import LiquidHandler
+from ot_handler import layout
+from ot_handler.layout import LAYOUT_PATH_VARIABLE, resolve_default_layout
+
+EMPTY_LAYOUT = {"labware": {}, "multichannel_tips": {}, "single_channel_tips": {}, "modules": {}}
+
+
+class TestResolveDefaultLayout(unittest.TestCase):
+    def setUp(self):
+        layout._resolved_layouts.clear()
+        self.addCleanup(layout._resolved_layouts.clear)
+        environment = patch.dict(os.environ)
+        environment.start()
+        self.addCleanup(environment.stop)
+        os.environ.pop(LAYOUT_PATH_VARIABLE, None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_layout(self, directory, content=EMPTY_LAYOUT):
+        path = os.path.join(directory, "default_layout.ot2")
+        with open(path, "w") as f:
+            json.dump(content, f)
+        return path
+
+    def test_search_path_precedence(self):
+        first = os.path.join(self.directory.name, "first")
+        second = os.path.join(self.directory.name, "second")
+        os.makedirs(first)
+        os.makedirs(second)
+        os.environ[LAYOUT_PATH_VARIABLE] = first
+        expected = self.write_layout(first)
+        self.write_layout(second)
+
+        # Directories without a layout file are skipped
+        self.assertEqual(resolve_default_layout([self.directory.name]), expected)
+        self.assertEqual(
+            resolve_default_layout([os.path.join(second, "default_layout.ot2")]),
+            os.path.join(second, "default_layout.ot2"),
+        )
+
+    def test_single_search_path(self):
+        expected = self.write_layout(self.directory.name)
+        self.assertEqual(resolve_default_layout(self.directory.name), expected)
+
+        missing = pathlib.Path(self.directory.name, "missing")
+        self.assertEqual(layout.layout_search_path(missing)[0], str(missing))
+        self.assertEqual(
+            resolve_default_layout(missing), os.path.join(missing, "default_layout.ot2")
+        )
+
+    def test_missing_layout(self):
+        missing = os.path.join(self.directory.name, "missing")
+        self.assertEqual(
+            resolve_default_layout([missing]), os.path.join(missing, "default_layout.ot2")
+        )
+
+    def test_resolved_location_is_cached(self):
+        expected = self.write_layout(self.directory.name)
+        self.assertEqual(resolve_default_layout([self.directory.name]), expected)
+
+        with patch("os.path.isfile", wraps=os.path.isfile) as isfile:
+            self.assertEqual(resolve_default_layout([self.directory.name]), expected)
+            self.assertEqual(isfile.call_count, 1)
+
+    def test_constructor_does_not_scan_directories(self):
+        self.write_layout(
+            self.directory.name, dict(EMPTY_LAYOUT, labware={"2": "nest_12_reservoir_15ml"})
+        )
+
+        with patch("os.walk", side_effect=AssertionError("os.walk called")):
+            lh = LiquidHandler(simulation=True, layout_search_path=[self.directory.name])
+
+        self.assertEqual(lh.protocol_api.deck["2"].load_name, "nest_12_reservoir_15ml")
+
+
+if __name__ == "__main__":
+    unittest.main()
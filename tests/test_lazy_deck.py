@@ -0,0 +1,64 @@
+import unittest
+
+from ot_handler import LiquidHandler
+from ot_handler.lazy_deck import LazyLabware
+
+LAYOUT = {
+    "multichannel_tips": {"7": "opentrons_96_tiprack_300ul"},
+    "single_channel_tips": {"11": "opentrons_96_tiprack_20ul"},
+    "labware": {
+        "2": "nest_12_reservoir_15ml",
+        "9": "nest_96_wellplate_100ul_pcr_full_skirt",
+    },
+}
+
+
+class TestLazyDeck(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, deck_layout=LAYOUT, lazy_deck=True)
+
+    def test_entries_are_registered(self):
+        self.assertEqual(sorted(self.lh.deck_proxies), ["11", "2", "7", "9"])
+        for slot, proxy in self.lh.deck_proxies.items():
+            self.assertIsInstance(proxy, LazyLabware)
+            self.assertIsNone(self.lh.protocol_api.deck[slot])
+
+    def test_metadata_without_loading(self):
+        proxy = self.lh.deck_proxies["2"]
+        self.assertAlmostEqual(proxy.height, 31.4)
+        self.assertFalse(proxy.is_tiprack)
+        self.assertFalse(proxy.loaded)
+        self.assertIsNone(self.lh.protocol_api.deck["2"])
+
+    def test_load_on_first_use(self):
+        reservoir = self.lh.deck_proxies["2"]
+        well = reservoir["A1"]
+
+        self.assertTrue(reservoir.loaded)
+        self.assertNotIn("2", self.lh.deck_proxies)
+        self.assertEqual(well.parent, self.lh.protocol_api.deck["2"])
+        self.assertIs(self.lh.get_labware(2), self.lh.protocol_api.deck["2"])
+        # Other entries are still pending
+        self.assertIsNone(self.lh.protocol_api.deck["9"])
+
+    def test_transfer_loads_tips(self):
+        plate = self.lh.get_labware(9)
+        failed_operations = self.lh.transfer(50, plate.columns()[0], plate.columns()[1])
+
+        self.assertEqual(failed_operations, [])
+        self.assertEqual(len(self.lh.p300_tips), 1)
+        self.assertEqual(len(self.lh.single_p20_tips), 1)
+        self.assertIsNone(self.lh.protocol_api.deck["2"])
+
+    def test_explicit_load_replaces_proxy(self):
+        self.lh.load_labware("nest_96_wellplate_2ml_deep", 2)
+        self.assertNotIn("2", self.lh.deck_proxies)
+        self.assertEqual(self.lh.get_labware(2).load_name, "nest_96_wellplate_2ml_deep")
+
+        self.lh.unload_labware_from_slot("9")
+        self.assertNotIn("9", self.lh.deck_proxies)
+        self.assertIsNone(self.lh.get_labware(9))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -249,7 +249,9 @@ class TestLiquidHandlerDistribute(unittest.TestCase):
         volumes = [15] * len(destination_wells)
 
         # Act & Assert
-        with patch.object(self.lh, "transfer", wraps=self.lh.transfer) as mock_transfer:
+        with patch.object(
+            self.lh, "_plan_operations", wraps=self.lh._plan_operations
+        ) as mock_plan_operations:
             self.lh.distribute(
                 volumes=volumes,
                 source_well=self.source_well,
@@ -258,9 +260,9 @@ class TestLiquidHandlerDistribute(unittest.TestCase):
             )
 
             # Assert
-            # The transfer method should be called recursively for each labware
+            # The transfer is planned as one plan with a group for each labware
             self.assertEqual(self.lh.p20.dispense.call_count, len(destination_wells))
-            self.assertEqual(mock_transfer.call_count, 3)
+            self.assertEqual(mock_plan_operations.call_count, 3)
 
     def test_distribute_large_volume_with_multiple_aspirations(self):
         # Arrange
@@ -800,6 +802,67 @@ class TestLiquidHandlerTransfer(unittest.TestCase):
         self.assertEqual(self.lh.p300_multi.dispense.call_count, 1 + 8)
         self.assertEqual(self.lh.p300_multi.aspirate.call_count, 2)
 
+    def test_transfer_groups_by_shared_well(self):
+        reservoir_wells = self.mock_reservoir.wells()
+
+        # Three operations share a source well and two operations share a destination well
+        self.lh.transfer(
+            volumes=[50] * 5,
+            source_wells=[reservoir_wells[0]] * 3 + [reservoir_wells[1], reservoir_wells[2]],
+            destination_wells=self.dest_wells[:3] + [self.dest_wells[95]] * 2,
+            new_tip="once",
+            overhead_liquid=False,
+            add_air_gap=False,
+        )
+
+        # Single aspirate, multi-dispense and multi-aspirate, single dispense
+        self.assertEqual(self.lh.p300_multi.aspirate.call_count, 1 + 2)
+        self.assertEqual(self.lh.p300_multi.dispense.call_count, 3 + 1)
+
+    def test_transfer_optimal_volley_packing(self):
+        volumes = [100, 100, 100, 200, 200, 200]
+        for volley_packing, aspirations in [("greedy", 4), ("optimal", 3)]:
+            self.lh.p300_multi.reset_mock()
+            self.lh.transfer(
+                volumes=volumes,
+                source_wells=self.source_well,
+                destination_wells=self.dest_wells[:6],
+                new_tip="once",
+                overhead_liquid=False,
+                add_air_gap=False,
+                volley_packing=volley_packing,
+            )
+            self.assertEqual(self.lh.p300_multi.aspirate.call_count, aspirations)
+            self.assertEqual(self.lh.p300_multi.dispense.call_count, 6)
+
+    def test_transfer_invalid_volley_packing(self):
+        with self.assertRaises(ValueError):
+            self.lh.transfer(
+                volumes=[50],
+                source_wells=self.source_well,
+                destination_wells=self.dest_wells[:1],
+                volley_packing="best",
+            )
+
+    def test_transfer_optimize_path(self):
+        plate = self.mock_labware
+        columns = ["1", "11", "2", "12"]
+
+        self.lh.transfer(
+            volumes=[50] * 4,
+            source_wells=[plate["A" + column] for column in columns],
+            destination_wells=[plate["B" + column] for column in columns],
+            new_tip="once",
+            optimize_path=True,
+        )
+
+        # The operations are ordered by distance rather than by well name
+        aspirated_wells = [
+            call.kwargs["location"] for call in self.lh.p300_multi.aspirate.call_args_list
+        ]
+        self.assertEqual(aspirated_wells, [plate["A" + column] for column in ["1", "2", "11", "12"]])
+        self.assertGreater(self.lh.travel_report.saved_distance, 0)
+
     def test_transfer_order_of_operations(self):
         volumes = [5, 2, 7, 17, 12, 15, 1, 9]
         source_well = self.mock_reservoir.wells()[0]
@@ -2432,6 +2495,59 @@ class TestFailedOperationsReporting(unittest.TestCase):
         self.assertEqual(failed_ops[3][3], 3)
         self.assertEqual(failed_ops[3][4], "out_of_tips")
 
+    def test_out_of_tips_reporting_multichannel(self):
+        lh = LiquidHandler(simulation=True, load_default=False)
+        reservoir = lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+        second_reservoir = lh.load_labware("nest_12_reservoir_15ml", 5, "second reservoir")
+
+        # Sixteen operations are allocated to two multichannel operations
+        source_wells = [reservoir.wells()[0]] * 16
+        dest_wells = [second_reservoir.wells()[1]] * 16
+
+        failed_ops = lh.transfer(
+            volumes=[50] * 16,
+            source_wells=source_wells,
+            destination_wells=dest_wells,
+        )
+
+        # Every operation covered by the multichannel operations is reported
+        self.assertEqual([op[3] for op in failed_ops], list(range(16)))
+        for source, dest, volume, idx, reason in failed_ops:
+            self.assertEqual(source, source_wells[idx])
+            self.assertEqual(dest, dest_wells[idx])
+            self.assertEqual(volume, 50)
+            self.assertEqual(reason, "out_of_tips")
+
+    def test_failed_operations_original_indexes(self):
+        lh = LiquidHandler(simulation=True, load_default=False)
+        source_plate = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "source plate")
+        second_plate = lh.load_labware("nest_96_wellplate_2ml_deep", 5, "second plate")
+        dest_plate = lh.load_labware("nest_96_wellplate_2ml_deep", 3, "destination plate")
+
+        # Operations on two source labware, one of them split into several operations
+        volumes = [25, 600, 30, 15]
+        source_wells = [
+            source_plate.wells()[0],
+            second_plate.wells()[0],
+            source_plate.wells()[1],
+            second_plate.wells()[1],
+        ]
+        dest_wells = dest_plate.wells()[:4]
+
+        failed_ops = lh.transfer(
+            volumes=volumes,
+            source_wells=source_wells,
+            destination_wells=dest_wells,
+        )
+
+        # Indexes refer to the operations passed to transfer
+        self.assertEqual([op[3] for op in failed_ops], [0, 1, 1, 1, 2, 3])
+        for source, dest, volume, idx, reason in failed_ops:
+            self.assertEqual(source, source_wells[idx])
+            self.assertEqual(dest, dest_wells[idx])
+            self.assertEqual(reason, "out_of_tips")
+        self.assertEqual(sum(op[2] for op in failed_ops if op[3] == 1), 600)
+
     def test_pipette_error_reporting(self):
         # Mock a pipette error during operation
         def raise_error(*args, **kwargs):
@@ -0,0 +1,86 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from ot_handler.log import configure_logging, stop_logging
+
+
+class TestLogging(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(stop_logging)
+        self.filename = os.path.join(self.directory.name, "ot_handler.log")
+        self.logger = logging.getLogger("ot_handler.liquid_handler")
+        self.level = logging.getLogger("ot_handler").level
+        self.addCleanup(logging.getLogger("ot_handler").setLevel, self.level)
+
+    def read_log(self, filename=None):
+        with open(filename or self.filename) as f:
+            return f.read()
+
+    def test_no_root_handlers(self):
+        code = (
+            "import logging\n"
+            "from ot_handler import LiquidHandler\n"
+            "LiquidHandler(simulation=True, load_default=False)\n"
+            "print(logging.getLogger().handlers)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.splitlines()[-1], "[]")
+
+    def test_messages_are_written_by_listener(self):
+        configure_logging(self.filename)
+        self.logger.debug("Transfer called with new tip: %s", "once")
+        try:
+            raise ValueError("pipette error")
+        except ValueError:
+            self.logger.exception("Error during aspiration/dispense")
+        stop_logging()
+
+        log = self.read_log()
+        self.assertIn("DEBUG - Transfer called with new tip: once", log)
+        self.assertIn("ValueError: pipette error", log)
+
+    def test_formatting_is_deferred(self):
+        formatting_threads = []
+
+        class Argument:
+            def __str__(self):
+                formatting_threads.append(threading.current_thread())
+                return "argument"
+
+        # Handlers of the root logger, such as the one of the test runner, format in this thread
+        parent = logging.getLogger("ot_handler")
+        parent.propagate = False
+        self.addCleanup(setattr, parent, "propagate", True)
+
+        configure_logging(self.filename, level=logging.INFO)
+        self.logger.debug("Not logged %s", Argument())
+        self.logger.info("Logged %s", Argument())
+        stop_logging()
+
+        self.assertTrue(formatting_threads)
+        self.assertNotIn(threading.current_thread(), formatting_threads)
+        self.assertIn("INFO - Logged argument", self.read_log())
+
+    def test_rollover_on_configure(self):
+        configure_logging(self.filename)
+        self.logger.info("First run")
+        configure_logging(self.filename)
+        self.logger.info("Second run")
+        stop_logging()
+
+        self.assertNotIn("First run", self.read_log())
+        self.assertIn("First run", self.read_log(self.filename + ".1"))
+        self.assertIn("Second run", self.read_log())
+
+
+if __name__ == "__main__":
+    unittest.main()
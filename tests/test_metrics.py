@@ -0,0 +1,105 @@
+import unittest
+import urllib.request
+
+from ot_handler import LiquidHandler
+from ot_handler.metrics import Counter, Histogram, LiquidHandlerMetrics, MetricsServer
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        updates = []
+        hooks = [lambda *update: updates.append(update)]
+        counter = Counter("tips_total", "Tips.", ("pipette",), hooks)
+        counter.inc(pipette="p20")
+        counter.inc(8, pipette="p300_multi")
+
+        self.assertEqual(counter.value(pipette="p300_multi"), 8)
+        self.assertEqual(updates[1], ("tips_total", 8, {"pipette": "p300_multi"}))
+        with self.assertRaises(ValueError):
+            counter.inc(-1, pipette="p20")
+        with self.assertRaises(ValueError):
+            counter.inc(reason="out_of_tips")
+
+    def test_histogram(self):
+        histogram = Histogram("latency_seconds", "Latency.", (1, 10))
+        for value in (0.5, 5, 5, 50):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count(), 4)
+        self.assertEqual(
+            [(name, dict(labels).get("le"), value) for name, labels, value in histogram.samples()],
+            [
+                ("latency_seconds_bucket", 1, 1),
+                ("latency_seconds_bucket", 10, 3),
+                ("latency_seconds_bucket", float("inf"), 4),
+                ("latency_seconds_sum", None, 60.5),
+                ("latency_seconds_count", None, 4),
+            ],
+        )
+
+    def test_render(self):
+        metrics = LiquidHandlerMetrics(latency_buckets=(1,))
+        metrics.record_failed_operations(
+            [[None, None, 5, 0, "volume_too_low"], [None, None, 50, 1, "pipette_error: clogged"]]
+        )
+        with metrics.time_transfer():
+            with metrics.time_transfer():
+                pass
+        text = metrics.render()
+
+        self.assertIn("# TYPE ot_handler_failed_operations_total counter", text)
+        self.assertIn('ot_handler_failed_operations_total{reason="pipette_error"} 1', text)
+        self.assertIn('ot_handler_transfer_duration_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("ot_handler_transfer_duration_seconds_count 1", text)
+
+    def test_server(self):
+        metrics = LiquidHandlerMetrics()
+        metrics.retention_time.inc(3)
+        server = MetricsServer(metrics, port=0).start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                text = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn("ot_handler_retention_seconds_total 3", text)
+
+
+class TestLiquidHandlerMetrics(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False, metrics=True)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 4, single_channel=True)
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+
+    def test_transfer_metrics(self):
+        failed = self.lh.transfer(
+            [50] * 8 + [1, 50],
+            self.plate.columns()[0] + [self.plate["A5"], self.plate["B5"]],
+            self.plate.columns()[1] + [self.plate["A6"], self.plate["B6"]],
+            retention_time=2,
+        )
+        metrics = self.lh.metrics
+
+        self.assertEqual([operation[4] for operation in failed], ["volume_too_low"])
+        self.assertIsNone(self.lh.trace)
+        self.assertEqual(metrics.tips_consumed.value(pipette="p300_multi"), 9)
+        self.assertEqual(metrics.aspirations.value(pipette="p300_multi"), 2)
+        self.assertEqual(metrics.dispenses.value(pipette="p300_multi"), 2)
+        self.assertEqual(metrics.volume_dispensed.value(pipette="p300_multi"), 8 * 50 + 50)
+        self.assertEqual(metrics.failed_operations.value(reason="volume_too_low"), 1)
+        self.assertEqual(metrics.retention_time.value(), 4 * 2)
+        self.assertEqual(metrics.transfer_latency.count(), 1)
+
+    def test_metrics_and_trace(self):
+        lh = LiquidHandler(simulation=True, load_default=False, trace=True, metrics=True)
+        lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        plate = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        lh.transfer(50, plate.columns()[0], plate.columns()[1])
+
+        self.assertEqual(lh.metrics.dispenses.value(pipette="p300_multi"), 1)
+        self.assertEqual(len([e for e in lh.trace if e.action == "dispense"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from ot_handler.operation_table import OperationTable
+
+
+def make_labware(name, rows=8, columns=12):
+    labware = SimpleNamespace(name=name)
+    labware.wells = [
+        SimpleNamespace(well_name=f"{chr(ord('A') + row)}{column + 1}", parent=labware)
+        for column in range(columns)
+        for row in range(rows)
+    ]
+    return labware
+
+
+def split_sequentially(volumes, max_volume, min_volume):
+    # The splitting loop previously used by LiquidHandler.transfer
+    new_volumes = []
+    indexes = []
+    for i, volume in enumerate(volumes):
+        while volume > max_volume:
+            if volume > max_volume + min_volume:
+                new_volumes.append(max_volume)
+                indexes.append(i)
+                volume -= max_volume
+            else:
+                new_volumes += [volume / 2, volume / 2]
+                indexes += [i, i]
+                volume = 0
+        if volume > 0:
+            new_volumes.append(volume)
+            indexes.append(i)
+    return new_volumes, indexes
+
+
+class TestOperationTable(unittest.TestCase):
+    def setUp(self):
+        self.plate = make_labware("plate")
+        self.second_plate = make_labware("second plate")
+        self.trash = SimpleNamespace(name="trash")
+
+    def test_coordinates(self):
+        table = OperationTable(
+            [self.plate.wells[0], self.plate.wells[13]],
+            [self.second_plate.wells[95], self.trash],
+            [10, 20],
+        )
+        self.assertEqual(table.source_rows.tolist(), [0, 5])
+        self.assertEqual(table.source_columns.tolist(), [0, 1])
+        self.assertEqual(table.destination_rows.tolist(), [7, 0])
+        self.assertEqual(table.destination_columns.tolist(), [11, 0])
+        self.assertEqual(table.destination_names, ["H12", "A1"])
+        self.assertEqual(table.destination_labware, [self.second_plate, self.trash])
+
+    def test_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            OperationTable(self.plate.wells[:2], self.plate.wells[:3], [10, 20])
+
+    def test_split_volumes_matches_sequential_splitting(self):
+        random.seed(7)
+        volumes = [random.choice([0, 5, 260, 270, 281, 520, 530, 1200]) for _ in range(200)]
+        volumes += [random.uniform(0, 2000) for _ in range(200)]
+        wells = [random.choice(self.plate.wells) for _ in volumes]
+
+        table = OperationTable(wells, wells, volumes).split_volumes(260, 20)
+        expected_volumes, expected_indexes = split_sequentially(volumes, 260, 20)
+
+        self.assertEqual(table.volumes.tolist(), expected_volumes)
+        self.assertEqual(table.original_indexes.tolist(), expected_indexes)
+        self.assertEqual(table.source_wells, [wells[i] for i in expected_indexes])
+
+    def test_labware_groups(self):
+        source_wells = [self.plate.wells[0], self.second_plate.wells[0], self.plate.wells[1]]
+        destination_wells = [self.trash, self.plate.wells[5], self.second_plate.wells[2]]
+        table = OperationTable(source_wells, destination_wells, [10, 20, 30])
+
+        groups = [group.tolist() for group in table.labware_groups()]
+        self.assertEqual(groups, [[0], [2], [1]])
+
+        subset = table.take(groups[1])
+        self.assertEqual(subset.source_labware, [self.plate])
+        self.assertEqual(subset.destination_labware, [self.second_plate])
+        self.assertEqual(subset.destination_labware_ids.tolist(), [0])
+        self.assertEqual(len(subset.labware_groups()), 1)
+
+
+    def test_dependency_stages(self):
+        wells = {well.well_name: well for well in self.plate.wells}
+        operations = [
+            ("A1", "A2"),
+            ("A2", "A3"),  # Reads A2 after it is written
+            ("B1", "B2"),
+            ("C1", "A2"),  # Adds to A2, but only after A2 has been read
+            ("B2", "B3"),
+            ("D1", "B3"),  # Adds to B3 independently of the other addition
+        ]
+        table = OperationTable(
+            [wells[source] for source, _ in operations],
+            [wells[destination] for _, destination in operations],
+            [10] * len(operations),
+        )
+
+        stages = [stage.tolist() for stage in table.dependency_stages()]
+        self.assertEqual(stages, [[0, 2, 5], [1, 4], [3]])
+        self.assertEqual(len(OperationTable([], [], []).dependency_stages()), 0)
+
+    def test_serial_dilution_stages(self):
+        # Row by row, as a serial dilution is usually written
+        source_wells = []
+        destination_wells = []
+        for row in range(8):
+            for column in range(11):
+                source_wells.append(self.plate.wells[column * 8 + row])
+                destination_wells.append(self.plate.wells[(column + 1) * 8 + row])
+        table = OperationTable(source_wells, destination_wells, [50] * len(source_wells))
+
+        stages = table.dependency_stages()
+        self.assertEqual(len(stages), 11)
+        for column, stage in enumerate(stages):
+            self.assertEqual(table.source_columns[stage].tolist(), [column] * 8)
+            self.assertEqual(table.source_rows[stage].tolist(), list(range(8)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import itertools
+import random
+import unittest
+
+from ot_handler.packing import pack_volumes
+
+
+class TestPackVolumes(unittest.TestCase):
+    def assertValidPacking(self, volleys, volumes, capacity):
+        self.assertEqual(sorted(itertools.chain(*volleys)), list(range(len(volumes))))
+        for volley in volleys:
+            self.assertLessEqual(sum(volumes[i] for i in volley), capacity)
+
+    def test_greedy_fills_in_order(self):
+        volumes = [100, 100, 100, 200, 200, 200]
+        self.assertEqual(pack_volumes(volumes, 300), [[0, 1, 2], [3], [4], [5]])
+
+    def test_optimal_minimizes_volleys(self):
+        volumes = [100, 100, 100, 200, 200, 200]
+        volleys = pack_volumes(volumes, 300, "optimal")
+        self.assertValidPacking(volleys, volumes, 300)
+        self.assertEqual(len(volleys), 3)
+
+    def test_optimal_never_worse_than_greedy(self):
+        random.seed(5)
+        for size in [2, 5, 8, 12, 30]:
+            volumes = sorted(random.uniform(20, 280) for _ in range(size))
+            greedy = pack_volumes(volumes, 280)
+            optimal = pack_volumes(volumes, 280, "optimal")
+            self.assertValidPacking(optimal, volumes, 280)
+            self.assertLessEqual(len(optimal), len(greedy))
+
+    def test_exact_packing_beats_first_fit_decreasing(self):
+        # First-fit-decreasing needs three volleys: [40, 40], [30, 30, 30], [30]
+        volumes = [30, 30, 30, 30, 40, 40]
+        volleys = pack_volumes(volumes, 100, "optimal")
+        self.assertValidPacking(volleys, volumes, 100)
+        self.assertEqual(len(volleys), 2)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            pack_volumes([10], 300, "best")
+        with self.assertRaises(ValueError):
+            pack_volumes([310], 300)
+        self.assertEqual(pack_volumes([], 300, "optimal"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
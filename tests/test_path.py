@@ -0,0 +1,64 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from ot_handler.path import order_operation_sets, order_points, path_length, well_point
+
+
+def make_well(x, y):
+    return SimpleNamespace(top=lambda: SimpleNamespace(point=SimpleNamespace(x=x, y=y, z=0)))
+
+
+class TestPathOrdering(unittest.TestCase):
+    def test_well_point(self):
+        self.assertEqual(well_point(make_well(1, 2)), (1, 2))
+        self.assertIsNone(well_point(SimpleNamespace()))
+
+    def test_order_points_on_a_line(self):
+        points = [(x, 0) for x in [5, 1, 4, 2, 3]]
+        order = order_points(points, start=(0, 0))
+        self.assertEqual([points[i][0] for i in order], [1, 2, 3, 4, 5])
+
+    def test_two_opt_improves_nearest_neighbour(self):
+        random.seed(3)
+        points = [(random.uniform(0, 100), random.uniform(0, 100)) for _ in range(40)]
+        order = order_points(points, start=(0, 0))
+        self.assertEqual(sorted(order), list(range(40)))
+        self.assertLess(
+            path_length([(0, 0)] + [points[i] for i in order]),
+            path_length([(0, 0)] + points),
+        )
+
+    def test_order_operation_sets(self):
+        source = make_well(0, 0)
+        wells = {x: make_well(x, 0) for x in range(1, 7)}
+        operation_sets = [
+            [[source, wells[x], 10, x] for x in [6, 4]],
+            [[source, wells[x], 10, x] for x in [3, 1, 2]],
+            [[source, wells[5], 10, 5]],
+        ]
+
+        ordered_sets, default_distance, optimized_distance = order_operation_sets(
+            operation_sets, 0, True, well_point
+        )
+
+        self.assertEqual([[op[3] for op in s] for s in ordered_sets], [[4, 6], [1, 2, 3], [5]])
+        # 0-6-4-0-3-1-2-0-5 in the given order and 0-4-6-0-1-2-3-0-5 after ordering
+        self.assertEqual(default_distance, 25)
+        self.assertEqual(optimized_distance, 23)
+
+    def test_shared_destination_is_visited_last(self):
+        destination = make_well(0, 0)
+        operation_sets = [[[make_well(x, 0), destination, 10, x] for x in [1, 3, 2]]]
+
+        ordered_sets, default_distance, optimized_distance = order_operation_sets(
+            operation_sets, 1, False, well_point
+        )
+
+        self.assertEqual([op[3] for op in ordered_sets[0]], [3, 2, 1])
+        self.assertEqual(optimized_distance, 3)
+        self.assertLess(optimized_distance, default_distance)
+
+
+if __name__ == "__main__":
+    unittest.main()
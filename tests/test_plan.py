@@ -0,0 +1,253 @@
+import dataclasses
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from ot_handler import LiquidHandler
+from ot_handler.plan import TransferPlan
+
+
+class TestTransferPlan(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+        self.lh.p300_tips.append(
+            self.lh.protocol_api.load_labware("opentrons_96_tiprack_300ul", "7")
+        )
+        self.lh.single_p300_tips.append(
+            self.lh.protocol_api.load_labware("opentrons_96_tiprack_300ul", "6")
+        )
+        self.lh.single_p20_tips.append(
+            self.lh.protocol_api.load_labware("opentrons_96_tiprack_20ul", "11")
+        )
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        self.reservoir = self.lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+
+    def pipette_commands(self):
+        # Commands sent to the pipettes, without reading their state
+        return [
+            call
+            for call in self.lh.p300_multi.mock_calls + self.lh.p20.mock_calls
+            if not call[0].startswith(("has_tip", "current_volume"))
+        ]
+
+    def mock_pipettes(self):
+        self.lh.p300_multi = MagicMock()
+        self.lh.p20 = MagicMock()
+        self.lh.p20.min_volume = 1
+        self.lh.p20.max_volume = 20
+        self.lh.p300_multi.min_volume = 20
+        self.lh.p300_multi.max_volume = 300
+
+    def test_plan_steps(self):
+        plan = self.lh.plan_transfer(
+            volumes=[50] * 8,
+            source_wells=self.plate.columns()[0],
+            destination_wells=self.plate.columns()[1],
+            add_air_gap=False,
+        )
+
+        self.assertIsInstance(plan, TransferPlan)
+        self.assertEqual(
+            [step.action for step in plan.steps],
+            ["pick_up_tip", "aspirate", "dispense", "blow_out", "drop_tip"],
+        )
+        self.assertTrue(all(step.pipette == "p300_multi" for step in plan.steps))
+        self.assertFalse(any(step.single_channel for step in plan.steps))
+        self.assertEqual(plan.steps[1].location, self.plate["A1"])
+        self.assertEqual(plan.steps[1].volume, 50 + 20)  # Overhead liquid
+        self.assertEqual(plan.steps[2].location, self.plate["A2"])
+        # Planning does not move the robot
+        self.assertFalse(self.lh.p300_multi.has_tip)
+
+    def test_plan_single_channel_steps(self):
+        plan = self.lh.plan_transfer(
+            volumes=[5, 50],
+            source_wells=self.reservoir["A1"],
+            destination_wells=[self.plate["A1"], self.plate["B1"]],
+        )
+
+        pipettes = [
+            (step.pipette, step.single_channel)
+            for step in plan.steps
+            if step.action == "dispense"
+        ]
+        self.assertEqual(pipettes, [("p300_multi", True), ("p20", True)])
+        self.assertIn("configure_nozzles", [step.action for step in plan.steps])
+
+    def test_plan_is_immutable(self):
+        plan = self.lh.plan_transfer(50, self.reservoir["A1"], self.plate.wells()[:3])
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            plan.new_tip = "always"
+
+    def test_execute_matches_transfer(self):
+        self.mock_pipettes()
+        arguments = {
+            "volumes": [5, 15, 50, 120, 400] * 4,
+            "source_wells": [self.reservoir["A1"], self.reservoir["A2"]] * 10,
+            "destination_wells": self.plate.wells()[:20],
+            "new_tip": "once",
+        }
+
+        plan = self.lh.plan_transfer(**arguments)
+        self.lh.p300_multi.aspirate.assert_not_called()
+        self.lh.execute(plan)
+        self.lh.execute(plan)
+        executed_calls = self.pipette_commands()
+        # Both runs start with all nozzles
+        self.lh.drop_tips()
+        self.mock_pipettes()
+        self.lh.transfer(**arguments)
+        self.lh.transfer(**arguments)
+        transferred_calls = self.pipette_commands()
+
+        self.assertEqual(executed_calls, transferred_calls)
+
+    def test_plan_starts_in_current_layout(self):
+        arguments = {
+            "volumes": 50,
+            "source_wells": self.plate.columns()[0] + [self.plate["A5"]],
+            "destination_wells": self.plate.columns()[1] + [self.plate["A6"]],
+        }
+        plan = self.lh.plan_transfer(**arguments)
+        self.assertFalse(plan.steps[0].single_channel)
+        # The p300_multi is set back to all nozzles at the end
+        self.assertEqual(plan.steps[-1].action, "configure_nozzles")
+
+        self.lh.keep_nozzle_layout = True
+        self.lh._set_nozzle_layout(1)
+        plan = self.lh.plan_transfer(**arguments)
+        configurations = [step.single_channel for step in plan.steps if step.pipette]
+        self.assertTrue(configurations[0])
+        self.assertEqual(
+            [step.action for step in plan.steps].count("configure_nozzles"), 1
+        )
+
+        self.lh.drop_tips()
+        self.assertEqual(self.lh.p300_channels, 8)
+        self.assertFalse(self.lh.single_tip_mode)
+
+    def test_mix_restores_all_nozzles(self):
+        self.lh.mix([self.plate["A1"]], repetitions=2, volume=50)
+        self.assertEqual(self.lh.p300_channels, 8)
+
+        self.lh.keep_nozzle_layout = True
+        self.lh.mix([self.plate["A1"]], repetitions=2, volume=50)
+        self.assertEqual(self.lh.p300_channels, 1)
+
+    def test_partial_columns(self):
+        # The tip rack in slot 6 is behind the plate
+        front_plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 3, "front")
+        arguments = {
+            "volumes": 50,
+            "source_wells": front_plate.columns()[0][4:],
+            "destination_wells": front_plate.columns()[1][4:],
+        }
+        plan = self.lh.plan_transfer(**arguments)
+        self.assertNotIn("p300_partial4", [p.name for p in plan.pipette_plans if p.indexes])
+
+        plan = self.lh.plan_transfer(partial_columns=True, **arguments)
+        self.assertEqual([p.name for p in plan.pipette_plans if p.indexes], ["p300_partial4"])
+        pick_up = next(step for step in plan.steps if step.action == "pick_up_tip")
+        self.assertEqual(pick_up.channels, 4)
+        aspirate = next(step for step in plan.steps if step.action == "aspirate")
+        self.assertEqual(aspirate.location, front_plate["H1"])
+        self.assertEqual(self.lh._tip_budget(plan.steps).required["p300_multi"], 1)
+
+        # The back rows are only reachable by partial columns if the slot behind is free
+        plan = self.lh.plan_transfer(
+            50, front_plate.columns()[0][:4], front_plate.columns()[1][:4], partial_columns=True
+        )
+        self.assertNotIn("p300_partial4", [p.name for p in plan.pipette_plans if p.indexes])
+        plan = self.lh.plan_transfer(
+            50, self.plate.columns()[0][:4], self.plate.columns()[1][:4], partial_columns=True
+        )
+        self.assertEqual([p.name for p in plan.pipette_plans if p.indexes], ["p300_partial4"])
+
+        failed = self.lh.transfer(partial_columns=True, **arguments)
+        self.assertEqual(failed, [])
+        # The p300_multi is set back to all nozzles at the end of the transfer
+        self.assertEqual(self.lh.p300_channels, 8)
+
+        # With keep_nozzle_layout, the layout is kept for the next call until the tips are dropped
+        self.lh.keep_nozzle_layout = True
+        self.lh.transfer(partial_columns=True, **arguments)
+        self.assertEqual(self.lh.p300_channels, 4)
+        self.lh.drop_tips()
+        self.assertEqual(self.lh.p300_channels, 8)
+
+    def test_serial_dilution(self):
+        source_wells = [self.plate.rows()[row][column] for row in range(8) for column in range(11)]
+        destination_wells = [
+            self.plate.rows()[row][column + 1] for row in range(8) for column in range(11)
+        ]
+        plan = self.lh.plan_transfer(
+            50, source_wells, destination_wells, new_tip="always", mix_after=(3, 40)
+        )
+
+        # One multichannel stage per column, in the order of the dilution
+        self.assertEqual(len(plan.groups), 11)
+        dispenses = [step for step in plan.steps if step.action == "dispense"]
+        self.assertEqual([step.location for step in dispenses], self.plate.rows()[0][1:])
+        self.assertFalse(any(step.single_channel for step in dispenses))
+
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 8)
+        self.assertEqual(self.lh.execute(plan), [])
+
+    def test_serial_dilution_with_one_tip(self):
+        source_wells = [self.plate.rows()[row][column] for row in range(8) for column in range(2)]
+        destination_wells = [
+            self.plate.rows()[row][column + 1] for row in range(8) for column in range(2)
+        ]
+        plan = self.lh.plan_transfer(50, source_wells, destination_wells, new_tip="once")
+
+        # The tip is carried across the stages and dropped after the last one
+        actions = [step.action for step in plan.steps if step.action.endswith("_tip")]
+        self.assertEqual(actions, ["pick_up_tip", "drop_tip"])
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 8)
+        self.assertEqual(self.lh.transfer(50, source_wells, destination_wells, new_tip="once"), [])
+        self.assertFalse(self.lh.p300_multi.has_tip)
+
+    def test_serialization(self):
+        second_plate = self.lh.load_labware("nest_96_wellplate_2ml_deep", 5, "second plate")
+        plan = self.lh.plan_transfer(
+            volumes=[5, 50, 500, 30],
+            source_wells=[
+                self.reservoir["A1"],
+                self.reservoir["A1"],
+                second_plate["B1"],
+                second_plate["C1"],
+            ],
+            destination_wells=[self.plate["A1"], self.plate["B1"], self.plate["D1"], self.lh.trash],
+        )
+        self.assertEqual(len(plan.groups), 3)
+
+        data = json.loads(json.dumps(plan.to_dict()))
+        loaded_plan = self.lh.load_plan(data)
+
+        self.assertEqual(loaded_plan.to_dict(), plan.to_dict())
+        self.assertEqual(
+            loaded_plan.groups[0][1].destination_wells, plan.groups[0][1].destination_wells
+        )
+        self.assertIs(loaded_plan.groups[2][1].destination_wells[0], self.lh.trash)
+
+    def test_failed_operations_of_executed_plan(self):
+        # No tips are loaded
+        lh = LiquidHandler(simulation=True, load_default=False)
+        plate = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        reservoir = lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+
+        plan = lh.plan_transfer(
+            volumes=[0.5, 50, 600],
+            source_wells=reservoir["A1"],
+            destination_wells=plate.wells()[:3],
+        )
+        failed_ops = lh.execute(plan)
+
+        self.assertEqual(
+            [(op[3], op[4]) for op in failed_ops],
+            [(0, "volume_too_low"), (1, "out_of_tips")] + [(2, "out_of_tips")] * 3,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ot_handler import LiquidHandler
+from ot_handler.plan_cache import PlanCache
+
+
+class TestPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_round_trip(self):
+        cache = PlanCache(self.directory.name)
+        key = cache.key([1, 2], {"new_tip": "once"})
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {"volumes": [1, 2]})
+
+        self.assertIn(key, cache)
+        self.assertEqual(cache.get(key), {"volumes": [1, 2]})
+        self.assertEqual(len(cache), 1)
+
+    def test_key_is_content_addressed(self):
+        self.assertEqual(PlanCache.key({"a": 1, "b": 2}), PlanCache.key({"b": 2, "a": 1}))
+        self.assertNotEqual(PlanCache.key([1, 2]), PlanCache.key([2, 1]))
+
+    def test_evict_least_recently_used(self):
+        cache = PlanCache(self.directory.name, max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        # Reading refreshes the entry
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_evict_by_size(self):
+        cache = PlanCache(self.directory.name, max_bytes=250)
+        for key in ["a", "b", "c"]:
+            cache.put(key, "x" * 100)
+
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("a", cache)
+
+    def test_unreadable_entry(self):
+        cache = PlanCache(self.directory.name)
+        with open(os.path.join(self.directory.name, "a.plan.json"), "w") as f:
+            f.write("{")
+
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(cache.get("a"))
+        self.assertNotIn("a", cache)
+
+    def test_clear(self):
+        cache = PlanCache(self.directory.name)
+        cache.put("a", 1)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestTransferPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def liquid_handler(self):
+        lh = LiquidHandler(simulation=True, load_default=False, plan_cache=self.directory.name)
+        lh.p300_tips.append(lh.protocol_api.load_labware("opentrons_96_tiprack_300ul", "7"))
+        lh.single_p20_tips.append(lh.protocol_api.load_labware("opentrons_96_tiprack_20ul", "11"))
+        plate = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        return lh, plate
+
+    def test_transfer_uses_cached_plan(self):
+        lh, plate = self.liquid_handler()
+        with patch.object(lh, "_plan_operations", wraps=lh._plan_operations) as plan_operations:
+            lh.transfer([50, 5, 80], plate["A1"], plate.wells()[8:11])
+            lh.transfer([50, 5, 80], plate["A1"], plate.wells()[8:11])
+            self.assertEqual(plan_operations.call_count, 1)
+
+            lh.transfer([50, 5, 70], plate["A1"], plate.wells()[8:11])
+            self.assertEqual(plan_operations.call_count, 2)
+        self.assertEqual(len(lh.plan_cache), 2)
+
+    def test_transfer_across_labware_uses_cached_plan(self):
+        lh, plate = self.liquid_handler()
+        reservoir = lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+        arguments = ([50, 5, 80], [plate["A1"], reservoir["A1"], plate["A1"]], plate.wells()[8:11])
+
+        with patch.object(lh, "_plan_operations", wraps=lh._plan_operations) as plan_operations:
+            lh.transfer(*arguments)
+            # The whole transfer and its group for each labware
+            self.assertEqual(plan_operations.call_count, 3)
+            lh.transfer(*arguments)
+            self.assertEqual(plan_operations.call_count, 3)
+        self.assertEqual(len(lh.plan_cache), 1)
+
+    def test_cached_plan_matches_planned(self):
+        lh, plate = self.liquid_handler()
+        plan = lh.plan_transfer([50, 5, 80], plate["A1"], plate.wells()[8:11])
+
+        # A new session with the same deck loads the plan from the cache
+        lh, plate = self.liquid_handler()
+        with patch.object(lh, "_plan_operations") as plan_operations:
+            cached_plan = lh.plan_transfer([50, 5, 80], plate["A1"], plate.wells()[8:11])
+            plan_operations.assert_not_called()
+        self.assertEqual(cached_plan.to_dict(), plan.to_dict())
+
+    def test_deck_change_invalidates_plan(self):
+        lh, plate = self.liquid_handler()
+        lh.plan_transfer(50, plate["A1"], plate.wells()[8:11])
+        lh.load_labware("nest_12_reservoir_15ml", 2, "reservoir")
+
+        with patch.object(lh, "_plan_operations", wraps=lh._plan_operations) as plan_operations:
+            lh.plan_transfer(50, plate["A1"], plate.wells()[8:11])
+            plan_operations.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
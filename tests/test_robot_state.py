@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from ot_handler import LiquidHandler
+from ot_handler.robot_state import RobotState
+
+
+class TestRobotState(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "state.json")
+
+    def test_no_state(self):
+        state = RobotState(self.path)
+        self.assertEqual(state.load(), {})
+        self.assertFalse(state.position_trusted())
+
+    def test_trusted_state(self):
+        state = RobotState(self.path)
+        state.save(position_trusted=True)
+        self.assertTrue(state.position_trusted())
+
+        state.save(position_trusted=False)
+        self.assertFalse(state.position_trusted())
+
+    def test_restart_loses_trust(self):
+        state = RobotState(self.path)
+        with patch("ot_handler.robot_state.boot_id", return_value="first"):
+            state.save(position_trusted=True)
+            self.assertTrue(state.position_trusted())
+        with patch("ot_handler.robot_state.boot_id", return_value="second"):
+            self.assertFalse(state.position_trusted())
+
+    def test_max_age(self):
+        RobotState(self.path).save(position_trusted=True)
+        with patch("time.time", return_value=time.time() + 3600):
+            self.assertTrue(RobotState(self.path).position_trusted())
+            self.assertFalse(RobotState(self.path, max_age=60).position_trusted())
+
+    def test_unreadable_state(self):
+        with open(self.path, "w") as f:
+            f.write("{")
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(RobotState(self.path).position_trusted())
+
+
+class TestWarmStart(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "state.json")
+
+    def liquid_handler(self):
+        return LiquidHandler(
+            simulation=True, load_default=False, warm_start=True, state_file=self.path
+        )
+
+    def test_homes_only_without_trusted_state(self):
+        with patch.object(LiquidHandler, "home") as home:
+            lh = self.liquid_handler()
+            home.assert_called_once()
+            with open(self.path) as f:
+                self.assertFalse(json.load(f)["position_trusted"])
+
+            # The session ends cleanly
+            lh.__del__()
+            self.liquid_handler()
+            home.assert_called_once()
+
+    def test_unclean_session_homes(self):
+        with patch.object(LiquidHandler, "home") as home:
+            first = self.liquid_handler()
+            # The first session has not ended
+            second = self.liquid_handler()
+            self.assertEqual(home.call_count, 2)
+            self.assertIsNot(first, second)
+
+    def test_cleanup_drops_tips_without_homing(self):
+        lh = self.liquid_handler()
+        lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        lh.p300_multi.pick_up_tip()
+
+        with patch.object(lh.protocol_api, "home") as home:
+            lh.__del__()
+            home.assert_not_called()
+        self.assertFalse(lh.p300_multi.has_tip)
+        self.assertTrue(RobotState(self.path, simulation=True).position_trusted())
+
+    def test_simulation_is_not_trusted_on_the_robot(self):
+        lh = self.liquid_handler()
+        lh.__del__()
+
+        self.assertTrue(RobotState(self.path, simulation=True).position_trusted())
+        # A session on the robot homes after a simulated session
+        self.assertFalse(RobotState(self.path).position_trusted())
+
+    def test_robot_state_is_not_trusted_in_simulation(self):
+        RobotState(self.path).save(position_trusted=True, latch_closed=True)
+        with patch.object(LiquidHandler, "home") as home:
+            self.liquid_handler()
+            home.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
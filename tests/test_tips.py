@@ -0,0 +1,243 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ot_handler import LiquidHandler
+from ot_handler.plan import PlanStep
+from ot_handler.tips import InsufficientTipsError, TipBudget, count_required_tips
+
+
+class TestTipAccounting(unittest.TestCase):
+    def test_count_required_tips(self):
+        steps = [
+            PlanStep("pick_up_tip", "p300_multi", False),
+            PlanStep("aspirate", "p300_multi", False),
+            PlanStep("pick_up_tip", "p300_multi", True),
+            PlanStep("pick_up_tip", "p20", True),
+            PlanStep("pick_up_tip", "p20", True),
+        ]
+        self.assertEqual(
+            count_required_tips(steps), {"p300_multi": 1, "p300_single": 1, "p20": 2}
+        )
+
+    def test_budget(self):
+        budget = TipBudget(
+            required={"p300_multi": 14, "p300_single": 3, "p20": 0},
+            available={"p300_multi": 4, "p300_single": 96, "p20": 96},
+            capacity={"p300_multi": 12, "p300_single": 96, "p20": 96},
+        )
+        self.assertFalse(budget.sufficient)
+        self.assertEqual(budget.shortfall, {"p300_multi": 10})
+        self.assertFalse(budget.refillable)
+        self.assertIn("p300_multi needs 14 columns, 4 available of 12", budget.describe())
+
+
+class TestLiquidHandlerTipBudget(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 4, single_channel=True)
+        self.source = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "source")
+        self.destination = self.lh.load_labware(
+            "nest_96_wellplate_100ul_pcr_full_skirt", 6, "destination"
+        )
+
+    def test_stamp_budget(self):
+        budget = self.lh.tip_budget("stamp", 50, self.source, self.destination)
+
+        self.assertEqual(budget.required, {"p300_multi": 12, "p300_single": 0, "p20": 0})
+        self.assertEqual(budget.available["p300_multi"], 12)
+        self.assertEqual(budget.available["p300_single"], 96)
+        self.assertEqual(budget.available["p20"], 0)
+        self.assertTrue(budget.sufficient)
+
+    def test_mix_budget(self):
+        budget = self.lh.tip_budget(
+            "mix", [self.source["A1"], self.source["B2"]], 3, 10, new_tip="always"
+        )
+        self.assertEqual(budget.required["p20"], 2)
+        self.assertEqual(budget.shortfall, {"p20": 2})
+        self.assertFalse(budget.refillable)
+
+    def test_budget_leaves_transfer_in_place(self):
+        transfers = []
+
+        def plan_transfer(*args, **kwargs):
+            # Other callers of transfer still run it while the operation is planned
+            transfers.append(self.lh.transfer)
+            return LiquidHandler.plan_transfer(self.lh, *args, **kwargs)
+
+        with patch.object(self.lh, "plan_transfer", side_effect=plan_transfer):
+            budget = self.lh.tip_budget(
+                "distribute", 50, self.source["A1"], self.destination.wells()
+            )
+        self.assertEqual(transfers, [self.lh.transfer])
+        self.assertEqual(budget.required["p300_single"], 1)
+
+    def test_budget_follows_tip_usage(self):
+        self.lh.stamp(50, self.source, self.destination, sample_count=16)
+        budget = self.lh.tip_budget("stamp", 50, self.source, self.destination)
+
+        self.assertEqual(budget.available["p300_multi"], 10)
+        self.assertEqual(budget.shortfall, {"p300_multi": 2})
+        self.assertTrue(budget.refillable)
+
+    def test_raise_before_the_run(self):
+        self.lh.tip_check = "raise"
+        self.lh.stamp(50, self.source, self.destination, sample_count=16)
+        picked_up = self.lh.p300_multi.pick_up_tip
+        with patch.object(self.lh.p300_multi, "pick_up_tip", wraps=picked_up) as pick_up_tip:
+            with self.assertRaises(InsufficientTipsError) as context:
+                self.lh.stamp(50, self.source, self.destination)
+
+        pick_up_tip.assert_not_called()
+        self.assertEqual(context.exception.budget.shortfall, {"p300_multi": 2})
+
+    def test_transfer_across_labware_is_checked_as_a_whole(self):
+        self.lh.tip_check = "raise"
+        other_source = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 5, "other")
+        self.lh.stamp(50, self.source, self.destination, sample_count=80)
+        with self.assertRaises(InsufficientTipsError):
+            self.lh.transfer(
+                50,
+                self.source.columns()[0] + other_source.columns()[0] + other_source.columns()[1],
+                self.destination.columns()[0] * 3,
+                new_tip="always",
+            )
+        budget = self.lh.tip_budget("stamp", 50, self.source, self.destination, sample_count=16)
+        self.assertEqual(budget.available["p300_multi"], 2)
+
+    def test_tips_are_checked_once(self):
+        self.lh.tip_check = "raise"
+        other_source = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 5, "other")
+        with patch.object(self.lh, "_tip_budget", wraps=self.lh._tip_budget) as tip_budget:
+            self.lh.transfer(
+                50,
+                self.source.columns()[0] + other_source.columns()[0],
+                self.destination.columns()[0] + self.destination.columns()[1],
+            )
+            self.assertEqual(tip_budget.call_count, 1)
+
+            tip_budget.reset_mock()
+            with self.lh.batch():
+                self.lh.transfer(50, self.source["A1"], self.destination["A3"])
+                self.lh.transfer(50, self.destination["A3"], self.destination["A4"])
+                self.lh.transfer(50, other_source["A1"], self.destination["A5"], new_tip="once")
+            self.assertEqual(tip_budget.call_count, 1)
+
+    def test_refill_checkpoint(self):
+        self.lh.tip_check = "refill"
+        self.lh.stamp(50, self.source, self.destination, sample_count=16)
+        with patch.object(self.lh.protocol_api, "pause") as pause:
+            failed = self.lh.stamp(50, self.source, self.destination)
+
+        pause.assert_called_once()
+        self.assertIn("slots 7", pause.call_args[0][0])
+        self.assertEqual(failed, [])
+
+    def test_invalid_tip_check(self):
+        with self.assertRaises(ValueError):
+            LiquidHandler(simulation=True, load_default=False, tip_check="warn")
+
+
+class TestTipOccupancy(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "state.json")
+
+    def _session(self, tip_rack="opentrons_96_tiprack_300ul"):
+        lh = LiquidHandler(
+            simulation=True, load_default=False, persist_tips=True, state_file=self.path
+        )
+        racks = (
+            lh.load_tips(tip_rack, 7),
+            lh.load_tips("opentrons_96_tiprack_300ul", 4, single_channel=True),
+        )
+        plate = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        return lh, racks, plate
+
+    def _stored_tips(self):
+        with open(self.path) as f:
+            return json.load(f)["tips"]
+
+    def test_occupancy_is_stored_on_pick_up(self):
+        lh, _, plate = self._session()
+        lh.transfer(50, plate.columns()[0], plate.columns()[1])
+        lh.transfer(50, [plate["A3"]], [plate["A4"]])
+
+        stored = self._stored_tips()
+        self.assertEqual(stored["7"]["load_name"], "opentrons_96_tiprack_300ul")
+        self.assertEqual(stored["7"]["used"], [f"{row}1" for row in "ABCDEFGH"])
+        self.assertEqual(len(stored["4"]["used"]), 1)
+
+    def test_next_session_continues_with_the_tips_left(self):
+        lh, _, plate = self._session()
+        lh.transfer(50, plate.columns()[0], plate.columns()[1])
+        lh.transfer(50, [plate["A3"]], [plate["A4"]])
+        single_used = self._stored_tips()["4"]["used"]
+
+        lh, (rack, single_rack), plate = self._session()
+        budget = lh.tip_budget("transfer", 50, plate.columns()[0], plate.columns()[1])
+        self.assertEqual(budget.available["p300_multi"], 11)
+        self.assertEqual(budget.available["p300_single"], 95)
+
+        lh.transfer(50, plate.columns()[0], plate.columns()[1])
+        lh.transfer(50, [plate["A3"]], [plate["A4"]])
+
+        self.assertTrue(rack["A1"].has_tip)
+        self.assertFalse(rack["A2"].has_tip)
+        # The single tip is the front-most tip left in the column
+        self.assertEqual(single_used, ["H1"])
+        self.assertFalse(single_rack["G1"].has_tip)
+        self.assertEqual(self._stored_tips()["7"]["used"][-1], "H2")
+        self.assertEqual(self._stored_tips()["4"]["used"], ["G1", "H1"])
+
+    def test_other_tip_rack_in_the_slot_is_full(self):
+        lh, _, plate = self._session()
+        lh.transfer(50, plate.columns()[0], plate.columns()[1])
+
+        lh, _, plate = self._session("opentrons_96_filtertiprack_200ul")
+        budget = lh.tip_budget("transfer", 50, plate.columns()[0], plate.columns()[1])
+        self.assertEqual(budget.available["p300_multi"], 12)
+
+    def test_refill_marks_restored_tips_present(self):
+        lh, _, plate = self._session()
+        destination = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 6, "destination")
+        lh.stamp(50, plate, destination, sample_count=88)
+
+        lh, (rack, _), plate = self._session()
+        destination = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 6, "destination")
+        lh.tip_check = "refill"
+        with patch.object(lh.protocol_api, "pause") as pause:
+            lh.stamp(50, plate, destination, sample_count=16)
+
+        pause.assert_called_once()
+        self.assertEqual(
+            self._stored_tips()["7"]["used"], [well.well_name for well in rack.wells()[:16]]
+        )
+
+    def test_restored_rack_runs_out_during_a_transfer(self):
+        lh, _, plate = self._session()
+        destination = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 6, "destination")
+        lh.stamp(50, plate, destination, sample_count=88)
+
+        lh, _, plate = self._session()
+        destination = lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 6, "destination")
+        failed = lh.transfer(
+            50,
+            plate.columns()[0] + plate.columns()[1],
+            destination.columns()[0] * 2,
+            new_tip="always",
+        )
+
+        # The last column of the rack is used, and the second column fails without raising
+        self.assertEqual(len(failed), 8)
+        self.assertEqual({operation[4] for operation in failed}, {"out_of_tips"})
+        self.assertEqual(len(self._stored_tips()["7"]["used"]), 96)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+
+from ot_handler import LiquidHandler
+from ot_handler.clock import VirtualClock
+from ot_handler.trace import ExecutionTrace, TracedPipette
+
+
+class _Pipette:
+    min_volume = 20
+
+    def __init__(self):
+        self.calls = []
+
+    def aspirate(self, volume, location, **kwargs):
+        self.calls.append(("aspirate", volume))
+
+    def dispense(self, volume, location, **kwargs):
+        raise RuntimeError("clogged")
+
+
+class TestExecutionTrace(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.trace = ExecutionTrace(self.clock.now)
+
+    def test_step_records_times_and_errors(self):
+        pipette = _Pipette()
+        traced = TracedPipette(pipette, "p20", self.trace, lambda: "all")
+        traced.aspirate(volume=10, location=None)
+        self.clock.sleep(2)
+        with self.assertRaises(RuntimeError):
+            traced.dispense(volume=10, location=None)
+
+        self.assertEqual(pipette.calls, [("aspirate", 10)])
+        self.assertEqual(traced.min_volume, 20)
+        aspiration, dispense = self.trace.events
+        self.assertEqual(
+            (aspiration.action, aspiration.pipette, aspiration.volume), ("aspirate", "p20", 10)
+        )
+        self.assertIsNone(aspiration.error)
+        self.assertEqual(dispense.start, 2)
+        self.assertEqual(dispense.error, "RuntimeError: clogged")
+
+    def test_mapped_indexes(self):
+        with self.trace.mapped_indexes([10, 11, 12]):
+            with self.trace.mapped_indexes([2, 0]):
+                self.assertEqual(self.trace.original_index(0), 12)
+                self.assertEqual(self.trace.original_index(1), 10)
+        self.assertEqual(self.trace.original_index(1), 1)
+
+    def test_write_jsonl(self):
+        with self.trace.step("delay"):
+            self.clock.sleep(5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.jsonl")
+            self.trace.write(path)
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["action"], "delay")
+        self.assertEqual(records[0]["end"] - records[0]["start"], 5)
+        self.assertEqual(self.trace.time_by_action(), {"delay": 5})
+
+    @unittest.skipIf(importlib.util.find_spec("pyarrow") is not None, "pyarrow is installed")
+    def test_parquet_requires_pyarrow(self):
+        with self.assertRaises(ImportError):
+            self.trace.write("trace.parquet")
+
+
+class TestLiquidHandlerTrace(unittest.TestCase):
+    def setUp(self):
+        self.lh = LiquidHandler(simulation=True, load_default=False, trace=True)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 7)
+        self.lh.load_tips("opentrons_96_tiprack_300ul", 4, single_channel=True)
+        self.plate = self.lh.load_labware("nest_96_wellplate_100ul_pcr_full_skirt", 9, "plate")
+        self.other_plate = self.lh.load_labware(
+            "nest_96_wellplate_100ul_pcr_full_skirt", 6, "plate"
+        )
+
+    def test_no_trace_by_default(self):
+        lh = LiquidHandler(simulation=True, load_default=False)
+        self.assertIsNone(lh.trace)
+
+    def test_transfer_events(self):
+        failed = self.lh.transfer(
+            50, self.plate.columns()[0], self.plate.columns()[1], retention_time=3
+        )
+
+        self.assertEqual(failed, [])
+        actions = [event.action for event in self.lh.trace]
+        self.assertEqual(
+            actions,
+            [
+                "pick_up_tip",
+                "air_gap",
+                "aspirate",
+                "delay",
+                "dispense",
+                "delay",
+                "blow_out",
+                "drop_tip",
+            ],
+        )
+        dispense = self.lh.trace.events[4]
+        self.assertEqual(dispense.pipette, "p300_multi")
+        self.assertEqual(dispense.nozzle_mode, "all")
+        self.assertEqual(dispense.volume, 50)
+        self.assertEqual(dispense.well, ["9", "A2"])
+        self.assertEqual(dispense.operations, tuple(range(8)))
+        self.assertEqual(self.lh.trace.time_by_action()["delay"], 6)
+
+    def test_operation_indexes_across_labware(self):
+        wells = [self.plate["A1"], self.other_plate["A1"], self.plate["B1"]]
+        self.lh.transfer(50, wells, [self.plate["C3"], self.plate["D3"], self.plate["E3"]])
+
+        aspirations = {
+            tuple(event.well): event.operations
+            for event in self.lh.trace
+            if event.action == "aspirate"
+        }
+        self.assertEqual(aspirations[("9", "A1")], (0,))
+        self.assertEqual(aspirations[("6", "A1")], (1,))
+        self.assertEqual(aspirations[("9", "B1")], (2,))
+        self.assertEqual(
+            {event.nozzle_mode for event in self.lh.trace if event.pipette == "p300_multi"},
+            {"single"},
+        )
+
+    def test_mix_events(self):
+        self.lh.load_tips("opentrons_96_tiprack_20ul", 1, single_channel=True)
+        self.lh.mix([self.plate["A1"], self.plate["B5"]], repetitions=3, volume=10)
+
+        mixes = [event for event in self.lh.trace if event.action == "mix"]
+        self.assertEqual([event.operations for event in mixes], [(0,), (1,)])
+        self.assertEqual(mixes[1].well, ["9", "B5"])
+        self.assertEqual(mixes[1].repetitions, 3)
+        self.assertEqual(mixes[1].pipette, "p20")
+
+
+if __name__ == "__main__":
+    unittest.main()